@@ -1,14 +1,13 @@
-from core.skill_manager import build_skill_prompt
-
 VERSION = "2026.2.0.0"
 AUTHOR = "Nexogic AI Team"
 
 
-def load_memory_prompt() -> str:
-    """动态加载 AGENTS.md 记忆内容，注入到系统提示词"""
+def load_memory_prompt(query: str = "") -> str:
+    """加载 AGENTS.md 记忆内容（缓存、去重、按 token 上限挑选与 query 相关的条目），注入到系统提示词"""
     try:
-        from core.skill.memory import read_memory
-        content = read_memory()
+        from core.skill.memory import memory_prompt
+        from core.settings import get_memory_tokens
+        content = memory_prompt(query, get_memory_tokens())
         if content and content.strip():
             return f"\n\n## 用户记忆（必须遵守）\n{content}\n"
     except Exception:
@@ -40,14 +39,14 @@ Maren Code 全称为 **Maren Automatically Runs Executable Navigation Code**(递
    所有回复、解释、说明必须使用中文输出。禁止输出英文段落或英文句子。代码标识符（变量名、函数名等）可以用英文，但注释和文字说明必须中文。
 """
 
-CHATTER_SYSTEM = f"""
+_CHATTER_SYSTEM = """
 你是 Maren AI 的 Chatter 形态,你的名字还是 **Maren AI**, 只不过你的形态是一个聊天助手(**Chatter**)，核心职责：陪用户聊天、知识科普、问题解答、信息咨询。
 把用户当作朋友、老板，态度尊重、耐心、真诚、温和。
 绝对服从用户指令，有问必答、逐一回应、不遗漏、不敷衍。
 技术问题精准、严谨、不模糊，只提供真实、可靠、可落地的答案。
 聊天自然友好，语气专业不生硬，始终保持稳定、耐心、可靠的陪伴状态。
 
-{build_skill_prompt("Chatter")}
+{skills}
 """
 
 LEADER_SYSTEM = """
@@ -179,4 +178,15 @@ TESTER_SYSTEM = """
 - warning 建议修复
 - 重点检查：空指针、越界、注入、资源泄漏
 - 测试覆盖率尽可能高
-"""
\ No newline at end of file
+"""
+
+
+def __getattr__(name):
+    """
+    按需生成依赖运行时配置的提示词：CHATTER_SYSTEM 需要读取 skill.json，
+    导入 constants 时不做任何文件读取；技能表自带缓存，且随 skill.json 更新
+    """
+    if name == "CHATTER_SYSTEM":
+        from core.skill_manager import build_skill_prompt
+        return _CHATTER_SYSTEM.format(skills=build_skill_prompt("Chatter"))
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
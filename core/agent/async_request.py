@@ -0,0 +1,555 @@
+"""
+core/agent/async_request.py — 原生 asyncio 流式客户端
+achat_complete 是 request.chat_complete 的异步版本：异步生成器逐块产出内容增量，
+重试策略、超时与错误信息与同步版本完全一致（共用 request 模块中的构建函数与 SSEDecoder）。
+基于 asyncio.open_connection 实现最小 HTTP/1.1 客户端，不引入额外依赖，
+同一事件循环内可并发成百上千个角色调用，无需为每个流占用一个系统线程。
+
+注意：与 requests 不同，本客户端不读取 HTTP(S)_PROXY 环境变量。
+"""
+import asyncio
+import json
+import logging
+import ssl
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from core.agent import metrics, rate_limit, response_cache, router, stops
+from core.agent.request import (
+    MAX_RETRIES, RETRYABLE_STATUS, TIMEOUT, STREAM_IDLE_TIMEOUT, MAX_CONTINUATIONS,
+    OVERLAP_WINDOW, continuation_messages, overlap, needs_continuation,
+    build_messages, build_payload, build_headers,
+    retry_wait, retry_delay, actual_tokens, error_message, SSEDecoder,
+    usage_supported, mark_usage_unsupported, rejects_stream_options, TruncatedError,
+)
+
+logger = logging.getLogger(__name__)
+
+# 每个源保留的最大空闲连接数
+_MAX_IDLE_PER_ORIGIN = 8
+
+
+class _Connection:
+    """一条 HTTP/1.1 连接（StreamReader + StreamWriter）"""
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+class _Response:
+    """最小 HTTP 响应：状态码、响应头与按需读取的响应体"""
+
+    def __init__(self, conn: _Connection, status: int, headers: Dict[str, str]):
+        self.conn = conn
+        self.status = status
+        self.headers = headers
+        self.chunked = "chunked" in headers.get("transfer-encoding", "").lower()
+        length = headers.get("content-length")
+        self.remaining = int(length) if length and length.isdigit() else None
+        self.keep_alive = headers.get("connection", "").lower() != "close"
+        self.eof = False
+        self.read_timeout = TIMEOUT[1]  # 首个数据事件到达后收紧为 STREAM_IDLE_TIMEOUT
+
+    async def read(self) -> bytes:
+        """读取下一段响应体，读完返回 b\"\""""
+        if self.eof:
+            return b""
+        reader = self.conn.reader
+        read_timeout = self.read_timeout
+
+        if self.chunked:
+            size_line = await asyncio.wait_for(reader.readline(), read_timeout)
+            if not size_line:
+                raise ConnectionError("分块传输意外结束")
+            size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+            if size == 0:
+                # 读掉 trailer 直到空行
+                while True:
+                    line = await asyncio.wait_for(reader.readline(), read_timeout)
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                self.eof = True
+                return b""
+            data = await asyncio.wait_for(reader.readexactly(size), read_timeout)
+            await asyncio.wait_for(reader.readline(), read_timeout)  # 块尾 CRLF
+            return data
+
+        if self.remaining is not None:
+            if self.remaining <= 0:
+                self.eof = True
+                return b""
+            data = await asyncio.wait_for(
+                reader.read(min(self.remaining, 65536)), read_timeout
+            )
+            if not data:
+                raise ConnectionError("响应体长度不足，连接被提前关闭")
+            self.remaining -= len(data)
+            return data
+
+        # 无长度信息：读到连接关闭为止
+        data = await asyncio.wait_for(reader.read(65536), read_timeout)
+        if not data:
+            self.eof = True
+            self.keep_alive = False
+        return data
+
+    async def read_all(self) -> bytes:
+        parts = []
+        while True:
+            data = await self.read()
+            if not data:
+                break
+            parts.append(data)
+        return b"".join(parts)
+
+
+class _ConnectionPool:
+    """
+    按 (事件循环, 源) 缓存空闲连接，实现 keep-alive 复用
+    asyncio 连接绑定在创建它的事件循环上，因此以循环为维度隔离
+    """
+
+    def __init__(self):
+        self._idle: Dict[Tuple[int, str], List[_Connection]] = {}
+        self._ssl_ctx: Optional[ssl.SSLContext] = None
+
+    def _ssl_context(self) -> ssl.SSLContext:
+        if self._ssl_ctx is None:
+            self._ssl_ctx = ssl.create_default_context()
+        return self._ssl_ctx
+
+    async def acquire(self, scheme: str, host: str, port: int) -> Tuple[_Connection, bool]:
+        """获取连接，返回 (连接, 是否为复用连接)"""
+        key = (id(asyncio.get_running_loop()), f"{scheme}://{host}:{port}")
+        idle = self._idle.get(key)
+        while idle:
+            conn = idle.pop()
+            if not conn.writer.is_closing() and not conn.reader.at_eof():
+                return conn, True
+            conn.close()
+        ssl_ctx = self._ssl_context() if scheme == "https" else None
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(
+                host, port, ssl=ssl_ctx,
+                server_hostname=host if ssl_ctx else None,
+            ),
+            TIMEOUT[0],
+        )
+        return _Connection(reader, writer), False
+
+    def release(self, scheme: str, host: str, port: int, conn: _Connection):
+        """归还可复用的连接"""
+        key = (id(asyncio.get_running_loop()), f"{scheme}://{host}:{port}")
+        idle = self._idle.setdefault(key, [])
+        if len(idle) >= _MAX_IDLE_PER_ORIGIN:
+            conn.close()
+            return
+        idle.append(conn)
+
+
+_pool = _ConnectionPool()
+
+
+async def _send_request(url: str, body: bytes,
+                        headers: Dict[str, str]) -> Tuple[_Response, tuple]:
+    """发送 POST 请求并读取响应头；复用连接失效时自动换新连接重发一次"""
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    host = parts.hostname or ""
+    port = parts.port or (443 if scheme == "https" else 80)
+    path = parts.path or "/"
+    if parts.query:
+        path += "?" + parts.query
+    origin = (scheme, host, port)
+
+    lines = [f"POST {path} HTTP/1.1", f"Host: {parts.netloc}"]
+    for k, v in headers.items():
+        lines.append(f"{k}: {v}")
+    lines.append(f"Content-Length: {len(body)}")
+    lines.append("Connection: keep-alive")
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+    # 复用的空闲连接可能已被服务端关闭：换连接重发，直到用上一条新建的连接为止
+    while True:
+        conn, reused = await _pool.acquire(*origin)
+        try:
+            conn.writer.write(head + body)
+            await conn.writer.drain()
+            status_line = await asyncio.wait_for(conn.reader.readline(), TIMEOUT[1])
+        except (ConnectionError, OSError):
+            conn.close()
+            if reused:
+                continue
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        if not status_line:
+            conn.close()
+            if reused:
+                continue
+            raise ConnectionError("服务端未返回响应")
+        break
+
+    try:
+        status = int(status_line.split(b" ", 2)[1])
+    except (IndexError, ValueError):
+        conn.close()
+        raise ConnectionError(f"无效的 HTTP 状态行: {status_line[:80]!r}")
+
+    resp_headers: Dict[str, str] = {}
+    while True:
+        line = await asyncio.wait_for(conn.reader.readline(), TIMEOUT[1])
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        resp_headers[name.strip().lower()] = value.strip()
+    return _Response(conn, status, resp_headers), origin
+
+
+def _finish(resp: _Response, origin: tuple, reusable: bool):
+    """结束响应：完整读完且服务端允许时归还连接，否则关闭"""
+    if reusable and resp.eof and resp.keep_alive:
+        _pool.release(*origin, resp.conn)
+    else:
+        resp.conn.close()
+
+
+async def achat_complete(
+    base_url: str,
+    api_key: str,
+    model: str,
+    system: Optional[str],
+    history: List[Dict[str, str]],
+    question: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    role: Optional[str] = None,
+    cache: Optional[bool] = None,
+    stop: Optional["stops.StopCondition"] = None,
+    continue_on_length: bool = False
+) -> AsyncIterator[str]:
+    """
+    异步流式调用 OpenAI 兼容 API（参数与 request.chat_complete 相同）
+    :return: 逐块返回文本的异步迭代器
+    :raises TruncatedError: 续写 MAX_CONTINUATIONS 次后回复仍不完整
+    """
+    messages = build_messages(system, history, question)
+    if stop is not None:
+        stop = stop.fresh()
+    if cache is None:
+        cache = response_cache.enabled_for(role)
+    key = None
+    if cache:
+        key = response_cache.make_key(model, messages, temperature, max_tokens,
+                                      stop.name if stop else None)
+        cached = response_cache.lookup(key)
+        if cached is not None:
+            # 命中：按原始分块回放，渲染器行为与实时流一致
+            metrics.record_cache_hit(role, model, base_url, cached)
+            for content in cached:
+                yield content
+            return
+
+    chunks: List[str] = []
+    result = {}
+    async for content in _aresumable_completion(
+        base_url, api_key, model, messages, temperature, max_tokens, role, result, stop,
+        continue_on_length,
+    ):
+        if key:
+            chunks.append(content)
+        yield content
+    # 只缓存完整结束的回复，被截断或超长的不缓存
+    if key and result.get("done") and result.get("finish_reason") in (None, "stop"):
+        response_cache.store(key, chunks, model)
+
+
+async def _aresumable_completion(
+    base_url: str,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    role: Optional[str],
+    result: dict,
+    stop: Optional["stops.StopCondition"] = None,
+    continue_on_length: bool = False
+) -> AsyncIterator[str]:
+    """流被截断时自动续写并拼接，续写次数用完仍不完整时抛出 TruncatedError（与 request._resumable_completion 相同的策略）"""
+    produced: List[str] = []
+    convo = messages
+    for attempt in range(MAX_CONTINUATIONS + 1):
+        result.pop("done", None)
+        result.pop("finish_reason", None)
+        stream = _arouted_completion(
+            base_url, api_key, model, convo, temperature, max_tokens, role, result, stop
+        )
+        previous = "".join(produced)
+        head = "" if produced else None
+        try:
+            async for content in stream:
+                if head is not None:
+                    # 续写：缓冲开头一段，去掉与已有内容重复的部分
+                    head += content
+                    if len(head) < OVERLAP_WINDOW:
+                        continue
+                    content, head = head[overlap(previous, head):], None
+                produced.append(content)
+                yield content
+        finally:
+            await stream.aclose()
+        if head:
+            content = head[overlap(previous, head):]
+            produced.append(content)
+            yield content
+        if "done" not in result or not needs_continuation(
+                result["done"], result["finish_reason"], continue_on_length):
+            return
+        reason = "长度上限" if result["finish_reason"] == "length" else "流被截断"
+        if attempt == MAX_CONTINUATIONS:
+            raise TruncatedError(f"回复{reason}，自动续写 {MAX_CONTINUATIONS} 次后仍不完整",
+                                 "".join(produced))
+        logger.warning(f"{role or 'unknown'} {reason}，已输出 {sum(map(len, produced))} 字符，自动续写")
+        convo = continuation_messages(messages, "".join(produced)) if produced else messages
+
+
+async def _arouted_completion(
+    base_url: str,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    role: Optional[str],
+    result: dict,
+    stop: Optional["stops.StopCondition"] = None
+) -> AsyncIterator[str]:
+    """按角色后端池选择后端（与 request._routed_completion 相同的策略）"""
+    pool = router.pool_for(role, base_url, api_key, model)
+    if pool is None:
+        async for content in _astream_completion(
+            base_url, api_key, model, messages, temperature, max_tokens, role, result, stop
+        ):
+            yield content
+        return
+
+    tried = []
+    while True:
+        backend = pool.acquire(exclude=tried)
+        tried.append(backend)
+        result.pop("metrics", None)
+        stream = _astream_completion(
+            backend.base_url, backend.api_key, backend.model, messages,
+            temperature, max_tokens, role, result, stop,
+        )
+        produced = False
+        try:
+            async for content in stream:
+                produced = True
+                yield content
+            return
+        except RuntimeError as e:
+            if produced or len(tried) >= len(pool.backends):
+                raise
+            logger.warning(f"{role} 后端 {backend.label} 失败，切换后端重试: {e}")
+        finally:
+            await stream.aclose()
+            m = result.get("metrics")
+            pool.release(backend, m.status if m else "error", m.ttft if m else None)
+
+
+async def _astream_completion(
+    base_url: str,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    role: Optional[str],
+    result: dict,
+    stop: Optional["stops.StopCondition"] = None
+) -> AsyncIterator[str]:
+    """
+    实际的网络流式调用
+    :param result: 流结束时写入 done（是否完整结束，停止条件触发也算）、finish_reason
+                   与本次调用的 metrics
+    :param stop: 停止条件（已是新实例）
+    """
+    url = base_url.rstrip("/") + "/chat/completions"
+    payload = build_payload(model, messages, temperature, max_tokens,
+                            include_usage=usage_supported(base_url))
+    headers = build_headers(api_key, role)
+    m = metrics.CallMetrics(role, model, base_url)
+    limiter = rate_limit.get_limiter(base_url, api_key)
+    estimate = rate_limit.estimate_tokens(messages)
+
+    # _open_stream 返回的响应带着一份尚未结算的 token 预约
+    reserved = False
+    try:
+        resp, origin = await _open_stream(url, payload, headers, m, limiter, estimate)
+        reserved = True
+        if resp.status != 200:
+            status = resp.status
+            msg = await _read_error(resp)
+            if "stream_options" in payload and rejects_stream_options(status, msg):
+                # 服务端不支持 stream_options：记住后去掉该字段重发
+                mark_usage_unsupported(base_url)
+                payload.pop("stream_options", None)
+                limiter.settle(-estimate)
+                reserved = False
+                resp, origin = await _open_stream(url, payload, headers, m, limiter, estimate)
+                reserved = True
+                if resp.status != 200:
+                    status = resp.status
+                    msg = await _read_error(resp)
+            if resp.status != 200:
+                raise RuntimeError(f"API 错误 ({status}): {msg}")
+    except BaseException as e:
+        # 没有可读取的流：退还预约（错误响应、网络异常与任务取消都不消耗 token）
+        if reserved:
+            limiter.settle(-estimate)
+        if isinstance(e, RuntimeError):
+            m.finish("error", str(e))
+            result["metrics"] = m
+        raise
+
+    decoder = SSEDecoder()
+    outcome = "aborted"  # 调用方提前停止迭代或被取消
+    stopped = False
+    try:
+        while not decoder.finished and not stopped:
+            try:
+                chunk = await resp.read()
+            except asyncio.TimeoutError:
+                logger.warning(f"SSE 流读取超时（空闲上限 {resp.read_timeout}s），视为卡死")
+                break
+            except (ConnectionError, asyncio.IncompleteReadError, ValueError) as e:
+                logger.warning(f"SSE 流连接断开: {e}")
+                break
+            except OSError as e:
+                logger.warning(f"SSE 流读取系统错误: {e}")
+                break
+            if not chunk:
+                break
+            if decoder.events:
+                resp.read_timeout = STREAM_IDLE_TIMEOUT
+            for content in decoder.feed(chunk):
+                m.first_token()
+                if stop is not None:
+                    keep = stop.feed(content)
+                    if keep >= 0:
+                        content = content[:keep]
+                        stopped = True
+                m.chars += len(content)
+                if content:
+                    yield content
+                if stopped:
+                    break
+        if stopped:
+            # 停止条件触发：不读剩余字节，由 _finish 直接关闭连接
+            outcome = "stopped"
+            result["done"] = True
+            result["finish_reason"] = "stop"
+            return
+        if decoder.done:
+            # 读完剩余字节，让连接可以复用
+            try:
+                await resp.read_all()
+            except Exception:
+                pass
+        outcome = "ok" if decoder.done else "truncated"
+        result["done"] = decoder.done
+        result["finish_reason"] = decoder.finish_reason
+    finally:
+        m.finish_reason = decoder.finish_reason
+        m.set_usage(decoder.usage)
+        m.finish(outcome)
+        result["metrics"] = m
+        limiter.settle(actual_tokens(m, estimate) - estimate)
+        _finish(resp, origin, decoder.done)
+
+
+async def _open_stream(url: str, payload: dict, headers: Dict[str, str],
+                       m: "metrics.CallMetrics", limiter: "rate_limit.RateLimiter",
+                       estimate: int) -> Tuple[_Response, tuple]:
+    """
+    发送请求并返回 (响应, 源)，含限流与重试逻辑，重试次数与排队时间计入遥测
+    每次尝试前预约 estimate 个 token：没有得到要返回的响应时（网络异常、可重试状态码、取消）
+    立即退还；返回的响应保留这份预约，由调用方在流结束后按实际用量结算
+    """
+    body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    # 重试逻辑：覆盖网络异常和可重试的 HTTP 状态码
+    resp = None
+    origin = None
+    last_error = None
+
+    for attempt in range(MAX_RETRIES + 1):
+        m.throttled += await limiter.aacquire(estimate)
+        held = True  # 本次尝试的预约尚未退还，也未转交给返回的响应
+        try:
+            resp, origin = await _send_request(url, body, headers)
+            # 可重试的 HTTP 状态码
+            if resp.status in RETRYABLE_STATUS and attempt < MAX_RETRIES:
+                wait = retry_delay(limiter, attempt, resp.status,
+                                   resp.headers.get("retry-after"))
+                logger.warning(f"HTTP {resp.status}, 第 {attempt+1} 次重试, "
+                               + (f"等待 {wait}s" if wait else "由限流器统一退避"))
+                resp.conn.close()
+                resp = None
+                limiter.settle(-estimate)
+                held = False
+                m.retries += 1
+                await asyncio.sleep(wait)
+                continue
+            held = False
+            break
+        except asyncio.TimeoutError as e:
+            last_error = f"请求超时: {e or '等待响应超时'}"
+        except ssl.SSLError as e:
+            last_error = f"连接失败: {e}"
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            last_error = f"连接失败: {e}"
+        except OSError as e:
+            last_error = f"系统网络错误: {e}"
+        finally:
+            if held:
+                limiter.settle(-estimate)
+
+        if attempt < MAX_RETRIES:
+            wait = retry_wait(attempt)
+            logger.warning(f"{last_error}, 第 {attempt+1} 次重试, 等待 {wait}s")
+            m.retries += 1
+            await asyncio.sleep(wait)
+        else:
+            raise RuntimeError(f"{last_error} (已重试 {MAX_RETRIES} 次)")
+
+    if resp is None:
+        raise RuntimeError(f"请求失败: {last_error or '无法建立连接'}")
+    return resp, origin
+
+
+async def _read_error(resp: _Response) -> str:
+    """读取非 200 响应的错误信息并关闭连接"""
+    try:
+        body = await resp.read_all()
+    except Exception:
+        body = b""
+    resp.conn.close()
+    return error_message(resp.status, body)
+
+
+async def acollect(*args, **kwargs) -> str:
+    """并发场景的便捷封装：收集 achat_complete 的完整回复"""
+    parts = []
+    async for chunk in achat_complete(*args, **kwargs):
+        parts.append(chunk)
+    return "".join(parts)
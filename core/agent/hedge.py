@@ -0,0 +1,254 @@
+"""
+core/agent/hedge.py — 对冲请求（hedged requests）
+Leader 规划、Chatter 对话等延迟敏感的调用会阻塞整条流水线，其尾延迟主导总耗时。
+开启对冲后：主请求在阈值时间内没有产出首 token，就向备用端点 / 模型再发一份相同请求，
+哪一路先开始输出就采用哪一路，其余的取消。
+
+阈值来自 metrics 中该角色 + 模型的历史 TTFT 百分位数（样本不足时用默认值）。
+按角色在 config.json 的 hedge 段开启：
+  "hedge": {
+      "roles": {"leader": true},
+      "percentile": 90,
+      "min_samples": 5,
+      "default_delay": 4.0,
+      "alternates": {"leader": ["gpt-4o-mini"]}
+  }
+alternates 中的名称取自 extra_models（使用其 base_url / api_key，模型名即名称）；
+未配置时使用 maren.json 中与主请求不同的 role_base_urls（同一模型与 key）。
+"""
+import logging
+import queue
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from core import config_store, settings
+from core.agent import http_pool, metrics, request, stops
+
+logger = logging.getLogger(__name__)
+
+_DEFAULT_PERCENTILE = 90
+_DEFAULT_MIN_SAMPLES = 5
+_DEFAULT_DELAY = 4.0
+# 阈值下限，避免历史 TTFT 很小时几乎每次都发出对冲请求
+_MIN_DELAY = 0.5
+# 参与计算阈值的最近样本数
+_HISTORY = 100
+
+
+def _hedge_config() -> dict:
+    """读取 config.json 中的 hedge 配置"""
+    try:
+        cfg = settings.get_config()
+    except Exception:
+        return {}
+    hedge = cfg.get("hedge")
+    if not isinstance(hedge, dict):
+        return {}
+    return dict(hedge, extra_models=cfg.get("extra_models") or {})
+
+
+def enabled_for(role: Optional[str]) -> bool:
+    """该角色是否开启对冲"""
+    if not role:
+        return False
+    return bool((_hedge_config().get("roles") or {}).get(settings.config_role(role)))
+
+
+def threshold(role: Optional[str], model: str, cfg: Optional[dict] = None) -> float:
+    """对冲阈值（秒）：该角色 + 模型最近调用 TTFT 的配置百分位数"""
+    cfg = cfg if cfg is not None else _hedge_config()
+    pct = cfg.get("percentile", _DEFAULT_PERCENTILE)
+    min_samples = cfg.get("min_samples", _DEFAULT_MIN_SAMPLES)
+    default = float(cfg.get("default_delay", _DEFAULT_DELAY))
+    samples = [m.ttft for m in metrics.query(role, model, limit=_HISTORY)
+               if m.status != "cached" and m.ttft is not None]
+    if len(samples) < min_samples:
+        return default
+    return max(_MIN_DELAY, metrics.percentile(samples, pct))
+
+
+def _role_base_urls() -> Dict[str, str]:
+    """maren.json 中的 role_base_urls"""
+    import utils.inited as inited
+    urls = config_store.section(inited.maren_json_path(), "model", "role_base_urls")
+    return urls if isinstance(urls, dict) else {}
+
+
+def alternates(role: Optional[str], base_url: str, api_key: str, model: str,
+               cfg: Optional[dict] = None) -> List[dict]:
+    """解析备用端点列表：[{"base_url", "api_key", "model"}]"""
+    cfg = cfg if cfg is not None else _hedge_config()
+    out = []
+    names = (cfg.get("alternates") or {}).get(settings.config_role(role)) or []
+    extras = cfg.get("extra_models") or {}
+    for name in names:
+        info = extras.get(name)
+        if isinstance(info, dict) and info.get("base_url"):
+            out.append({"base_url": info["base_url"],
+                        "api_key": info.get("api_key") or api_key,
+                        "model": name})
+        else:
+            logger.warning(f"对冲备用模型 {name} 不在 extra_models 中，已忽略")
+    if not out:
+        seen = {base_url.rstrip("/")}
+        for url in _role_base_urls().values():
+            if url and url.rstrip("/") not in seen:
+                seen.add(url.rstrip("/"))
+                out.append({"base_url": url, "api_key": api_key, "model": model})
+    return out
+
+
+class _Leg(threading.Thread):
+    """
+    一路请求：在线程中迭代流，把分块放进共享队列
+    cancel 立即关闭这一路的连接：还在等响应头或首 token 的读取随即返回，
+    不再占用线程、连接与限流预约直到读取超时
+    """
+
+    def __init__(self, name: str, events: queue.Queue, stream_factory):
+        super().__init__(name=f"hedge-{name}", daemon=True)
+        self.label = name
+        self._events = events
+        self._factory = stream_factory
+        self._cancelled = threading.Event()
+        # 发起对冲的线程被中止时（例如任务被 Ctrl-C 取消），各路随之中止
+        self._abort = http_pool.AbortHandle(parent=http_pool.current())
+
+    def cancel(self):
+        self._cancelled.set()
+        self._abort.abort()
+
+    def run(self):
+        http_pool.bind(self._abort)
+        stream = None
+        try:
+            stream = self._factory()
+            for chunk in stream:
+                if self._cancelled.is_set():
+                    break
+                self._events.put((self, "chunk", chunk))
+            self._events.put((self, "done", None))
+        except Exception as e:
+            self._events.put((self, "error", e))
+        finally:
+            if stream is not None:
+                stream.close()  # 关闭生成器即关闭连接
+            http_pool.bind(None)
+
+
+def chat_complete(
+    base_url: str,
+    api_key: str,
+    model: str,
+    system: Optional[str],
+    history: List[Dict[str, str]],
+    question: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    role: Optional[str] = None,
+    cache: Optional[bool] = None,
+    stop: Optional["stops.StopCondition"] = None,
+    continue_on_length: bool = False
+) -> Iterator[str]:
+    """
+    与 request.chat_complete 参数一致；该角色开启对冲且有备用端点时走对冲逻辑，
+    否则直接委托给 request.chat_complete
+    """
+    cfg = _hedge_config()
+    legs = []
+    if (cfg.get("roles") or {}).get(settings.config_role(role)):
+        legs = alternates(role, base_url, api_key, model, cfg)
+    if not legs:
+        yield from request.chat_complete(
+            base_url, api_key, model, system, history, question,
+            temperature=temperature, max_tokens=max_tokens, role=role, cache=cache,
+            stop=stop, continue_on_length=continue_on_length,
+        )
+        return
+
+    delay = threshold(role, model, cfg)
+
+    def _primary():
+        return request.chat_complete(
+            base_url, api_key, model, system, history, question,
+            temperature=temperature, max_tokens=max_tokens, role=role, cache=cache,
+            stop=stop, continue_on_length=continue_on_length,
+        )
+
+    def _factory(alt):
+        # 备用路不读写缓存，避免与主请求的缓存键混淆
+        return lambda: request.chat_complete(
+            alt["base_url"], alt["api_key"], alt["model"], system, history, question,
+            temperature=temperature, max_tokens=max_tokens, role=role, cache=False,
+            stop=stop, continue_on_length=continue_on_length,
+        )
+
+    yield from _race(role, [("primary", _primary)] +
+                     [(f"{a['model']}@{a['base_url']}", _factory(a)) for a in legs], delay)
+
+
+def _race(role: Optional[str], factories: list, delay: float) -> Iterator[str]:
+    """
+    依次启动各路请求（每隔 delay 秒或上一路失败时启动下一路），
+    第一路产出首个分块者胜出，其余取消；之后只转发胜出路的分块
+    """
+    events: queue.Queue = queue.Queue()
+    pending = list(factories)
+    running: List[_Leg] = []
+    first_error: Optional[Exception] = None
+    winner: Optional[_Leg] = None
+
+    def _launch():
+        name, factory = pending.pop(0)
+        leg = _Leg(name, events, factory)
+        running.append(leg)
+        leg.start()
+        return leg
+
+    try:
+        _launch()
+        deadline = time.monotonic() + delay
+        first = None
+        while winner is None:
+            timeout = max(0.0, deadline - time.monotonic()) if pending else None
+            try:
+                leg, kind, value = events.get(timeout=timeout)
+            except queue.Empty:
+                leg = _launch()
+                logger.info(f"{role or 'unknown'} 首 token 超过 {delay:.2f}s，对冲请求 -> {leg.label}")
+                deadline = time.monotonic() + delay
+                continue
+            if kind == "error":
+                first_error = first_error or value
+                running.remove(leg)
+                if pending:
+                    _launch()  # 失败立即切到下一路，不等阈值
+                    deadline = time.monotonic() + delay
+                elif not running:
+                    raise first_error
+                continue
+            winner = leg
+            first = value if kind == "chunk" else None
+            if kind == "done":
+                return
+
+        for leg in running:
+            if leg is not winner:
+                leg.cancel()
+        if winner.label != "primary":
+            logger.info(f"{role or 'unknown'} 对冲请求胜出: {winner.label}")
+        yield first
+        while True:
+            leg, kind, value = events.get()
+            if leg is not winner:
+                continue
+            if kind == "chunk":
+                yield value
+            elif kind == "error":
+                raise value
+            else:
+                return
+    finally:
+        for leg in running:
+            leg.cancel()
@@ -0,0 +1,205 @@
+"""
+core/agent/http_pool.py — 进程级 HTTP 连接池
+为每个 API 源（scheme + host + port）维护一个 keep-alive 的 requests.Session，
+同一 base_url / role_base_urls 的多次调用复用 TCP/TLS 连接，不再重复握手。
+连接池大小跟随任务并发数（config concurrency）自动扩容，可在工作线程中安全使用。
+
+另一个线程可以中止某个线程中进行的请求（对冲请求取消落后的一路）：
+  handle = http_pool.AbortHandle()
+  http_pool.bind(handle)        # 在发起请求的线程中绑定
+  handle.abort()                # 任意线程：关闭该线程当前请求的连接
+  http_pool.aborted()           # 请求路径上检查，已中止时不再重试 / 续写
+子句柄（AbortHandle(parent=...)）随父句柄一起中止，用于在其他线程中代为发出的请求。
+关闭的是底层 socket，阻塞在等待响应头或首 token 上的读取会立即返回，不必等到读取超时。
+"""
+import socket
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 默认每个源保留的最大空闲连接数
+_DEFAULT_POOL_SIZE = 8
+
+_lock = threading.Lock()
+_pool_size = _DEFAULT_POOL_SIZE
+# origin -> (Session, 创建时的连接池大小)
+_sessions: Dict[str, Tuple[requests.Session, int]] = {}
+
+
+_local = threading.local()
+
+
+class AbortHandle:
+    """跨线程中止一个线程中的请求；parent 中止时本句柄随之中止"""
+
+    def __init__(self, parent: Optional["AbortHandle"] = None):
+        self._lock = threading.Lock()
+        self._conn: Optional[HTTPConnection] = None
+        self._children: List["AbortHandle"] = []
+        self.aborted = False
+        if parent is not None:
+            with parent._lock:
+                parent._children.append(self)
+                self.aborted = parent.aborted
+
+    def _attach(self, conn: HTTPConnection):
+        with self._lock:
+            self._conn = conn
+            if not self.aborted:
+                return
+        _shutdown(conn)
+
+    def abort(self):
+        """标记中止并关闭当前连接（可重复调用）"""
+        with self._lock:
+            self.aborted = True
+            conn = self._conn
+            children = list(self._children)
+        if conn is not None:
+            _shutdown(conn)
+        for child in children:
+            child.abort()
+
+
+def _shutdown(conn: HTTPConnection):
+    """关闭连接的 socket 读写两端，唤醒阻塞在其上的读取"""
+    sock = getattr(conn, "sock", None)
+    if sock is None:
+        return
+    try:
+        # 绕过 SSLSocket.shutdown，只关闭底层 fd，读取线程得到 EOF / SSL 错误
+        socket.socket.shutdown(sock, socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def bind(handle: Optional[AbortHandle]):
+    """把当前线程之后发出的请求登记到 handle（None 取消绑定）"""
+    _local.handle = handle
+
+
+def current() -> Optional[AbortHandle]:
+    """当前线程绑定的句柄"""
+    return getattr(_local, "handle", None)
+
+
+def aborted() -> bool:
+    """当前线程绑定的请求是否已被中止"""
+    handle = getattr(_local, "handle", None)
+    return handle is not None and handle.aborted
+
+
+def _track(conn: HTTPConnection):
+    handle = getattr(_local, "handle", None)
+    if handle is not None:
+        handle._attach(conn)
+
+
+class _TrackedHTTPConnection(HTTPConnection):
+    def request(self, *args, **kwargs):
+        _track(self)
+        return super().request(*args, **kwargs)
+
+
+class _TrackedHTTPSConnection(HTTPSConnection):
+    def request(self, *args, **kwargs):
+        _track(self)
+        return super().request(*args, **kwargs)
+
+
+class _HTTPPool(HTTPConnectionPool):
+    ConnectionCls = _TrackedHTTPConnection
+
+
+class _HTTPSPool(HTTPSConnectionPool):
+    ConnectionCls = _TrackedHTTPSConnection
+
+
+class _Adapter(HTTPAdapter):
+    """连接登记到当前线程 AbortHandle 的 HTTPAdapter"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": _HTTPPool, "https": _HTTPSPool}
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        manager = super().proxy_manager_for(proxy, **proxy_kwargs)
+        # SOCKS 代理使用自己的连接类，保持原样（中止退化为在下一个分块处生效）
+        if not proxy.lower().startswith("socks"):
+            manager.pool_classes_by_scheme = {"http": _HTTPPool, "https": _HTTPSPool}
+        return manager
+
+
+def _origin(base_url: str) -> str:
+    """提取连接复用的键：scheme://host:port（忽略路径）"""
+    parts = urlsplit(base_url.strip())
+    return f"{parts.scheme.lower()}://{parts.netloc.lower()}"
+
+
+def _new_session(pool_size: int) -> requests.Session:
+    """创建带连接池的 Session"""
+    session = requests.Session()
+    adapter = _Adapter(
+        pool_connections=1,
+        pool_maxsize=pool_size,
+        pool_block=False,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(base_url: str) -> requests.Session:
+    """
+    获取 base_url 对应的共享 Session（线程安全）
+    :param base_url: API 基础地址
+    :return: 复用连接的 requests.Session
+    """
+    key = _origin(base_url)
+    with _lock:
+        entry = _sessions.get(key)
+        if entry and entry[1] >= _pool_size:
+            return entry[0]
+        # 首次使用或连接池需要扩容：新建 Session 并关闭旧的。
+        # 关闭只释放旧连接池中的空闲连接，进行中的流读完后归还时随之关闭
+        session = _new_session(_pool_size)
+        _sessions[key] = (session, _pool_size)
+    if entry:
+        try:
+            entry[0].close()
+        except Exception:
+            pass
+    return session
+
+
+def ensure_pool_size(concurrency: int):
+    """
+    按并发数扩容连接池（只增不减）
+    已创建的 Session 会在下一次 get_session 时按新大小重建
+    :param concurrency: 预计同时进行的请求数
+    """
+    global _pool_size
+    with _lock:
+        if concurrency > _pool_size:
+            _pool_size = concurrency
+
+
+def pool_size() -> int:
+    """当前每个源的连接池大小"""
+    return _pool_size
+
+
+def close_all():
+    """关闭所有共享 Session（进程退出或测试时使用）"""
+    with _lock:
+        for session, _ in _sessions.values():
+            try:
+                session.close()
+            except Exception:
+                pass
+        _sessions.clear()
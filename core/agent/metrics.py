@@ -0,0 +1,193 @@
+"""
+core/agent/metrics.py — LLM 调用遥测
+每次 chat_complete 记录一条 CallMetrics（角色、模型、base_url、首 token 延迟、
+总耗时、重试次数、token 用量、finish_reason），保存在进程内注册表中，
+供流水线与 status 命令查询，用于按数据调优模式与模型。
+"""
+import threading
+import time
+from collections import deque
+from typing import Dict, List, Optional
+
+# 注册表最多保留的记录数
+_MAX_RECORDS = 1000
+# 每个 (角色, 模型) 保留的任务耗时记录数
+_MAX_TASK_RECORDS = 50
+
+_lock = threading.Lock()
+_records = deque(maxlen=_MAX_RECORDS)
+# (角色, 模型) → deque[(任务耗时秒, 任务描述字符数)]
+_task_records: Dict[tuple, deque] = {}
+
+
+class CallMetrics:
+    """单次流式调用的指标"""
+
+    def __init__(self, role: Optional[str], model: str, base_url: str):
+        self.role = (role or "unknown").lower()
+        self.model = model
+        self.base_url = base_url
+        self.started = time.time()
+        self._t0 = time.perf_counter()
+        self.ttft: Optional[float] = None       # 首 token 延迟（秒）
+        self.latency: Optional[float] = None    # 总耗时（秒）
+        self.retries = 0
+        self.throttled = 0.0                    # 客户端限流排队时间（秒）
+        self.prompt_tokens: Optional[int] = None
+        self.completion_tokens: Optional[int] = None
+        self.total_tokens: Optional[int] = None
+        self.finish_reason: Optional[str] = None
+        self.chars = 0                          # 收到的文本字符数
+        self.status = "running"                 # running / ok / stopped / truncated / error / aborted / cached
+        self.error = ""
+
+    def first_token(self):
+        """记录首 token 到达时间（只记第一次）"""
+        if self.ttft is None:
+            self.ttft = time.perf_counter() - self._t0
+
+    def set_usage(self, usage: Optional[dict]):
+        """写入服务端返回的 usage"""
+        if not usage:
+            return
+        self.prompt_tokens = usage.get("prompt_tokens")
+        self.completion_tokens = usage.get("completion_tokens")
+        self.total_tokens = usage.get("total_tokens")
+
+    def finish(self, status: str, error: str = ""):
+        """结束计时并写入注册表"""
+        self.latency = time.perf_counter() - self._t0
+        self.status = status
+        self.error = error
+        record(self)
+
+    @property
+    def tokens_per_sec(self) -> Optional[float]:
+        """生成速度：优先用服务端 completion_tokens，否则按字符粗略估算"""
+        if self.latency is None:
+            return None
+        gen_time = self.latency - (self.ttft or 0.0)
+        if gen_time <= 0:
+            return None
+        tokens = self.completion_tokens
+        if tokens is None:
+            tokens = self.chars / 2.5  # 与 ContextTracker 的估算口径一致
+        return tokens / gen_time
+
+    def to_dict(self) -> dict:
+        return {
+            "role": self.role,
+            "model": self.model,
+            "base_url": self.base_url,
+            "started": self.started,
+            "ttft": self.ttft,
+            "latency": self.latency,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "finish_reason": self.finish_reason,
+            "tokens_per_sec": self.tokens_per_sec,
+            "chars": self.chars,
+            "status": self.status,
+            "error": self.error,
+        }
+
+
+def record_cache_hit(role: Optional[str], model: str, base_url: str,
+                     chunks: List[str]):
+    """记录一次缓存命中（不计入延迟统计）"""
+    m = CallMetrics(role, model, base_url)
+    m.chars = sum(len(c) for c in chunks)
+    m.finish("cached")
+
+
+def record(m: CallMetrics):
+    """写入一条记录（线程安全）"""
+    with _lock:
+        _records.append(m)
+
+
+def query(role: Optional[str] = None, model: Optional[str] = None,
+          limit: Optional[int] = None,
+          since: Optional[float] = None) -> List[CallMetrics]:
+    """按角色 / 模型 / 起始时间筛选记录，按时间先后返回，limit 取最近若干条"""
+    with _lock:
+        items = list(_records)
+    if since is not None:
+        items = [m for m in items if m.started >= since]
+    if role:
+        items = [m for m in items if m.role == role.lower()]
+    if model:
+        items = [m for m in items if m.model == model]
+    if limit:
+        items = items[-limit:]
+    return items
+
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """线性插值百分位数，pct 取 0-100"""
+    vals = sorted(v for v in values if v is not None)
+    if not vals:
+        return None
+    if len(vals) == 1:
+        return vals[0]
+    k = (len(vals) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(vals) - 1)
+    return vals[lo] + (vals[hi] - vals[lo]) * (k - lo)
+
+
+def summary(role: Optional[str] = None,
+            since: Optional[float] = None) -> Dict[str, dict]:
+    """按 (角色, 模型) 汇总：调用数、错误数、TTFT p50/p90、平均耗时、速度与 token 用量"""
+    groups: Dict[str, List[CallMetrics]] = {}
+    for m in query(role, since=since):
+        groups.setdefault(f"{m.role}/{m.model}", []).append(m)
+
+    out = {}
+    for key, items in groups.items():
+        live = [m for m in items if m.status != "cached"]
+        ok = [m for m in live if m.status in ("ok", "stopped")]
+        speeds = [m.tokens_per_sec for m in ok if m.tokens_per_sec]
+        latencies = [m.latency for m in ok if m.latency is not None]
+        out[key] = {
+            "calls": len(items),
+            "errors": sum(1 for m in items if m.status == "error"),
+            "cache_hits": len(items) - len(live),
+            "retries": sum(m.retries for m in items),
+            "throttled": sum(m.throttled for m in items),
+            "ttft_p50": percentile([m.ttft for m in live], 50),
+            "ttft_p90": percentile([m.ttft for m in live], 90),
+            "latency_avg": sum(latencies) / len(latencies) if latencies else None,
+            "tokens_per_sec": sum(speeds) / len(speeds) if speeds else None,
+            "prompt_tokens": sum(m.prompt_tokens or 0 for m in items),
+            "completion_tokens": sum(m.completion_tokens or 0 for m in items),
+            "finish_reasons": sorted({m.finish_reason for m in items if m.finish_reason}),
+        }
+    return out
+
+
+def record_task(role: str, model: str, seconds: float, chars: int):
+    """记录一个计划任务（含多轮工具调用）的总耗时，供调度器估计任务成本"""
+    key = ((role or "unknown").lower(), model)
+    with _lock:
+        _task_records.setdefault(key, deque(maxlen=_MAX_TASK_RECORDS)).append((seconds, chars))
+
+
+def task_seconds_per_char(role: Optional[str] = None,
+                          model: Optional[str] = None) -> Optional[float]:
+    """历史任务每个描述字符对应的耗时（秒，中位数）；role / model 为 None 时不筛选，无记录返回 None"""
+    with _lock:
+        items = [rec for (r, m), recs in _task_records.items()
+                 if (role is None or r == role.lower()) and (model is None or m == model)
+                 for rec in recs]
+    return percentile([sec / max(1, chars) for sec, chars in items], 50)
+
+
+def clear():
+    """清空注册表"""
+    with _lock:
+        _records.clear()
+        _task_records.clear()
@@ -0,0 +1,396 @@
+"""
+core/agent/mock_server.py — 本地 OpenAI 兼容模拟服务（离线基准 / 回归）
+在本机提供 /chat/completions 流式接口，所有角色调用都可以在无网络环境下跑通：
+
+  python -m core.agent.mock_server [--port 8765] [--script mock.json]
+  python -m core.agent.mock_server --record fixtures/ --upstream https://api.example.com/v1
+  python -m core.agent.mock_server --replay fixtures/ [--realtime]
+
+然后把模型的 base_url 指向 http://127.0.0.1:<port>/v1 即可对 new / run enter 做端到端测量。
+
+三种模式:
+  script  按剧本生成回复：可配置 token 速率、首 token 延迟、错误注入（429 / 5xx / 流中断 / 流卡住），
+          以及按角色（请求头 X-Maren-Role）轮流返回的固定回复
+  record  作为代理转发到真实服务，同时把每次会话的分块与时序记录为夹具文件
+  replay  按请求内容哈希（与 response_cache 同一键）读取夹具并回放
+
+剧本文件示例（JSON，# 后为说明）:
+  {
+    "token_rate": 80,            # 每秒输出的分块数，0 表示不限速
+    "ttft": 0.3,                 # 首 token 延迟（秒）
+    "chunk_chars": 4,            # 每个分块的字符数
+    "errors": {"429": 0.1, "500": 0.05, "drop": 0.05, "stall": 0.05},   # 各类错误的注入概率
+    "stall_seconds": 600,        # stall 时中途停顿的秒数
+    "roles": {"leader": ["回复1", "回复2"], "coder": ["..."]},
+    "default": "OK"
+  }
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import requests
+
+from core.agent import response_cache
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8765
+ROLE_HEADER = "X-Maren-Role"
+
+
+def _default_script() -> dict:
+    return {
+        "token_rate": 0,
+        "ttft": 0.0,
+        "chunk_chars": 4,
+        "errors": {},
+        "stall_seconds": 600,
+        "roles": {},
+        "default": "OK",
+    }
+
+
+def load_script(path: Optional[str]) -> dict:
+    """读取剧本文件，缺省字段使用默认值"""
+    script = _default_script()
+    if path:
+        with open(path, "r", encoding="utf-8") as f:
+            script.update(json.load(f))
+    return script
+
+
+def _sse(obj) -> bytes:
+    return b"data: " + json.dumps(obj, ensure_ascii=False).encode("utf-8") + b"\n\n"
+
+
+def _delta_event(model: str, content: str) -> bytes:
+    return _sse({"object": "chat.completion.chunk", "model": model,
+                 "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}]})
+
+
+def _finish_event(model: str, finish_reason: str, usage: Optional[dict]) -> bytes:
+    obj = {"object": "chat.completion.chunk", "model": model,
+           "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}]}
+    if usage:
+        obj["usage"] = usage
+    return _sse(obj)
+
+
+class MockState:
+    """服务端共享状态：剧本、每个角色的回复游标、夹具目录与统计"""
+
+    def __init__(self, script: dict, mode: str = "script",
+                 fixtures: Optional[str] = None, upstream: Optional[str] = None,
+                 realtime: bool = False, seed: Optional[int] = None):
+        self.script = script
+        self.mode = mode
+        self.fixtures = fixtures
+        self.upstream = upstream.rstrip("/") if upstream else None
+        self.realtime = realtime
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._cursor: Dict[str, int] = {}
+        self.stats = {"requests": 0, "errors_injected": 0, "recorded": 0, "replayed": 0, "missing": 0}
+
+    def count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def next_reply(self, role: str) -> str:
+        """按角色轮流取剧本回复"""
+        replies = self.script.get("roles", {}).get(role)
+        if not replies:
+            return self.script.get("default", "OK")
+        if isinstance(replies, str):
+            return replies
+        with self._lock:
+            i = self._cursor.get(role, 0)
+            self._cursor[role] = i + 1
+        return replies[i % len(replies)]
+
+    def pick_error(self) -> Optional[str]:
+        """按剧本概率抽取一种注入错误：状态码字符串、"drop" 或 "stall"，不注入返回 None"""
+        roll = self.random.random()
+        acc = 0.0
+        for kind, prob in (self.script.get("errors") or {}).items():
+            acc += float(prob)
+            if roll < acc:
+                return kind
+        return None
+
+    def fixture_path(self, key: str) -> str:
+        return os.path.join(self.fixtures, f"{key}.json")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    state: MockState = None
+
+    def log_message(self, fmt, *args):
+        logger.debug("mock: " + fmt % args)
+
+    # ---- HTTP 基础 ----
+
+    def _write_chunk(self, data: bytes):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _end_chunks(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _start_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _send_json(self, status: int, obj: dict, headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(obj, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_error(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        self._send_json(status, {"error": {"message": message, "type": "mock_error"}}, headers)
+
+    # ---- 路由 ----
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        elif self.path.rstrip("/").endswith("/_stats"):
+            self._send_json(200, self.state.stats)
+        else:
+            self._send_error(404, f"未知路径: {self.path}")
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_error(404, f"未知路径: {self.path}")
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_error(400, "请求体不是合法 JSON")
+            return
+        self.state.count("requests")
+        role = (self.headers.get(ROLE_HEADER) or "").lower()
+        try:
+            if self.state.mode == "record":
+                self._record(body, role)
+            elif self.state.mode == "replay":
+                self._replay(body)
+            else:
+                self._scripted(body, role)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # 客户端提前断开
+
+    # ---- script 模式 ----
+
+    def _scripted(self, body: dict, role: str):
+        script = self.state.script
+        model = body.get("model", "mock")
+        error = self.state.pick_error()
+        if error and error not in ("drop", "stall"):
+            self.state.count("errors_injected")
+            headers = {"Retry-After": "1"} if error == "429" else None
+            self._send_error(int(error), f"注入错误 {error}", headers)
+            return
+
+        reply = self._continued(body) or self.state.next_reply(role)
+        size = max(1, int(script.get("chunk_chars", 4)))
+        chunks = [reply[i:i + size] for i in range(0, len(reply), size)] or [""]
+        rate = float(script.get("token_rate") or 0)
+        interval = 1.0 / rate if rate > 0 else 0.0
+        # 流中断 / 卡住注入：在中途某个分块之后直接断开，或停顿 stall_seconds 秒
+        fault_at = self.state.random.randrange(len(chunks)) if error else None
+        if fault_at is not None:
+            self.state.count("errors_injected")
+
+        self._start_stream()
+        time.sleep(float(script.get("ttft") or 0))
+        for i, chunk in enumerate(chunks):
+            if i and interval:
+                time.sleep(interval)
+            self._write_chunk(_delta_event(model, chunk))
+            if i == fault_at:
+                if error == "drop":
+                    self.close_connection = True
+                    return
+                time.sleep(float(script.get("stall_seconds") or 0))
+        usage = None
+        if (body.get("stream_options") or {}).get("include_usage"):
+            prompt = sum(len(m.get("content") or "") for m in body.get("messages", []))
+            usage = {"prompt_tokens": int(prompt / 2.5), "completion_tokens": len(chunks),
+                     "total_tokens": int(prompt / 2.5) + len(chunks)}
+        self._write_chunk(_finish_event(model, "stop", usage))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._end_chunks()
+
+    def _continued(self, body: dict) -> Optional[str]:
+        """续写请求（末尾为 部分回复 + 续写指令）：返回剧本回复中尚未输出的部分"""
+        messages = body.get("messages") or []
+        if len(messages) < 2 or messages[-2].get("role") != "assistant":
+            return None
+        partial = messages[-2].get("content") or ""
+        for reply in self._candidates():
+            if partial and reply.startswith(partial) and len(reply) > len(partial):
+                return reply[len(partial):]
+        return None
+
+    def _candidates(self):
+        script = self.state.script
+        yield script.get("default", "OK")
+        for replies in (script.get("roles") or {}).values():
+            yield from ([replies] if isinstance(replies, str) else replies)
+
+    # ---- record 模式 ----
+
+    def _record(self, body: dict, role: str):
+        url = self.state.upstream + "/chat/completions"
+        headers = {k: v for k, v in self.headers.items()
+                   if k.lower() in ("authorization", "content-type", "accept")}
+        try:
+            resp = requests.post(url, json=body, headers=headers, stream=True, timeout=(15, 180))
+        except requests.exceptions.RequestException as e:
+            self._send_error(502, f"上游请求失败: {e}")
+            return
+        if resp.status_code != 200:
+            raw = resp.content
+            self.send_response(resp.status_code)
+            self.send_header("Content-Type", resp.headers.get("Content-Type", "application/json"))
+            self.send_header("Content-Length", str(len(raw)))
+            if resp.headers.get("Retry-After"):
+                self.send_header("Retry-After", resp.headers["Retry-After"])
+            self.end_headers()
+            self.wfile.write(raw)
+            return
+
+        from core.agent.sse import SSEDecoder
+        decoder = SSEDecoder()
+        chunks: List[str] = []
+        offsets: List[float] = []
+        t0 = time.perf_counter()
+        self._start_stream()
+        try:
+            for raw in resp.iter_content(chunk_size=None):
+                if not raw:
+                    continue
+                self._write_chunk(raw)
+                for content in decoder.feed(raw):
+                    chunks.append(content)
+                    offsets.append(round(time.perf_counter() - t0, 4))
+            self._end_chunks()
+        finally:
+            resp.close()
+        if not decoder.done:
+            return  # 不完整的会话不落盘
+        key = response_cache.make_key(body.get("model", ""), body.get("messages", []),
+                                      body.get("temperature"), body.get("max_tokens"))
+        fixture = {
+            "role": role, "model": body.get("model"), "request": body,
+            "chunks": chunks, "offsets": offsets,
+            "finish_reason": decoder.finish_reason, "usage": decoder.usage,
+        }
+        os.makedirs(self.state.fixtures, exist_ok=True)
+        with open(self.state.fixture_path(key), "w", encoding="utf-8") as f:
+            json.dump(fixture, f, ensure_ascii=False, indent=2)
+        self.state.count("recorded")
+
+    # ---- replay 模式 ----
+
+    def _replay(self, body: dict):
+        model = body.get("model", "mock")
+        key = response_cache.make_key(model, body.get("messages", []),
+                                      body.get("temperature"), body.get("max_tokens"))
+        path = self.state.fixture_path(key)
+        if not os.path.exists(path):
+            self.state.count("missing")
+            self._send_error(404, f"没有匹配的夹具: {key}")
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            fixture = json.load(f)
+        self.state.count("replayed")
+
+        script = self.state.script
+        rate = float(script.get("token_rate") or 0)
+        interval = 1.0 / rate if rate > 0 else 0.0
+        offsets = fixture.get("offsets") or []
+        self._start_stream()
+        if not self.state.realtime:
+            time.sleep(float(script.get("ttft") or 0))
+        t0 = time.perf_counter()
+        for i, chunk in enumerate(fixture.get("chunks", [])):
+            if self.state.realtime and i < len(offsets):
+                # 按录制时的时序回放
+                wait = offsets[i] - (time.perf_counter() - t0)
+                if wait > 0:
+                    time.sleep(wait)
+            elif i and interval:
+                time.sleep(interval)
+            self._write_chunk(_delta_event(model, chunk))
+        usage = fixture.get("usage") if (body.get("stream_options") or {}).get("include_usage") else None
+        self._write_chunk(_finish_event(model, fixture.get("finish_reason") or "stop", usage))
+        self._write_chunk(b"data: [DONE]\n\n")
+        self._end_chunks()
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 高并发压测时客户端连接池会主动断开多余连接，不打印堆栈
+        logger.debug(f"mock: 连接 {client_address} 异常断开")
+
+
+def start(state: MockState, host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """在后台线程启动服务，返回 server（server.server_port 为实际端口）"""
+    handler = type("MockHandler", (_Handler,), {"state": state})
+    server = _Server((host, port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Maren Code 本地 OpenAI 兼容模拟服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--script", help="剧本文件（JSON）")
+    parser.add_argument("--record", metavar="DIR", help="代理到 --upstream 并把会话录制到 DIR")
+    parser.add_argument("--upstream", help="record 模式下的真实服务 base_url")
+    parser.add_argument("--replay", metavar="DIR", help="从 DIR 回放录制的夹具")
+    parser.add_argument("--realtime", action="store_true", help="回放时使用录制时的时序")
+    parser.add_argument("--seed", type=int, help="错误注入的随机种子")
+    args = parser.parse_args(argv)
+
+    if args.record and not args.upstream:
+        parser.error("--record 需要同时指定 --upstream")
+    mode = "record" if args.record else "replay" if args.replay else "script"
+    state = MockState(load_script(args.script), mode=mode,
+                      fixtures=args.record or args.replay, upstream=args.upstream,
+                      realtime=args.realtime, seed=args.seed)
+    server = start(state, args.host, args.port)
+    print(f"mock server ({mode}) 监听 http://{args.host}:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+        print(json.dumps(state.stats, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,57 @@
 """
 core/agent/orchestrator.py — 多智能体并行协作引擎
 Leader 规划 → Coder/Tester 并行执行 → 结果汇总
+任务提交到模块级复用的线程池，完成通过 future 通知：
+一批任务结束的同一时刻进入下一批，状态只在任务完成时重绘。
+Ctrl-C 时取消尚未开始的任务，关闭执行中任务的连接（http_pool.AbortHandle），等工作线程结束后再向上抛出。
 """
 import json
 import threading
-import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from typing import Dict, List, Optional
 from colorama import Fore, Style
 
-from core.agent import request
+from core import config_store
+from core.scheduler import TaskGraph
+from core.agent import request, http_pool
 from display.panel import (
     divider, role_tag, progress_bar,
     status_line, task_panel
 )
 import constants
 
+# 任务执行线程池大小（一批任务超过此数时排队）
+MAX_WORKERS = 16
+# 等待完成事件的最长阻塞时间：只用于让 Ctrl-C 能及时打断等待，任务完成时立即唤醒
+_WAIT = 0.5
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="orchestrator")
+        return _executor
+
+
+def shutdown(wait_running: bool = True):
+    """关闭任务线程池：取消排队中的任务；wait_running 为 True 时等待执行中的任务结束"""
+    global _executor
+    with _executor_lock:
+        pool, _executor = _executor, None
+    if pool is not None:
+        pool.shutdown(wait=wait_running, cancel_futures=True)
+
 
 def _load_config():
     """加载 maren.json 配置"""
     import utils.inited as inited
     config_path = inited.maren_json_path()
     try:
-        with open(config_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        return config_store.load(config_path)
     except FileNotFoundError:
         print(f"  {Fore.RED}[ERROR] 配置文件不存在: {config_path}{Style.RESET_ALL}")
         return None
@@ -71,6 +100,7 @@ def _call_role(role: str, system_prompt: str, user_msg: str,
             full_system, [], user_msg,
             temperature=rc.get("temperature"),
             max_tokens=rc.get("max_tokens"),
+            role=role,
         ):
             parts.append(chunk)
     except RuntimeError as e:
@@ -149,29 +179,49 @@ def _execute_task(task: dict, config: dict, lang: str,
         print(f"  {Fore.RED}[ERROR] 任务 #{result.task_id} ({role}) 执行异常: {e}{Style.RESET_ALL}")
 
 
+def _run_abortable(handle: "http_pool.AbortHandle", *args):
+    """在工作线程中执行任务，期间的请求登记在 handle 上，可被另一线程中止"""
+    http_pool.bind(handle)
+    try:
+        _execute_task(*args)
+    finally:
+        http_pool.bind(None)
+
+
 def _run_parallel_tasks(tasks: list, config: dict, lang: str,
                         context: str = "") -> List[TaskResult]:
-    """并行执行一批无依赖的任务"""
+    """并行执行一批无依赖的任务，任一任务完成时立即重绘状态，全部完成即返回"""
+    # 连接池大小跟随本批并发数，避免线程间争抢连接导致重复握手
+    http_pool.ensure_pool_size(min(len(tasks), MAX_WORKERS))
     results = []
-    threads = []
+    handles = []
+    pending = set()
+    pool = _pool()
     for t in tasks:
         r = TaskResult(t["id"], t.get("role", "Coder"), t.get("title", ""))
         results.append(r)
-        th = threading.Thread(
-            target=_execute_task,
-            args=(t, config, lang, r, context),
-            daemon=True
-        )
-        threads.append(th)
-
-    # 启动所有线程
-    for th in threads:
-        th.start()
-
-    # 等待完成，实时打印状态
-    while any(th.is_alive() for th in threads):
-        time.sleep(0.5)
-        _print_live_status(results)
+        handle = http_pool.AbortHandle()
+        handles.append(handle)
+        pending.add(pool.submit(_run_abortable, handle, t, config, lang, r, context))
+
+    try:
+        while pending:
+            finished, pending = wait(pending, timeout=_WAIT, return_when=FIRST_COMPLETED)
+            if finished:
+                _print_live_status(results)
+    except KeyboardInterrupt:
+        # 排队中的任务直接取消；执行中的任务关闭连接后很快返回，等线程结束再向上抛出
+        unfinished = [r for r in results if r.status in ("pending", "running")]
+        for f in pending:
+            f.cancel()
+        for handle in handles:
+            handle.abort()
+        shutdown(wait_running=True)
+        for r in unfinished:
+            if r.status != "done":
+                r.status = "cancelled"
+        _print_live_status(results, final=True)
+        raise
 
     # 最终状态
     _print_live_status(results, final=True)
@@ -191,28 +241,11 @@ def _print_live_status(results: List[TaskResult], final=False):
 
 
 def _topological_layers(tasks: list) -> List[List[dict]]:
-    """将任务按依赖关系分成可并行执行的层"""
-    task_map = {t["id"]: t for t in tasks}
-    done_ids = set()
-    layers = []
-    remaining = list(tasks)
-
-    while remaining:
-        # 找出所有依赖已满足的任务
-        layer = []
-        for t in remaining:
-            deps = t.get("depends_on", [])
-            if all(d in done_ids for d in deps):
-                layer.append(t)
-        if not layer:
-            # 有循环依赖，强制执行剩余任务
-            layer = remaining[:]
-        for t in layer:
-            remaining.remove(t)
-            done_ids.add(t["id"])
-        layers.append(layer)
-
-    return layers
+    """将任务按依赖关系分成可并行执行的层（Kahn 算法，O(V+E)），并提示计划中的依赖问题"""
+    graph = TaskGraph(tasks)
+    for issue in graph.issues:
+        status_line("Leader", issue, "error")
+    return graph.layers()
 
 
 def run_pipeline(user_request: str) -> dict:
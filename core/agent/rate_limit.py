@@ -0,0 +1,161 @@
+"""
+core/agent/rate_limit.py — 客户端共享限流（RPM / TPM 令牌桶）
+按 (base_url, api_key) 共享一个限流器，所有线程 / 协程在发送请求前排队领取配额，
+并行任务不再同时撞上服务端限额、又同时退避。服务端返回 429 时，
+Retry-After 会回灌到限流器，同一 key 的所有调用一起暂停到指定时间。
+
+限额在 maren.json 的 model.rate_limits 中配置，按 base_url 精确匹配，回退到 default：
+  "rate_limits": {
+      "default": {"rpm": 60, "tpm": 200000},
+      "https://api.example.com/v1": {"rpm": 20}
+  }
+未配置的维度不限流。
+"""
+import asyncio
+import email.utils
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core import config_store
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """每分钟 per_minute 个配额的令牌桶，容量为一分钟的配额，允许预约（余额为负表示排队）"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60.0
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, amount: float, now: float) -> float:
+        """预约 amount 个配额，返回需要等待的秒数"""
+        self._refill(now)
+        # 单次请求超过一分钟配额时按满额计，避免永远等不到
+        self.tokens -= min(amount, self.capacity)
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+    def adjust(self, amount: float, now: float):
+        """按实际用量补扣（正数）或退还（负数）配额"""
+        self._refill(now)
+        self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class RateLimiter:
+    """单个 (base_url, api_key) 的限流器：请求数桶 + token 数桶 + 服务端要求的暂停"""
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._lock = threading.Lock()
+        self._requests = TokenBucket(rpm) if rpm else None
+        self._tokens = TokenBucket(tpm) if tpm else None
+        self._blocked_until = 0.0
+
+    def reserve(self, tokens: int) -> float:
+        """预约一次请求和 tokens 个 token，返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self._requests:
+                wait = max(wait, self._requests.reserve(1, now))
+            if self._tokens and tokens:
+                wait = max(wait, self._tokens.reserve(tokens, now))
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self, tokens: int = 0) -> float:
+        """阻塞直到可以发送，返回实际等待的秒数"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"限流排队 {wait:.2f}s")
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """acquire 的异步版本，不阻塞事件循环"""
+        wait = self.reserve(tokens)
+        if wait > 0:
+            logger.debug(f"限流排队 {wait:.2f}s")
+            await asyncio.sleep(wait)
+        return wait
+
+    def settle(self, delta: int):
+        """请求结束后按实际 token 用量修正预估（delta = 实际 - 预估）"""
+        if not self._tokens or not delta:
+            return
+        with self._lock:
+            self._tokens.adjust(delta, time.monotonic())
+
+    def backoff(self, seconds: float):
+        """服务端要求暂停（429 / Retry-After）：该 key 的所有调用等到指定时间"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 头（秒数或 HTTP 日期），无法解析返回 None"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when is None:
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """粗略估算 prompt token 数（与 ContextTracker 一致，约 2.5 字符 / token）"""
+    chars = sum(len(m.get("content") or "") for m in messages)
+    return int(chars / 2.5) + 1
+
+
+# ---- 配置与注册表 ----
+
+_lock = threading.Lock()
+_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+
+
+def _load_limits() -> dict:
+    """读取 maren.json 的 model.rate_limits（config_store 按 mtime 缓存）"""
+    import utils.inited as inited
+    limits = config_store.section(inited.maren_json_path(), "model", "rate_limits")
+    return limits if isinstance(limits, dict) else {}
+
+
+def limits_for(base_url: str) -> Tuple[Optional[float], Optional[float]]:
+    """该 base_url 的 (rpm, tpm)，未配置的维度为 None"""
+    limits = _load_limits()
+    cfg = limits.get(base_url) or limits.get(base_url.rstrip("/")) or limits.get("default") or {}
+    return cfg.get("rpm") or None, cfg.get("tpm") or None
+
+
+def get_limiter(base_url: str, api_key: str) -> RateLimiter:
+    """获取 (base_url, api_key) 共享的限流器；配置变化时重建"""
+    rpm, tpm = limits_for(base_url)
+    key = (base_url, api_key)
+    with _lock:
+        limiter = _limiters.get(key)
+        if limiter is None or (limiter.rpm, limiter.tpm) != (rpm, tpm):
+            limiter = _limiters[key] = RateLimiter(rpm, tpm)
+        return limiter
+
+
+def reset():
+    """清空所有限流器"""
+    with _lock:
+        _limiters.clear()
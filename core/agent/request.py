@@ -3,10 +3,173 @@ import logging
 import socket
 import time
 import requests
+import urllib3
 from typing import List, Dict, Optional, Iterator
 
+from core.agent import http_pool, metrics, rate_limit, response_cache, router, stops
+from core.agent.sse import SSEDecoder
+
 logger = logging.getLogger(__name__)
 
+# 重试策略（同步 / 异步客户端共用）
+MAX_RETRIES = 3
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# (连接超时, 读取超时) 秒；读取超时覆盖等待首个数据事件（首 token）的时间
+TIMEOUT = (15, 180)
+# 流开始输出后，两个分块之间的最长空闲时间（秒），超过视为流卡死
+STREAM_IDLE_TIMEOUT = 45
+# 流被截断（没有 [DONE] 也没有 finish_reason）时自动续写的最大次数
+MAX_CONTINUATIONS = 2
+# 续写时在新输出开头查找与已有内容重叠部分的窗口（字符），短于 OVERLAP_MIN 的重叠视为巧合
+OVERLAP_WINDOW = 200
+OVERLAP_MIN = 8
+CONTINUE_PROMPT = (
+    "你的上一条回复在中途被截断了。请从截断处继续输出剩余内容，"
+    "不要重复已经输出的部分，也不要添加任何说明。"
+)
+
+# 不支持 stream_options.include_usage 的 base_url（运行时发现后记住）
+_usage_unsupported = set()
+
+
+class TruncatedError(RuntimeError):
+    """自动续写 MAX_CONTINUATIONS 次后回复仍不完整；partial 为已输出（已 yield）的全部内容"""
+
+    def __init__(self, message: str, partial: str = ""):
+        super().__init__(message)
+        self.partial = partial
+
+
+def build_messages(
+    system: Optional[str],
+    history: List[Dict[str, str]],
+    question: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """拼装 system + 历史 + 本轮问题的消息列表"""
+    messages: List[Dict[str, str]] = []
+    if system:
+        messages.append({"role": "system", "content": system})
+    messages.extend(history)
+    if question:
+        messages.append({"role": "user", "content": question})
+    return messages
+
+
+def build_payload(
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+    include_usage: bool = False
+) -> dict:
+    """构建流式请求体；include_usage 时请求服务端在流末尾返回 token 用量"""
+    payload = {"model": model, "messages": messages, "stream": True}
+    if temperature is not None:
+        payload["temperature"] = temperature
+    if max_tokens is not None:
+        payload["max_tokens"] = max_tokens
+    if include_usage:
+        payload["stream_options"] = {"include_usage": True}
+    return payload
+
+
+def usage_supported(base_url: str) -> bool:
+    """该 base_url 是否可以发送 stream_options（未被拒绝过即视为支持）"""
+    return base_url not in _usage_unsupported
+
+
+def mark_usage_unsupported(base_url: str):
+    """记录该 base_url 不接受 stream_options，后续请求不再携带"""
+    _usage_unsupported.add(base_url)
+    logger.info(f"{base_url} 不支持 stream_options，已关闭流式用量统计")
+
+
+def rejects_stream_options(status: int, msg: str) -> bool:
+    """判断错误是否由 stream_options 字段引起"""
+    if status not in (400, 422):
+        return False
+    lower = (msg or "").lower()
+    return "stream_options" in lower or "include_usage" in lower
+
+
+def build_headers(api_key: str, role: Optional[str] = None) -> Dict[str, str]:
+    """构建流式请求头；role 以 X-Maren-Role 头携带，供本地模拟服务按角色回放"""
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        "Accept": "text/event-stream",
+        "Accept-Encoding": "identity",
+        "Cache-Control": "no-cache"
+    }
+    if role:
+        headers["X-Maren-Role"] = role
+    return headers
+
+
+def retry_wait(attempt: int) -> int:
+    """第 attempt 次重试前的等待秒数（指数退避，上限 10s）"""
+    return min(2 ** attempt, 10)
+
+
+def retry_delay(limiter: "rate_limit.RateLimiter", attempt: int,
+                status: int, retry_after: Optional[str]) -> float:
+    """
+    可重试状态码的处理：429 时把 Retry-After（缺省为指数退避时长）回灌给共享限流器，
+    由下次 acquire 统一等待；返回调用方还需自行等待的秒数
+    """
+    if status == 429:
+        limiter.backoff(rate_limit.parse_retry_after(retry_after) or retry_wait(attempt))
+        return 0
+    return retry_wait(attempt)
+
+
+def actual_tokens(m: "metrics.CallMetrics", estimate: int) -> int:
+    """本次调用实际消耗的 token：优先用服务端 usage，否则用预估 prompt + 输出字符估算"""
+    if m.total_tokens:
+        return m.total_tokens
+    return estimate + int(m.chars / 2.5)
+
+
+def continuation_messages(messages: List[Dict[str, str]],
+                          partial: str) -> List[Dict[str, str]]:
+    """续写请求的消息列表：原消息 + 已输出的部分回复 + 续写指令"""
+    return messages + [
+        {"role": "assistant", "content": partial},
+        {"role": "user", "content": CONTINUE_PROMPT},
+    ]
+
+
+def overlap(previous: str, head: str) -> int:
+    """续写内容开头与已有内容结尾重复的字符数（模型常会重复断点前的几个词）"""
+    for k in range(min(len(previous), len(head), OVERLAP_WINDOW), OVERLAP_MIN - 1, -1):
+        if previous.endswith(head[:k]):
+            return k
+    return 0
+
+
+def needs_continuation(done: bool, finish_reason: Optional[str],
+                       continue_on_length: bool) -> bool:
+    """流是否被截断（或因长度上限中止且调用方要求续写）"""
+    if not done and not finish_reason:
+        return True
+    return continue_on_length and finish_reason == "length"
+
+
+def error_message(status: int, body: bytes) -> str:
+    """从非 200 响应体中提取错误信息"""
+    try:
+        error = json.loads(body.decode("utf-8", errors="replace"))
+        if isinstance(error, dict):
+            err = error.get("error")
+            if isinstance(err, dict):
+                return err.get("message", str(error))
+        return str(error)
+    except (json.JSONDecodeError, ValueError):
+        text = body.decode("utf-8", errors="replace")
+        return text[:500] if text else f"HTTP {status}"
+    except Exception:
+        return f"HTTP {status} (响应解析失败)"
+
 
 def chat_complete(
     base_url: str,
@@ -16,7 +179,11 @@ def chat_complete(
     history: List[Dict[str, str]],
     question: Optional[str] = None,
     temperature: Optional[float] = None,
-    max_tokens: Optional[int] = None
+    max_tokens: Optional[int] = None,
+    role: Optional[str] = None,
+    cache: Optional[bool] = None,
+    stop: Optional["stops.StopCondition"] = None,
+    continue_on_length: bool = False
 ) -> Iterator[str]:
     """
     流式调用 OpenAI 兼容 API
@@ -28,50 +195,303 @@ def chat_complete(
     :param question: 用户问题
     :param temperature: 温度参数
     :param max_tokens: 最大 token 数
+    :param role: 调用方角色（用于遥测统计与缓存开关）
+    :param cache: 是否使用响应缓存，None 表示按 config.json 中该角色的开关
+    :param stop: 停止条件（core.agent.stops），触发后截断并立即关闭连接
+    :param continue_on_length: finish_reason 为 length 时也自动续写（流被截断时总会续写）
     :return: 逐块返回文本的迭代器
+    :raises TruncatedError: 续写 MAX_CONTINUATIONS 次后回复仍不完整（已输出的内容不可当作完整回复）
+    """
+    messages = build_messages(system, history, question)
+    if stop is not None:
+        stop = stop.fresh()
+    if cache is None:
+        cache = response_cache.enabled_for(role)
+    if not cache:
+        yield from _resumable_completion(
+            base_url, api_key, model, messages, temperature, max_tokens, role,
+            stop=stop, continue_on_length=continue_on_length,
+        )
+        return
+
+    key = response_cache.make_key(model, messages, temperature, max_tokens,
+                                  stop.name if stop else None)
+    cached = response_cache.lookup(key)
+    if cached is not None:
+        # 命中：按原始分块回放，渲染器行为与实时流一致
+        metrics.record_cache_hit(role, model, base_url, cached)
+        yield from cached
+        return
+
+    chunks: List[str] = []
+
+    def _save(done: bool, finish_reason: Optional[str]):
+        # 只缓存完整结束的回复，被截断或超长的不缓存
+        if done and finish_reason in (None, "stop"):
+            response_cache.store(key, chunks, model)
+
+    for content in _resumable_completion(
+        base_url, api_key, model, messages, temperature, max_tokens, role,
+        on_complete=_save, stop=stop, continue_on_length=continue_on_length,
+    ):
+        chunks.append(content)
+        yield content
+
+
+def _resumable_completion(
+    base_url: str,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    role: Optional[str],
+    on_complete=None,
+    stop: Optional["stops.StopCondition"] = None,
+    continue_on_length: bool = False
+) -> Iterator[str]:
+    """
+    流被截断（连接中断 / 空闲超时，既没有 [DONE] 也没有 finish_reason）时，
+    把已输出的部分作为 assistant 消息追加后重新请求，并把续写内容拼接到原输出之后；
+    续写次数用完仍不完整时抛出 TruncatedError
+    """
+    produced: List[str] = []
+    convo = messages
+    state = {}
+
+    def _on_segment(done: bool, finish_reason: Optional[str]):
+        state["done"] = done
+        state["finish_reason"] = finish_reason
+
+    for attempt in range(MAX_CONTINUATIONS + 1):
+        state.clear()
+        stream = _routed_completion(
+            base_url, api_key, model, convo, temperature, max_tokens, role,
+            on_complete=_on_segment, stop=stop,
+        )
+        if produced:
+            stream = _stitch("".join(produced), stream)
+        try:
+            for content in stream:
+                produced.append(content)
+                yield content
+        finally:
+            stream.close()
+        if not state or not needs_continuation(
+                state["done"], state["finish_reason"], continue_on_length):
+            break
+        if http_pool.aborted():
+            break
+        reason = "长度上限" if state["finish_reason"] == "length" else "流被截断"
+        if attempt == MAX_CONTINUATIONS:
+            raise TruncatedError(f"回复{reason}，自动续写 {MAX_CONTINUATIONS} 次后仍不完整",
+                                 "".join(produced))
+        logger.warning(f"{role or 'unknown'} {reason}，已输出 {sum(map(len, produced))} 字符，自动续写")
+        convo = continuation_messages(messages, "".join(produced)) if produced else messages
+
+    if on_complete and state:
+        on_complete(state["done"], state["finish_reason"])
+
+
+def _stitch(previous: str, stream: Iterator[str]) -> Iterator[str]:
+    """续写流：缓冲开头一段，去掉与已有内容重复的部分后再输出"""
+    head = ""
+    for content in stream:
+        if head is None:
+            yield content
+            continue
+        head += content
+        if len(head) < OVERLAP_WINDOW:
+            continue
+        yield head[overlap(previous, head):]
+        head = None
+    if head:
+        yield head[overlap(previous, head):]
+
+
+def _routed_completion(
+    base_url: str,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    role: Optional[str],
+    on_complete=None,
+    stop: Optional["stops.StopCondition"] = None
+) -> Iterator[str]:
+    """
+    角色声明了后端池时按负载与延迟选择后端，否则直连；
+    某个后端在产出任何内容之前失败时，换下一个后端重发
+    """
+    pool = router.pool_for(role, base_url, api_key, model)
+    if pool is None:
+        yield from _stream_completion(
+            base_url, api_key, model, messages, temperature, max_tokens, role,
+            on_complete=on_complete, stop=stop,
+        )
+        return
+
+    tried = []
+    while True:
+        backend = pool.acquire(exclude=tried)
+        tried.append(backend)
+        finished = []
+
+        def _on_metrics(m: "metrics.CallMetrics"):
+            finished.append(m)
+
+        stream = _stream_completion(
+            backend.base_url, backend.api_key, backend.model, messages,
+            temperature, max_tokens, role,
+            on_complete=on_complete, stop=stop, on_metrics=_on_metrics,
+        )
+        produced = False
+        try:
+            for content in stream:
+                produced = True
+                yield content
+            return
+        except RuntimeError as e:
+            if produced or len(tried) >= len(pool.backends):
+                raise
+            logger.warning(f"{role} 后端 {backend.label} 失败，切换后端重试: {e}")
+        finally:
+            stream.close()
+            m = finished[0] if finished else None
+            pool.release(backend, m.status if m else "error", m.ttft if m else None)
+
+
+def _stream_completion(
+    base_url: str,
+    api_key: str,
+    model: str,
+    messages: List[Dict[str, str]],
+    temperature: Optional[float],
+    max_tokens: Optional[int],
+    role: Optional[str],
+    on_complete=None,
+    stop: Optional["stops.StopCondition"] = None,
+    on_metrics=None
+) -> Iterator[str]:
+    """
+    实际的网络流式调用
+    :param on_complete: 流结束时回调 (是否完整结束, finish_reason)，停止条件触发视为完整结束
+    :param stop: 停止条件（已是新实例）
+    :param on_metrics: 调用结束（含失败）时回调本次的 CallMetrics
     """
     url = base_url.rstrip("/") + "/chat/completions"
-    messages: List[Dict[str, str]] = []
-    if system:
-        messages.append({"role": "system", "content": system})
-    messages.extend(history)
-    if question:
-        messages.append({"role": "user", "content": question})
+    payload = build_payload(model, messages, temperature, max_tokens,
+                            include_usage=usage_supported(base_url))
+    headers = build_headers(api_key, role)
+    session = http_pool.get_session(url)
+    m = metrics.CallMetrics(role, model, base_url)
+    limiter = rate_limit.get_limiter(base_url, api_key)
+    estimate = rate_limit.estimate_tokens(messages)
 
-    payload = {"model": model, "messages": messages, "stream": True}
-    if temperature is not None:
-        payload["temperature"] = temperature
-    if max_tokens is not None:
-        payload["max_tokens"] = max_tokens
+    # _open_stream 返回的响应带着一份尚未结算的 token 预约
+    reserved = False
+    try:
+        resp = _open_stream(session, url, payload, headers, m, limiter, estimate)
+        reserved = True
+        if resp.status_code != 200:
+            status = resp.status_code
+            msg = _read_error(resp)
+            if "stream_options" in payload and rejects_stream_options(status, msg):
+                # 服务端不支持 stream_options：记住后去掉该字段重发
+                mark_usage_unsupported(base_url)
+                payload.pop("stream_options", None)
+                limiter.settle(-estimate)
+                reserved = False
+                resp = _open_stream(session, url, payload, headers, m, limiter, estimate)
+                reserved = True
+                if resp.status_code != 200:
+                    status = resp.status_code
+                    msg = _read_error(resp)
+            if resp.status_code != 200:
+                raise RuntimeError(f"API 错误 ({status}): {msg}")
+    except BaseException as e:
+        # 没有可读取的流：退还预约（错误响应与网络异常都不消耗 token）
+        if reserved:
+            limiter.settle(-estimate)
+        if isinstance(e, RuntimeError):
+            m.finish("error", str(e))
+            if on_metrics:
+                on_metrics(m)
+        raise
 
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        "Accept": "text/event-stream",
-        "Accept-Encoding": "identity",
-        "Cache-Control": "no-cache"
-    }
+    resp.raw.decode_content = False
 
+    decoder = SSEDecoder()
+    outcome = "aborted"  # 调用方提前停止迭代或被中断
+    stopped = False
+    try:
+        for content in _parse_sse_stream(resp, decoder):
+            m.first_token()
+            if stop is not None:
+                keep = stop.feed(content)
+                if keep >= 0:
+                    content = content[:keep]
+                    stopped = True
+            m.chars += len(content)
+            if content:
+                yield content
+            if stopped:
+                break
+        if stopped:
+            outcome = "stopped"
+            if on_complete:
+                on_complete(True, "stop")
+        else:
+            outcome = "ok" if decoder.done else "truncated"
+            if on_complete:
+                on_complete(decoder.done, decoder.finish_reason)
+    finally:
+        m.finish_reason = decoder.finish_reason
+        m.set_usage(decoder.usage)
+        m.finish(outcome)
+        limiter.settle(actual_tokens(m, estimate) - estimate)
+        _release_response(resp, decoder.done)
+        if on_metrics:
+            on_metrics(m)
+
+
+def _open_stream(session, url: str, payload: dict, headers: Dict[str, str],
+                 m: "metrics.CallMetrics", limiter: "rate_limit.RateLimiter",
+                 estimate: int):
+    """
+    发送请求并返回响应（含限流与重试逻辑），重试次数与排队时间计入遥测
+    每次尝试前预约 estimate 个 token：没有得到要返回的响应时（网络异常、可重试状态码、中断）
+    立即退还；返回的响应保留这份预约，由调用方在流结束后按实际用量结算
+    """
     # 重试逻辑：覆盖网络异常和可重试的 HTTP 状态码
-    max_retries = 3
     resp = None
     last_error = None
-    _RETRYABLE_STATUS = {429, 500, 502, 503, 504}
 
-    for attempt in range(max_retries + 1):
+    for attempt in range(MAX_RETRIES + 1):
+        if http_pool.aborted():
+            raise RuntimeError("请求已中止")
+        m.throttled += limiter.acquire(estimate)
+        held = True  # 本次尝试的预约尚未退还，也未转交给返回的响应
         try:
-            resp = requests.post(
+            resp = session.post(
                 url, json=payload, headers=headers,
-                stream=True, timeout=(15, 180)
+                stream=True, timeout=TIMEOUT
             )
             # 可重试的 HTTP 状态码
-            if resp.status_code in _RETRYABLE_STATUS and attempt < max_retries:
-                wait = min(2 ** attempt, 10)
-                logger.warning(f"HTTP {resp.status_code}, 第 {attempt+1} 次重试, 等待 {wait}s")
+            if resp.status_code in RETRYABLE_STATUS and attempt < MAX_RETRIES:
+                wait = retry_delay(limiter, attempt, resp.status_code,
+                                   resp.headers.get("Retry-After"))
+                logger.warning(f"HTTP {resp.status_code}, 第 {attempt+1} 次重试, "
+                               + (f"等待 {wait}s" if wait else "由限流器统一退避"))
                 resp.close()
                 resp = None
+                limiter.settle(-estimate)
+                held = False
+                m.retries += 1
                 time.sleep(wait)
                 continue
+            held = False
             break
         except requests.exceptions.Timeout as e:
             last_error = f"请求超时: {e}"
@@ -83,100 +503,105 @@ def chat_complete(
             last_error = f"请求异常: {e}"
         except OSError as e:
             last_error = f"系统网络错误: {e}"
+        finally:
+            if held:
+                limiter.settle(-estimate)
 
-        if attempt < max_retries:
-            wait = min(2 ** attempt, 10)
+        if http_pool.aborted():
+            raise RuntimeError(f"请求已中止: {last_error}")
+        if attempt < MAX_RETRIES:
+            wait = retry_wait(attempt)
             logger.warning(f"{last_error}, 第 {attempt+1} 次重试, 等待 {wait}s")
+            m.retries += 1
             time.sleep(wait)
         else:
-            raise RuntimeError(f"{last_error} (已重试 {max_retries} 次)")
+            raise RuntimeError(f"{last_error} (已重试 {MAX_RETRIES} 次)")
 
     if resp is None:
         raise RuntimeError(f"请求失败: {last_error or '无法建立连接'}")
 
     # TCP_NODELAY 优化
     try:
-        sock = resp.raw._fp.fp.raw._sock
-        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        _socket(resp).setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
     except Exception:
         pass  # 非关键优化，静默忽略
+    return resp
+
+
+def _read_error(resp) -> str:
+    """读取非 200 响应的错误信息并关闭响应"""
+    try:
+        body = resp.content or b""
+    except Exception:
+        body = b""
+    resp.close()
+    return error_message(resp.status_code, body)
 
-    if resp.status_code != 200:
+
+def _release_response(resp, completed: bool):
+    """
+    释放响应连接
+    流正常结束（收到 [DONE]）时读完剩余字节，让连接回到连接池供下次复用；
+    异常、中途退出或停止条件触发时直接关闭，服务端随即停止生成
+    """
+    if completed:
         try:
-            error = resp.json()
-            msg = error.get("error", {}).get("message", str(error))
-        except (json.JSONDecodeError, ValueError):
-            msg = resp.text[:500] if resp.text else f"HTTP {resp.status_code}"
+            while resp.raw.read(4096):
+                pass
         except Exception:
-            msg = f"HTTP {resp.status_code} (响应解析失败)"
-        resp.close()
-        raise RuntimeError(f"API 错误 ({resp.status_code}): {msg}")
+            pass
+    resp.close()
 
-    resp.raw.decode_content = False
 
+def _socket(resp):
+    """取响应底层的 socket（取不到返回 None）"""
     try:
-        yield from _parse_sse_stream(resp)
-    finally:
-        resp.close()
-
+        return resp.raw._fp.fp.raw._sock
+    except Exception:
+        return None
 
-def _parse_sse_stream(resp) -> Iterator[str]:
-    """解析 SSE 流，使用缓冲读取提升性能，增强异常容错"""
-    buffer = b""
-    consecutive_errors = 0
-    max_consecutive_errors = 5
 
+def _parse_sse_stream(resp, decoder: SSEDecoder) -> Iterator[str]:
+    """
+    解析 SSE 流，逐个产出内容增量，使用缓冲读取提升性能，增强异常容错；
+    是否收到 [DONE] / finish_reason 记录在 decoder 上（decoder.done、decoder.finish_reason）。
+    首个数据事件到达后把读取超时收紧为 STREAM_IDLE_TIMEOUT，卡住的流不会占用线程数分钟
+    """
+    idle_armed = False
+    # read(n) 在分块编码下会一直等到凑满 n 字节；read1 有多少返回多少，分块到达即可解析
+    read = getattr(resp.raw, "read1", None) or resp.raw.read
     while True:
+        if not idle_armed and decoder.events:
+            idle_armed = True
+            sock = _socket(resp)
+            if sock is not None:
+                try:
+                    sock.settimeout(STREAM_IDLE_TIMEOUT)
+                except OSError:
+                    pass
         try:
-            chunk = resp.raw.read(4096)
+            chunk = read(4096)
         except requests.exceptions.ChunkedEncodingError as e:
             logger.warning(f"SSE 流传输中断: {e}")
             break
         except requests.exceptions.ConnectionError as e:
             logger.warning(f"SSE 流连接断开: {e}")
             break
+        except (urllib3.exceptions.ReadTimeoutError, socket.timeout) as e:
+            logger.warning(f"SSE 流空闲超过 {STREAM_IDLE_TIMEOUT}s，视为卡死: {e}")
+            break
         except OSError as e:
             logger.warning(f"SSE 流读取系统错误: {e}")
             break
         except Exception as e:
-            logger.warning(f"SSE 流读取未知错误: {type(e).__name__}: {e}")
+            # 被另一线程中止（http_pool.AbortHandle）时连接本就是主动关闭的，不必告警
+            if not http_pool.aborted():
+                logger.warning(f"SSE 流读取未知错误: {type(e).__name__}: {e}")
             break
 
         if not chunk:
             break
 
-        consecutive_errors = 0  # 成功读取，重置错误计数
-        buffer += chunk
-
-        while b"\n" in buffer:
-            line, buffer = buffer.split(b"\n", 1)
-            line = line.strip(b"\r")
-            if not line:
-                continue
-            if not line.startswith(b"data:"):
-                continue
-            data = line[5:].strip()
-            if data == b"[DONE]":
-                return
-            try:
-                data_text = data.decode("utf-8", errors="replace")
-            except Exception as e:
-                logger.warning(f"SSE 流解码失败 (忽略此块): {e}")
-                continue
-            try:
-                obj = json.loads(data_text)
-            except (json.JSONDecodeError, ValueError) as e:
-                consecutive_errors += 1
-                if consecutive_errors >= max_consecutive_errors:
-                    logger.error(f"SSE JSON 连续解析失败 {consecutive_errors} 次，终止流")
-                    return
-                logger.debug(f"SSE JSON解析失败 (忽略): {e}")
-                continue
-            consecutive_errors = 0
-            choices = obj.get("choices") or []
-            if not choices:
-                continue
-            delta = choices[0].get("delta") or {}
-            content = delta.get("content")
-            if content:
-                yield content
+        yield from decoder.feed(chunk)
+        if decoder.finished:
+            break
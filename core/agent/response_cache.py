@@ -0,0 +1,184 @@
+"""
+core/agent/response_cache.py — 基于内容寻址的 LLM 响应磁盘缓存
+以 (model, 完整 messages, temperature, max_tokens) 的哈希为键，
+把完整回复按原始分块保存在 .maren/cache/ 下，命中时按原分块回放成流，渲染器无感知。
+总大小超过上限时按 LRU（最近使用时间）淘汰。
+是否启用按角色在 config.json 的 cache.roles 中配置，默认全部关闭（config cache on <角色> 开启）。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+from core import settings
+from core.runtime_dir import maren_dir
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = "cache"
+_DEFAULT_MAX_MB = 64
+
+
+def make_key(model: str, messages: List[Dict[str, str]],
+             temperature: Optional[float], max_tokens: Optional[int],
+             stop: Optional[str] = None) -> str:
+    """计算请求的内容哈希；带停止条件的回复是截断后的文本，键中需区分"""
+    req = {"model": model, "messages": messages,
+           "temperature": temperature, "max_tokens": max_tokens}
+    if stop:
+        req["stop"] = stop
+    raw = json.dumps(req, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_config() -> dict:
+    """读取 config.json 中的 cache 配置"""
+    try:
+        return settings.get_cache_config()
+    except Exception:
+        return {}
+
+
+def enabled_for(role: Optional[str]) -> bool:
+    """该角色是否启用响应缓存"""
+    if not role:
+        return False
+    roles = _cache_config().get("roles") or {}
+    return bool(roles.get(settings.config_role(role)))
+
+
+class ResponseCache:
+    """单个缓存目录：文件存储 + 内存 LRU 索引（线程安全）"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None  # key -> 文件大小，按最近使用排序
+        self._total = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.json")
+
+    def _load_index(self):
+        """首次使用时扫描目录，按 mtime 建立 LRU 顺序"""
+        if self._index is not None:
+            return
+        entries = []
+        if os.path.isdir(self.root):
+            for sub in os.listdir(self.root):
+                subdir = os.path.join(self.root, sub)
+                if not os.path.isdir(subdir):
+                    continue
+                for name in os.listdir(subdir):
+                    if not name.endswith(".json"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(subdir, name))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, name[:-5], st.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total = sum(size for _, _, size in entries)
+
+    def get(self, key: str) -> Optional[List[str]]:
+        """读取缓存的分块列表；未命中返回 None"""
+        path = self._path(key)
+        with self._lock:
+            self._load_index()
+            if key not in self._index:
+                return None
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                os.utime(path, None)
+            except (OSError, ValueError) as e:
+                logger.debug(f"缓存读取失败 (视为未命中): {e}")
+                self._drop(key)
+                return None
+            self._index.move_to_end(key)
+        chunks = data.get("chunks")
+        return chunks if isinstance(chunks, list) else None
+
+    def put(self, key: str, chunks: List[str], model: str, max_bytes: int):
+        """写入缓存并按 LRU 淘汰到 max_bytes 以内"""
+        path = self._path(key)
+        body = json.dumps(
+            {"model": model, "created": time.time(), "chunks": chunks},
+            ensure_ascii=False,
+        )
+        with self._lock:
+            self._load_index()
+            try:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                tmp = f"{path}.{threading.get_ident()}.tmp"
+                with open(tmp, "w", encoding="utf-8") as f:
+                    f.write(body)
+                os.replace(tmp, path)
+                size = os.path.getsize(path)
+            except OSError as e:
+                logger.warning(f"写入响应缓存失败: {e}")
+                return
+            self._total -= self._index.pop(key, 0)
+            self._index[key] = size
+            self._total += size
+            while self._total > max_bytes and len(self._index) > 1:
+                old_key = next(iter(self._index))
+                self._drop(old_key)
+
+    def _drop(self, key: str):
+        """删除一条缓存（调用方持有锁）"""
+        self._total -= self._index.pop(key, 0)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self) -> int:
+        """清空缓存，返回删除的条目数"""
+        with self._lock:
+            self._load_index()
+            keys = list(self._index)
+            for key in keys:
+                self._drop(key)
+            return len(keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._load_index()
+            return {"entries": len(self._index), "bytes": self._total}
+
+
+_caches: Dict[str, ResponseCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache() -> ResponseCache:
+    """获取当前运行目录对应的缓存实例"""
+    root = os.path.join(maren_dir(), CACHE_DIR)
+    with _caches_lock:
+        cache = _caches.get(root)
+        if cache is None:
+            cache = _caches[root] = ResponseCache(root)
+        return cache
+
+
+def lookup(key: str) -> Optional[List[str]]:
+    """按键读取缓存分块"""
+    return get_cache().get(key)
+
+
+def store(key: str, chunks: List[str], model: str):
+    """保存完整回复的分块"""
+    if not chunks:
+        return
+    max_mb = _cache_config().get("max_mb", _DEFAULT_MAX_MB)
+    try:
+        max_bytes = int(float(max_mb) * 1024 * 1024)
+    except (TypeError, ValueError):
+        max_bytes = _DEFAULT_MAX_MB * 1024 * 1024
+    get_cache().put(key, chunks, model, max_bytes)
@@ -0,0 +1,195 @@
+"""
+core/agent/router.py — 按角色的多端点 / 多 key 负载均衡
+maren.json 的 model.backends 为角色声明后端池，角色自身的 base_url / api_key / model_name
+始终是池中第一个后端，声明的条目缺省字段沿用它：
+  "backends": {
+      "coder": [
+          {"api_key": "sk-second"},
+          {"base_url": "https://other.example.com/v1", "api_key": "sk-x", "model": "m2"},
+          {"extra_model": "gpt-4o-mini"}
+      ]
+  }
+extra_model 引用 config.json 的 extra_models（base_url / api_key，模型名即名称）。
+Designer 任务使用 Coder 的端点与模型，因此也使用 coder 的后端池（没有单独的 designer 池）。
+
+选择策略：未被摘除的后端中，(在途请求数 + 1) × 近期首 token 延迟（EWMA）最小者；
+尚无延迟数据的后端按已知最快者估计，以便被探测。连续失败的后端会被摘除一段时间，到期后自动恢复。
+并行的 Coder 任务因此分散到多个 key 上，按各 key 限额之和的速率运行。
+"""
+import logging
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from core import config_store, settings
+
+logger = logging.getLogger(__name__)
+
+# 连续失败多少次后摘除
+EJECT_AFTER = 2
+# 摘除时长（秒），再次摘除时翻倍，上限 EJECT_MAX
+EJECT_SECONDS = 30.0
+EJECT_MAX = 300.0
+# 延迟 EWMA 平滑系数
+EWMA_ALPHA = 0.3
+
+
+class Backend:
+    """池中的一个后端及其健康状态"""
+
+    def __init__(self, base_url: str, api_key: str, model: str):
+        self.base_url = base_url
+        self.api_key = api_key
+        self.model = model
+        self.outstanding = 0
+        self.ewma: Optional[float] = None      # 首 token 延迟 EWMA（秒）
+        self.failures = 0                      # 连续失败次数
+        self.ejections = 0
+        self.ejected_until = 0.0
+
+    @property
+    def label(self) -> str:
+        return f"{self.model}@{self.base_url} ({self.api_key[:4]}…)"
+
+    def healthy(self, now: float) -> bool:
+        return now >= self.ejected_until
+
+    def score(self, default_latency: float) -> Tuple[float, int]:
+        latency = self.ewma if self.ewma is not None else default_latency
+        return ((self.outstanding + 1) * latency, self.outstanding)
+
+
+class BackendPool:
+    """一个角色的后端池（线程安全）"""
+
+    def __init__(self, role: str, backends: List[Backend]):
+        self.role = role
+        self.backends = backends
+        self._lock = threading.Lock()
+
+    def acquire(self, exclude=()) -> Optional[Backend]:
+        """选出一个后端并计入在途请求；exclude 中的后端不参与（本次调用已失败过的）"""
+        with self._lock:
+            now = time.monotonic()
+            candidates = [b for b in self.backends if b not in exclude]
+            if not candidates:
+                return None
+            healthy = [b for b in candidates if b.healthy(now)]
+            if healthy:
+                # 尚无延迟数据的后端按已知最快者估计（乐观探测，同时仍受在途数约束）
+                known = [b.ewma for b in healthy if b.ewma is not None]
+                default = min(known) if known else 1.0
+                chosen = min(healthy, key=lambda b: b.score(default))
+            else:
+                # 全部被摘除：选最早恢复的，好过直接失败
+                chosen = min(candidates, key=lambda b: b.ejected_until)
+            chosen.outstanding += 1
+            return chosen
+
+    def release(self, backend: Backend, status: str, ttft: Optional[float]):
+        """调用结束后回报结果，更新延迟与健康状态"""
+        with self._lock:
+            backend.outstanding = max(0, backend.outstanding - 1)
+            if status in ("ok", "stopped"):
+                backend.failures = 0
+                backend.ejections = 0
+            elif status in ("error", "truncated"):
+                backend.failures += 1
+                if backend.failures >= EJECT_AFTER:
+                    seconds = min(EJECT_MAX, EJECT_SECONDS * 2 ** backend.ejections)
+                    backend.ejected_until = time.monotonic() + seconds
+                    backend.ejections += 1
+                    backend.failures = 0
+                    logger.warning(f"{self.role} 后端 {backend.label} 连续失败，摘除 {seconds:.0f}s")
+            if ttft is not None:
+                backend.ewma = ttft if backend.ewma is None else (
+                    EWMA_ALPHA * ttft + (1 - EWMA_ALPHA) * backend.ewma)
+
+    def snapshot(self) -> List[dict]:
+        """各后端当前状态，供 status 命令展示"""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                "backend": b.label,
+                "outstanding": b.outstanding,
+                "ttft_ewma": b.ewma,
+                "ejected_for": max(0.0, b.ejected_until - now),
+            } for b in self.backends]
+
+
+# ---- 配置与注册表 ----
+
+_lock = threading.Lock()
+_pools: Dict[tuple, BackendPool] = {}
+
+
+def _load_backends() -> dict:
+    """读取 maren.json 的 model.backends（config_store 按 mtime 缓存）"""
+    import utils.inited as inited
+    backends = config_store.section(inited.maren_json_path(), "model", "backends")
+    return backends if isinstance(backends, dict) else {}
+
+
+def _extra_models() -> dict:
+    try:
+        return settings.get_config().get("extra_models") or {}
+    except Exception:
+        return {}
+
+
+def _resolve(entries: list, base_url: str, api_key: str, model: str) -> List[Tuple[str, str, str]]:
+    """把配置条目展开为 (base_url, api_key, model)，缺省字段沿用角色默认值，去重"""
+    out = [(base_url, api_key, model)]
+    extras = None
+    for entry in entries:
+        if not isinstance(entry, dict):
+            continue
+        if entry.get("extra_model"):
+            if extras is None:
+                extras = _extra_models()
+            info = extras.get(entry["extra_model"])
+            if not isinstance(info, dict) or not info.get("base_url"):
+                logger.warning(f"后端池引用的 extra_models 条目 {entry['extra_model']} 不存在，已忽略")
+                continue
+            spec = (info["base_url"], info.get("api_key") or api_key, entry["extra_model"])
+        else:
+            spec = (entry.get("base_url") or base_url,
+                    entry.get("api_key") or api_key,
+                    entry.get("model") or model)
+        if spec not in out:
+            out.append(spec)
+    return out
+
+
+def pool_for(role: Optional[str], base_url: str, api_key: str,
+             model: str) -> Optional[BackendPool]:
+    """获取角色的后端池；未声明后端（或只有默认一个）时返回 None，调用方直连"""
+    if not role:
+        return None
+    role = settings.config_role(role)
+    entries = _load_backends().get(role)
+    if not entries:
+        return None
+    specs = _resolve(entries, base_url, api_key, model)
+    if len(specs) < 2:
+        return None
+    key = (role, tuple(specs))
+    with _lock:
+        pool = _pools.get(key)
+        if pool is None:
+            # 配置变化后旧池不再被选中，保留其实例直到在途请求结束即可
+            pool = _pools[key] = BackendPool(role, [Backend(*s) for s in specs])
+        return pool
+
+
+def snapshot() -> Dict[str, List[dict]]:
+    """所有后端池的状态"""
+    with _lock:
+        pools = list(_pools.values())
+    return {p.role: p.snapshot() for p in pools}
+
+
+def reset():
+    """清空所有后端池"""
+    with _lock:
+        _pools.clear()
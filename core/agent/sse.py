@@ -0,0 +1,173 @@
+"""
+core/agent/sse.py — 线性时间 SSE 解码器
+基于 bytearray + 移动偏移量解析，已消费的字节按摊还 O(1) 的方式压缩，
+不再对剩余缓冲区做逐行 split 拷贝；长 data 行跨多个块到达时也不会重复扫描。
+不含 content / usage / 非空 finish_reason 的事件在 json.loads 之前通过字节查找直接跳过。
+
+微基准：python -m core.agent.sse [事件数]
+"""
+import json
+import logging
+from typing import List
+
+logger = logging.getLogger(__name__)
+
+_DATA = b"data:"
+_DONE = b"[DONE]"
+# 快速前缀检查：不含这些键的事件既不产出文本也不携带元数据，跳过 JSON 解析
+_CONTENT_KEY = b'"content"'
+_USAGE_KEY = b'"usage"'
+_FINISH_KEY = b'"finish_reason"'
+# 已消费字节超过该阈值且超过缓冲区一半时压缩缓冲区
+_COMPACT_THRESHOLD = 64 * 1024
+
+
+def _has_value(buf: bytearray, key: bytes, start: int, end: int) -> bool:
+    """事件中是否带有值非 null 的 key"""
+    i = buf.find(key, start, end)
+    if i == -1:
+        return False
+    i += len(key)
+    while i < end and buf[i] in (32, 9, 58):  # 空格 / 制表符 / 冒号
+        i += 1
+    return i < end and buf[i] != 110  # 'n' -> null
+
+
+class SSEDecoder:
+    """
+    增量 SSE 解码器：喂入原始字节，吐出内容增量
+    不关心字节来自哪里，同步（requests）与异步（asyncio）客户端共用
+    """
+
+    MAX_CONSECUTIVE_ERRORS = 5
+
+    def __init__(self):
+        self._buf = bytearray()
+        self._pos = 0          # 下一行的起始偏移
+        self._scan = 0         # 查找换行符的起始偏移（跨块的长行不重复扫描）
+        self.done = False      # 已收到 [DONE]
+        self.failed = False    # JSON 连续解析失败，流已不可信
+        self.consecutive_errors = 0
+        self.events = 0        # 已解析的 data 事件数
+        self.usage = None      # 服务端返回的 token 用量（stream_options.include_usage）
+        self.finish_reason = None
+
+    def feed(self, chunk: bytes) -> List[str]:
+        """喂入一段字节，返回其中解析出的内容增量列表"""
+        out: List[str] = []
+        if self.done or self.failed:
+            return out
+        self.consecutive_errors = 0  # 成功读取，重置错误计数
+        buf = self._buf
+        buf += chunk
+        pos = self._pos
+        find = buf.find
+
+        while True:
+            nl = find(b"\n", self._scan)
+            if nl == -1:
+                self._scan = len(buf)
+                break
+            start = pos
+            end = nl
+            pos = self._scan = nl + 1
+            if end > start and buf[end - 1] == 13:  # \r
+                end -= 1
+            if end - start < 5 or not buf.startswith(_DATA, start):
+                continue
+            s = start + 5
+            while s < end and buf[s] in (32, 9):
+                s += 1
+            self.events += 1
+            if end - s == 6 and buf.startswith(_DONE, s):
+                self.done = True
+                break
+            if (find(_CONTENT_KEY, s, end) == -1
+                    and not _has_value(buf, _USAGE_KEY, s, end)
+                    and not _has_value(buf, _FINISH_KEY, s, end)):
+                continue
+            content = self._parse_event(buf[s:end])
+            if content:
+                out.append(content)
+            if self.failed:
+                break
+
+        # 压缩：只在已消费部分占多数时搬移，整体摊还线性
+        if pos and (pos == len(buf) or (pos > _COMPACT_THRESHOLD and pos * 2 > len(buf))):
+            del buf[:pos]
+            self._scan -= pos
+            pos = 0
+        self._pos = pos
+        return out
+
+    def _parse_event(self, data: bytearray):
+        """解析单个 data 事件的 JSON，记录元数据，返回内容增量或 None"""
+        try:
+            obj = json.loads(data.decode("utf-8", errors="replace"))
+        except (json.JSONDecodeError, ValueError) as e:
+            self.consecutive_errors += 1
+            if self.consecutive_errors >= self.MAX_CONSECUTIVE_ERRORS:
+                logger.error(f"SSE JSON 连续解析失败 {self.consecutive_errors} 次，终止流")
+                self.failed = True
+                return None
+            logger.debug(f"SSE JSON解析失败 (忽略): {e}")
+            return None
+        self.consecutive_errors = 0
+        if not isinstance(obj, dict):
+            return None
+        usage = obj.get("usage")
+        if usage:
+            self.usage = usage
+        choices = obj.get("choices") or []
+        if not choices:
+            return None
+        choice = choices[0]
+        if choice.get("finish_reason"):
+            self.finish_reason = choice["finish_reason"]
+        delta = choice.get("delta") or {}
+        return delta.get("content")
+
+    @property
+    def finished(self) -> bool:
+        """流是否已经结束（正常或异常）"""
+        return self.done or self.failed
+
+
+def benchmark(events: int = 20000, chunk_size: int = 4096) -> dict:
+    """
+    微基准：构造 events 个事件的响应（含心跳与空 delta），分别按网络块大小
+    和单个大块喂入，返回吞吐量
+    """
+    import time
+
+    parts = []
+    for i in range(events):
+        piece = json.dumps({"choices": [{"delta": {"content": f"tok{i} "}}]})
+        parts.append(b"data: " + piece.encode() + b"\n\n")
+        if i % 10 == 0:
+            parts.append(b": keep-alive\n\n")
+            parts.append(b'data: {"choices":[{"delta":{"role":"assistant"}}]}\n\n')
+    parts.append(b"data: [DONE]\n\n")
+    body = b"".join(parts)
+
+    result = {"events": events, "bytes": len(body)}
+    for label, size in (("chunked", chunk_size), ("single", len(body))):
+        decoder = SSEDecoder()
+        count = 0
+        t0 = time.perf_counter()
+        for i in range(0, len(body), size):
+            count += len(decoder.feed(body[i:i + size]))
+        elapsed = time.perf_counter() - t0
+        assert count == events and decoder.done
+        result[label] = {
+            "seconds": round(elapsed, 4),
+            "events_per_sec": int(events / elapsed) if elapsed else 0,
+            "mb_per_sec": round(len(body) / elapsed / 1e6, 1) if elapsed else 0,
+        }
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    print(json.dumps(benchmark(n), indent=2))
@@ -0,0 +1,79 @@
+"""
+core/agent/stops.py — 客户端流式提前终止
+模型经常在输出完调用方需要的内容之后继续生成（例如 Chatter 在 [REQUIREMENTS_DONE] 的 JSON 之后），
+而这些文本只会被丢弃。chat_complete(stop=...) 接受一个停止条件：条件触发时客户端只保留到触发点为止的文本，
+立即关闭连接并正常返回，节省输出 token 和等待时间。
+
+停止条件是增量的：每个分块只扫描新增部分，整体线性时间。
+模块级实例（REQUIREMENTS_DONE）可以直接传入，客户端每次调用会取一份新状态。
+"""
+from typing import Optional
+
+FENCE = "```"
+
+
+class StopCondition:
+    """停止条件基类：feed 返回 -1 表示继续，否则返回本分块中需要保留的字符数"""
+
+    name = "stop"
+
+    def __init__(self):
+        self._text = ""
+        self._scan = 0
+
+    def fresh(self) -> "StopCondition":
+        """返回同配置、空状态的新实例"""
+        return type(self)()
+
+    def feed(self, chunk: str) -> int:
+        start = len(self._text)
+        self._text += chunk
+        end = self._find_end()
+        if end is None:
+            return -1
+        return max(0, end - start)
+
+    def _find_end(self) -> Optional[int]:
+        """在累计文本中查找终止位置（累计文本中的偏移，不含之后的内容）"""
+        raise NotImplementedError
+
+
+class FenceClosed(StopCondition):
+    """
+    第一个以 opener 开头的代码块闭合时终止
+    opener 之前还可以要求先出现 marker（如 [REQUIREMENTS_DONE]）
+    """
+
+    def __init__(self, opener: str, marker: Optional[str] = None, name: str = "fence"):
+        super().__init__()
+        self.opener = opener
+        self.marker = marker
+        self.name = name
+        self._stage = 0 if marker else 1   # 0 等待 marker，1 等待 opener，2 等待闭合
+
+    def fresh(self) -> "FenceClosed":
+        return FenceClosed(self.opener, self.marker, self.name)
+
+    def _advance(self, needle: str) -> Optional[int]:
+        """从 _scan 开始查找 needle，找到返回其后的偏移；否则推进 _scan 保留可能被截断的前缀"""
+        i = self._text.find(needle, self._scan)
+        if i == -1:
+            self._scan = max(self._scan, len(self._text) - len(needle) + 1)
+            return None
+        self._scan = i + len(needle)
+        return self._scan
+
+    def _find_end(self) -> Optional[int]:
+        if self._stage == 0:
+            if self._advance(self.marker) is None:
+                return None
+            self._stage = 1
+        if self._stage == 1:
+            if self._advance(self.opener) is None:
+                return None
+            self._stage = 2
+        return self._advance(FENCE)
+
+
+# Chatter 输出 [REQUIREMENTS_DONE] 与其后的 JSON 代码块后终止
+REQUIREMENTS_DONE = FenceClosed("```json", marker="[REQUIREMENTS_DONE]", name="requirements_done")
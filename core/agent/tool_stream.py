@@ -0,0 +1,225 @@
+"""
+core/agent/tool_stream.py — 流式工具调用检测、提前执行与并行调度
+以前的工具循环要等整段回复收完，再提取 tool_call、再执行技能，而且每轮只执行第一个；
+read_url / search_web / run_command 这类慢技能的耗时与流的收尾完全串行，
+一次要写八个文件的任务也要八次 LLM 往返。
+
+EarlyDispatcher.watch() 包在流式分块外面，增量扫描 ```tool_call 代码块，
+每个代码块一闭合就提交到线程池执行，此时流的剩余部分还在接收。
+互不冲突的调用并行执行；有冲突的按出现顺序串行：
+  - 同一路径（或其父目录）上有写入的调用互相等待
+  - 副作用未知的技能（run_command、自定义技能等）是屏障，与前后所有调用串行
+工具循环在流结束后调用 dispatcher.results(calls)，按顺序取回每个调用的结果：
+已提前执行的等待其完成，其余（如 ```json 形式）此时提交。
+"""
+import json
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TOOL_OPENER = "```tool_call"
+FENCE = "```"
+# 工具执行线程池大小
+MAX_WORKERS = 8
+# 注入对话的单个工具结果的最大字符数
+RESULT_LIMIT = 8000
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS, thread_name_prefix="tool")
+        return _executor
+
+
+def parse_tool_call(body: str) -> Optional[dict]:
+    """解析代码块内容为工具调用，不是带 action 的 JSON 对象时返回 None"""
+    try:
+        obj = json.loads(body.strip())
+    except json.JSONDecodeError:
+        return None
+    if isinstance(obj, dict) and obj.get("action"):
+        return obj
+    return None
+
+
+def split_call(call: dict):
+    """工具调用 → (action, params)，与工具循环的参数过滤一致"""
+    return call.get("action"), {k: v for k, v in call.items() if k not in ("action", "msg")}
+
+
+class ToolCallScanner:
+    """增量扫描 ```tool_call 代码块：feed 返回本分块中新闭合的合法工具调用"""
+
+    def __init__(self):
+        self._text = ""
+        self._scan = 0
+        self._body: Optional[int] = None   # 当前打开的代码块内容起点
+
+    def feed(self, chunk: str) -> List[dict]:
+        self._text += chunk
+        calls = []
+        while True:
+            needle = TOOL_OPENER if self._body is None else FENCE
+            i = self._text.find(needle, self._scan)
+            if i == -1:
+                # 保留可能被分块截断的前缀
+                self._scan = max(self._scan, len(self._text) - len(needle) + 1)
+                return calls
+            if self._body is None:
+                self._body = self._scan = i + len(needle)
+                continue
+            call = parse_tool_call(self._text[self._body:i])
+            if call is not None:
+                calls.append(call)
+            self._body = None
+            self._scan = i + len(FENCE)
+
+
+def extract_tool_calls(text: str) -> List[dict]:
+    """提取完整文本中的所有 ```tool_call 工具调用（与流式扫描结果一致）"""
+    return ToolCallScanner().feed(text)
+
+
+def _overlaps(a: set, b: set) -> bool:
+    """两组路径中是否有相同路径或父子路径"""
+    for x in a:
+        for y in b:
+            if x == y or x.startswith(y.rstrip(os.sep) + os.sep) or y.startswith(x.rstrip(os.sep) + os.sep):
+                return True
+    return False
+
+
+def _conflicts(e1, e2) -> bool:
+    """两个调用的读写范围是否冲突（None 表示未知，与一切冲突）"""
+    if e1 is None or e2 is None:
+        return True
+    r1, w1 = e1
+    r2, w2 = e2
+    return _overlaps(w1, r2 | w2) or _overlaps(w2, r1)
+
+
+class _Job:
+    """一次提交到线程池的技能调用"""
+
+    def __init__(self, action: str, params: dict, effects, deps: List[Future]):
+        self.action = action
+        self.params = params
+        self.effects = effects
+        self.deps = deps
+        self.future: Optional[Future] = None
+        self.claimed = False
+
+
+class EarlyDispatcher:
+    """
+    在流式过程中提前执行工具调用，并按读写冲突并行调度
+    enabled=False 时只透传分块（本轮结果不会被执行时使用，如已到最大轮次）
+    """
+
+    def __init__(self, execute: Optional[Callable] = None, effects: Optional[Callable] = None,
+                 enabled: bool = True):
+        if execute is None:
+            from core.skill_manager import execute_skill as execute
+        if effects is None:
+            from core.skill_manager import skill_effects as effects
+        self._execute = execute
+        self._effects = effects
+        self._enabled = enabled
+        self._scanner = ToolCallScanner()
+        self._jobs: List[_Job] = []
+
+    def watch(self, stream: Iterable[str]) -> Iterator[str]:
+        """透传分块，遇到闭合的 tool_call 代码块立即提交执行"""
+        for chunk in stream:
+            if self._enabled:
+                for call in self._scanner.feed(chunk):
+                    job = self._submit(*split_call(call))
+                    logger.debug(f"工具调用 {job.action} 已在流式过程中提交（依赖 {len(job.deps)} 个）")
+            yield chunk
+
+    def _submit(self, action: str, params: dict) -> _Job:
+        try:
+            effects = self._effects(action, params)
+        except Exception:
+            effects = None
+        deps = [j.future for j in self._jobs if _conflicts(j.effects, effects)]
+        job = _Job(action, params, effects, deps)
+        job.future = _pool().submit(self._run, job)
+        self._jobs.append(job)
+        return job
+
+    def _run(self, job: _Job):
+        # 依赖都是更早提交的任务，线程池先进先出，等待它们不会死锁
+        for dep in job.deps:
+            try:
+                dep.result()
+            except Exception:
+                pass
+        return self._execute(job.action, **job.params)
+
+    def written(self) -> List[str]:
+        """已执行成功的调用写入的文件（绝对路径，按提交顺序去重；目录与已不存在的路径除外）"""
+        out: List[str] = []
+        for job in self._jobs:
+            f = job.future
+            if not f.done() or f.cancelled() or f.exception() is not None or not job.effects:
+                continue
+            for p in sorted(job.effects[1]):
+                if p not in out and os.path.isfile(p):
+                    out.append(p)
+        return out
+
+    def drain(self):
+        """等待已提交的调用结束，不再提交新的（任务被中止时使用）"""
+        for job in self._jobs:
+            try:
+                job.future.result()
+            except Exception:
+                pass
+
+    def results(self, calls: List[dict]) -> List[Tuple[str, object, Optional[Exception]]]:
+        """
+        按顺序取回 calls 中每个调用的 (action, 结果, 异常)
+        已提前提交的直接等待，其余此时提交；每个提前提交的调用只会被认领一次
+        """
+        jobs = []
+        for call in calls:
+            action, params = split_call(call)
+            job = next((j for j in self._jobs
+                        if not j.claimed and j.action == action and j.params == params), None)
+            if job is None:
+                job = self._submit(action, params)
+            job.claimed = True
+            jobs.append(job)
+        out = []
+        for job in jobs:
+            try:
+                out.append((job.action, job.future.result(), None))
+            except Exception as e:
+                out.append((job.action, None, e))
+        return out
+
+
+def result_text(result, error: Optional[Exception], limit: int = RESULT_LIMIT) -> str:
+    """单个工具结果的文本形式（过长截断，失败时为错误说明）"""
+    text = f"[ERROR] {error}" if error is not None else str(result)
+    if len(text) > limit:
+        text = text[:limit] + "...(truncated)"
+    return text
+
+
+def format_results(results: List[Tuple[str, object, Optional[Exception]]]) -> str:
+    """把一轮所有工具的结果合并为一条注入消息的正文"""
+    return "\n\n".join(
+        f"工具 ({action}) 执行结果：\n\n{result_text(result, error)}"
+        for action, result, error in results
+    )
@@ -0,0 +1,102 @@
+"""
+core/config_store.py — .maren 下 JSON 配置文件的统一缓存
+每个文件只解析一次，之后每次读取只做一次 stat：mtime / 大小变化时重新解析。
+返回的是不可变快照（FrozenDict / tuple），可以在线程之间直接共享；
+需要修改时用 thaw() 取一份可变副本，写回文件后调用 invalidate()。
+
+  from core import config_store
+  cfg = config_store.get(inited.maren_json_path(), {})      # 缺失或格式错误时返回默认值
+  cfg = config_store.load(path)                              # 与 json.load 一样抛出异常
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+_MISSING = object()
+
+
+class FrozenDict(dict):
+    """只读 dict：保留 dict 的类型判断与 json 序列化，禁止修改"""
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("配置快照是只读的，请先 config_store.thaw() 取副本")
+
+    __setitem__ = __delitem__ = _readonly
+    clear = pop = popitem = setdefault = update = _readonly
+    __ior__ = _readonly
+
+    def __copy__(self):
+        return thaw(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+
+def freeze(obj: Any) -> Any:
+    """递归转换为不可变结构：dict → FrozenDict，list → tuple"""
+    if isinstance(obj, dict):
+        return FrozenDict((k, freeze(v)) for k, v in obj.items())
+    if isinstance(obj, (list, tuple)):
+        return tuple(freeze(v) for v in obj)
+    return obj
+
+
+def thaw(obj: Any) -> Any:
+    """递归取可变副本：dict → dict，tuple / list → list"""
+    if isinstance(obj, dict):
+        return {k: thaw(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [thaw(v) for v in obj]
+    return obj
+
+
+_lock = threading.Lock()
+# path → ((mtime_ns, size), 快照)
+_cache: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+
+def load(path: str) -> Any:
+    """
+    读取 JSON 文件的快照；文件不存在抛出 FileNotFoundError，
+    格式错误抛出 json.JSONDecodeError（与直接 json.load 的异常一致）
+    """
+    st = os.stat(path)
+    sig = (st.st_mtime_ns, st.st_size)
+    with _lock:
+        entry = _cache.get(path)
+        if entry is not None and entry[0] == sig:
+            return entry[1]
+    with open(path, "r", encoding="utf-8") as f:
+        snapshot = freeze(json.load(f))
+    with _lock:
+        _cache[path] = (sig, snapshot)
+    return snapshot
+
+
+def get(path: str, default: Any = None) -> Any:
+    """读取快照，文件缺失或无法解析时返回 default（default 会被冻结）"""
+    try:
+        return load(path)
+    except (OSError, ValueError):
+        return freeze(default)
+
+
+def section(path: str, *keys: str, default: Any = _MISSING) -> Any:
+    """按键路径取嵌套配置，例如 section(maren_json, "model", "backends")；缺失返回 default 或 {}"""
+    node = get(path, {})
+    for key in keys:
+        if not isinstance(node, dict) or key not in node:
+            return freeze({} if default is _MISSING else default)
+        node = node[key]
+    return node
+
+
+def invalidate(path: Optional[str] = None):
+    """丢弃某个文件（或全部）的缓存；写文件后调用，避免同一时间戳内的修改被漏掉"""
+    with _lock:
+        if path is None:
+            _cache.clear()
+        else:
+            _cache.pop(path, None)
+
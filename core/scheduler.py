@@ -0,0 +1,428 @@
+"""
+core/scheduler.py — 按依赖关系驱动的任务调度
+Leader 的计划带有 depends_on，以前却逐个串行执行。DagScheduler 在有界线程池上执行任务：
+某个任务的依赖全部完成的那一刻它就可以开始，不必等整层结束；
+每类任务（slot，例如角色）有各自的并发上限。
+
+并发槽位不够时按关键路径优先：每个任务的关键路径长度 = 自身估计成本 + 后继中最长的关键路径，
+再乘以 priority（high / medium / low）的权重，分数高的先派发，同分按计划顺序。
+这样计划宽于并发上限时，最长的依赖链最先启动，整体完成时间最短。
+
+  sched = DagScheduler(tasks, run=lambda t: ..., limits={"coder": 4, "designer": 2},
+                       slot=lambda t: t.get("role", "Coder").lower(),
+                       cost=lambda t: len(t.get("description", "")))
+  results = sched.run(on_start=..., on_done=...)   # {id: (结果, 异常)}
+
+调用方在别处已经提前启动的任务（例如 Leader 计划流式输出时就开始的无依赖任务）
+以 started={id: Future} 交给 run()，调度器把它们当作正在运行的任务记账，不再重复派发。
+
+派发与记账都在调用 run() 的线程中进行，工作线程只执行任务并回报完成；
+on_start / on_done 回调也在调用线程中触发，可以直接打印与修改调用方状态。
+Ctrl-C 时不再派发新任务，通过 on_cancel 让运行中的任务提前返回，收齐它们的结果后才向上抛出。
+
+依赖图本身由 TaskGraph 维护（Kahn 算法，O(V+E)），可单独用于分层或增量派发：
+  graph = TaskGraph(tasks)
+  graph.issues                 # 未知依赖、重复 id、循环依赖等问题说明
+  ready = graph.start()        # 初始可执行任务
+  ready = graph.done(tid)      # 某任务完成后新变为可执行的任务
+  layers = graph.layers()      # 按层分组（层内可并行）
+循环依赖（强连通分量）在环外的依赖全部完成、且环内没有就绪或运行中的任务时，
+立即放行环内优先级最高的一个任务（忽略其环内依赖），由 start / done 一并返回，不必等其他任务全部结束。
+graph.unblock() 是兜底：调用方发现无事可做却仍有任务等待时强制解开一个。
+"""
+import heapq
+import logging
+import queue
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 等待完成事件的最长阻塞时间：只用于让 Ctrl-C 能及时打断等待，完成事件到达时立即唤醒
+_WAIT = 0.5
+# priority 字段对关键路径分数的权重
+PRIORITY_WEIGHT = {"high": 1.5, "medium": 1.0, "low": 0.75}
+
+
+class TaskGraph:
+    """
+    计划任务的依赖图
+    :param tasks: 任务 dict 列表，需有 id，可有 depends_on / priority
+    :param cost: 任务 → 估计成本（任意正数单位），缺省每个任务为 1
+    """
+
+    def __init__(self, tasks: List[dict], cost: Optional[Callable[[dict], float]] = None):
+        self.issues: List[str] = []
+        self.tasks: Dict[object, dict] = {}
+        self.order: List[object] = []
+        for t in tasks:
+            tid = t["id"]
+            if tid in self.tasks:
+                self.issues.append(f"任务 id #{tid} 重复，后出现的「{t.get('title', '')}」已忽略")
+                continue
+            self.tasks[tid] = t
+            self.order.append(tid)
+        self.index = {tid: i for i, tid in enumerate(self.order)}
+
+        self.deps: Dict[object, set] = {}
+        self.dependents: Dict[object, List[object]] = {tid: [] for tid in self.order}
+        for tid in self.order:
+            deps = set()
+            for d in self.tasks[tid].get("depends_on") or []:
+                if d == tid:
+                    self.issues.append(f"任务 #{tid} 依赖自身，已忽略该依赖")
+                elif d not in self.tasks:
+                    self.issues.append(f"任务 #{tid} 依赖的 #{d} 不在计划中，已忽略该依赖")
+                elif d not in deps:
+                    deps.add(d)
+                    self.dependents[d].append(tid)
+            self.deps[tid] = deps
+
+        self.component = self._components()
+        sizes: Dict[int, List[object]] = {}
+        for tid in self.order:
+            sizes.setdefault(self.component[tid], []).append(tid)
+        self.cycles: List[List[object]] = [c for c in sizes.values() if len(c) > 1]
+        for cycle in self.cycles:
+            path = " → ".join(f"#{t}" for t in self._cycle_path(cycle))
+            self.issues.append(f"循环依赖: {path}（将按优先级解开）")
+
+        self.rank = self._critical_paths(cost or (lambda t: 1.0))
+        # 每个环的成员，以及成员依赖环外任务的边数
+        self.members: Dict[int, List[object]] = {self.component[c[0]]: c for c in self.cycles}
+        self._outside = {comp: sum(1 for tid in members for d in self.deps[tid]
+                                   if self.component[d] != comp)
+                         for comp, members in self.members.items()}
+        self._waiting: Dict[object, int] = {}
+        self._outside_left: Dict[int, int] = {}
+        self._active: Dict[int, int] = {}
+
+    # ---- 结构分析 ----
+
+    def _components(self) -> Dict[object, int]:
+        """强连通分量编号（迭代式 Tarjan，O(V+E)）；大小 > 1 的分量即循环依赖"""
+        index: Dict[object, int] = {}
+        low: Dict[object, int] = {}
+        comp: Dict[object, int] = {}
+        stack: List[object] = []
+        on_stack = set()
+        counter = 0
+        ncomp = 0
+        for root in self.order:
+            if root in index:
+                continue
+            work = [(root, iter(self.dependents[root]))]
+            index[root] = low[root] = counter
+            counter += 1
+            stack.append(root)
+            on_stack.add(root)
+            while work:
+                v, it = work[-1]
+                w = next(it, None)
+                if w is not None:
+                    if w not in index:
+                        index[w] = low[w] = counter
+                        counter += 1
+                        stack.append(w)
+                        on_stack.add(w)
+                        work.append((w, iter(self.dependents[w])))
+                    elif w in on_stack:
+                        low[v] = min(low[v], index[w])
+                    continue
+                work.pop()
+                if work:
+                    low[work[-1][0]] = min(low[work[-1][0]], low[v])
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        comp[w] = ncomp
+                        if w == v:
+                            break
+                    ncomp += 1
+        return comp
+
+    def _cycle_path(self, members: List[object]) -> List[object]:
+        """在一个强连通分量内找出一条具体的环（首尾相同），用于提示"""
+        inside = set(members)
+        start = min(members, key=self.index.get)
+        seen = {start: 0}
+        path = [start]
+        while True:
+            nxt = min((d for d in self.dependents[path[-1]] if d in inside), key=self.index.get)
+            if nxt in seen:
+                return path[seen[nxt]:] + [nxt]
+            seen[nxt] = len(path)
+            path.append(nxt)
+
+    def _critical_paths(self, cost: Callable[[dict], float]) -> Dict[object, float]:
+        """每个任务到计划结束的最长路径成本（含自身）；循环依赖中的回边不计"""
+        own = {}
+        for tid in self.order:
+            try:
+                own[tid] = max(0.0, float(cost(self.tasks[tid])))
+            except Exception:
+                own[tid] = 1.0
+        rank: Dict[object, float] = {}
+        on_path = set()
+        for root in self.order:
+            if root in rank:
+                continue
+            # 迭代式后序 DFS，避免长依赖链触发递归上限
+            stack = [(root, iter(self.dependents[root]))]
+            on_path.add(root)
+            while stack:
+                tid, it = stack[-1]
+                nxt = next(it, None)
+                if nxt is None:
+                    stack.pop()
+                    on_path.discard(tid)
+                    rank[tid] = own[tid] + max(
+                        (rank[n] for n in self.dependents[tid] if n in rank), default=0.0)
+                elif nxt not in rank and nxt not in on_path:
+                    on_path.add(nxt)
+                    stack.append((nxt, iter(self.dependents[nxt])))
+        return rank
+
+    def score(self, tid) -> float:
+        """派发优先级：关键路径长度 × priority 权重"""
+        prio = str(self.tasks[tid].get("priority") or "medium").lower()
+        return self.rank[tid] * PRIORITY_WEIGHT.get(prio, 1.0)
+
+    def sort_key(self, tid):
+        """按优先级排序的键：分数高的在前，同分按计划顺序"""
+        return (-self.score(tid), self.index[tid])
+
+    # ---- 增量派发（Kahn） ----
+
+    def start(self) -> List[object]:
+        """重置状态，返回初始可执行的任务（按优先级）"""
+        self._waiting = {tid: len(self.deps[tid]) for tid in self.order}
+        self._outside_left = dict(self._outside)
+        self._active = {comp: 0 for comp in self.members}
+        ready = [tid for tid in self.order if self._waiting[tid] == 0]
+        for tid in ready:
+            del self._waiting[tid]
+        ready.extend(self._release(self.members))
+        return sorted(ready, key=self.sort_key)
+
+    def done(self, tid) -> List[object]:
+        """标记任务完成，返回因此变为可执行的任务（按优先级）"""
+        ready = []
+        comp = self.component[tid]
+        touched = set()
+        if comp in self._active:
+            self._active[comp] -= 1
+            touched.add(comp)
+        for nxt in self.dependents[tid]:
+            other = self.component[nxt]
+            if other != comp and other in self._outside_left:
+                self._outside_left[other] -= 1
+                touched.add(other)
+            if nxt in self._waiting:
+                self._waiting[nxt] -= 1
+                if self._waiting[nxt] == 0:
+                    del self._waiting[nxt]
+                    ready.append(nxt)
+                    if other in self._active:
+                        self._active[other] += 1
+        ready.extend(self._release(touched))
+        return sorted(ready, key=self.sort_key)
+
+    def _release(self, comps) -> List[object]:
+        """环外依赖已全部完成、环内又没有就绪或运行中任务的环：放行其中优先级最高的任务"""
+        out = []
+        for comp in comps:
+            if self._outside_left[comp] > 0 or self._active[comp] > 0:
+                continue
+            waiting = [tid for tid in self.members[comp] if tid in self._waiting]
+            if not waiting:
+                continue
+            tid = min(waiting, key=self.sort_key)
+            del self._waiting[tid]
+            self._active[comp] += 1
+            logger.warning(f"任务 #{tid} 处于循环依赖中，环外依赖已完成，忽略其环内依赖直接执行")
+            out.append(tid)
+        return out
+
+    def pending(self) -> int:
+        """尚未变为可执行的任务数"""
+        return len(self._waiting)
+
+    def unblock(self) -> Optional[object]:
+        """
+        兜底：没有可执行任务却仍有任务在等待时调用（正常情况下环已由 start / done 自动放行）。
+        在未完成的外部依赖都已满足的环中，选优先级最高的任务，忽略其环内依赖直接放行。
+        """
+        if not self._waiting:
+            return None
+        blocked_by_outside = set()
+        for tid in self._waiting:
+            comp = self.component[tid]
+            if any(self.component[d] != comp and d in self._waiting for d in self.deps[tid]):
+                blocked_by_outside.add(comp)
+        candidates = [tid for tid in self._waiting if self.component[tid] not in blocked_by_outside]
+        if not candidates:
+            candidates = list(self._waiting)
+        tid = min(candidates, key=self.sort_key)
+        del self._waiting[tid]
+        if self.component[tid] in self._active:
+            self._active[self.component[tid]] += 1
+        logger.warning(f"任务 #{tid} 处于循环依赖中，忽略其未完成的依赖直接执行")
+        return tid
+
+    def layers(self) -> List[List[dict]]:
+        """按依赖关系分成可并行执行的层（层内按计划顺序），循环依赖按优先级逐个解开"""
+        layers = []
+        layer = self.start()
+        while layer or self.pending():
+            if not layer:
+                layer = [self.unblock()]
+            layer.sort(key=self.index.get)
+            layers.append([self.tasks[tid] for tid in layer])
+            nxt = []
+            for tid in layer:
+                nxt.extend(self.done(tid))
+            layer = nxt
+        return layers
+
+
+class DagScheduler:
+    """
+    依赖驱动的并发调度器
+    :param tasks: 任务 dict 列表，需有 id，可有 depends_on
+    :param run: 在工作线程中执行单个任务的函数
+    :param limits: {slot: 并发上限}，未列出的 slot 使用 default_limit
+    :param slot: 任务 → slot 名，缺省所有任务同属一个 slot
+    :param cost: 任务 → 估计成本（任意正数单位），缺省每个任务为 1
+    """
+
+    def __init__(self, tasks: List[dict], run: Callable[[dict], object],
+                 limits: Optional[Dict[str, int]] = None,
+                 slot: Optional[Callable[[dict], str]] = None,
+                 default_limit: int = 1,
+                 cost: Optional[Callable[[dict], float]] = None):
+        self.graph = TaskGraph(tasks, cost)
+        self._run = run
+        self._limits = dict(limits or {})
+        self._slot = slot or (lambda t: "default")
+        self._default_limit = max(1, default_limit)
+
+    @property
+    def issues(self) -> List[str]:
+        return self.graph.issues
+
+    def limit(self, slot: str) -> int:
+        return max(1, int(self._limits.get(slot, self._default_limit)))
+
+    def run(self, on_start: Optional[Callable[[dict], None]] = None,
+            on_done: Optional[Callable[[dict, object, Optional[BaseException]], None]] = None,
+            started: Optional[Dict[object, Future]] = None,
+            on_cancel: Optional[Callable[[], None]] = None
+            ) -> Dict[object, Tuple[object, Optional[BaseException]]]:
+        """
+        执行全部任务，返回 {id: (结果, 异常)}
+        Ctrl-C 时停止派发，调用 on_cancel 通知运行中的任务尽快结束，
+        等它们交回结果（照常触发 on_done）后再向上抛出；等待期间再按一次 Ctrl-C 则不再等待
+        :param started: 已在别处启动的任务 {id: Future}，计入运行中，完成时同样触发 on_done
+        :param on_cancel: Ctrl-C 时在调用线程中调用，让 run 中的任务提前返回
+        """
+        graph = self.graph
+        if not graph.order:
+            return {}
+        adopted = {tid: f for tid, f in (started or {}).items() if tid in graph.tasks}
+        slots = {tid: self._slot(graph.tasks[tid]) for tid in graph.order}
+        counts: Dict[str, int] = {}
+        for s in slots.values():
+            counts[s] = counts.get(s, 0) + 1
+        workers = sum(min(self.limit(s), n) for s, n in counts.items())
+        # 每个 slot 一个就绪堆，按 (分数, 计划顺序) 出堆
+        heaps: Dict[str, list] = {s: [] for s in counts}
+        running: Dict[str, int] = {s: 0 for s in counts}
+        results: Dict[object, Tuple[object, Optional[BaseException]]] = {}
+        done_q: "queue.Queue" = queue.Queue()
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="task")
+        # 已派发（或接管）尚未交回结果的任务
+        inflight: Dict[object, Future] = {}
+
+        def push(ready):
+            for tid in ready:
+                if tid in adopted:
+                    continue
+                heapq.heappush(heaps[slots[tid]], (graph.sort_key(tid), tid))
+
+        def work(tid):
+            try:
+                done_q.put((tid, self._run(graph.tasks[tid]), None))
+            except BaseException as e:  # 工作线程里的异常交给调用线程记录
+                done_q.put((tid, None, e))
+
+        def dispatch():
+            while True:
+                # 各 slot 中有空位且分数最高的就绪任务先派发
+                open_heaps = [h for s, h in heaps.items() if h and running[s] < self.limit(s)]
+                if not open_heaps:
+                    return
+                _, tid = heapq.heappop(min(open_heaps, key=lambda h: h[0][0]))
+                running[slots[tid]] += 1
+                if on_start:
+                    on_start(graph.tasks[tid])
+                inflight[tid] = pool.submit(work, tid)
+
+        def adopt(tid, fut):
+            def finished(f):
+                try:
+                    done_q.put((tid, f.result(), None))
+                except BaseException as e:
+                    done_q.put((tid, None, e))
+            running[slots[tid]] += 1
+            inflight[tid] = fut
+            fut.add_done_callback(finished)
+
+        def finish(tid, result, error):
+            inflight.pop(tid, None)
+            running[slots[tid]] -= 1
+            results[tid] = (result, error)
+            if on_done:
+                on_done(graph.tasks[tid], result, error)
+
+        def drain():
+            """等待运行中的任务交回结果；被取消（从未开始）的任务不会交回"""
+            for tid in [t for t, f in inflight.items() if f.cancelled()]:
+                inflight.pop(tid)
+            while inflight:
+                try:
+                    finish(*done_q.get(timeout=_WAIT))
+                except queue.Empty:
+                    # 已结束却没有交回的（取走结果时被中断），不再等待
+                    for tid in [t for t, f in inflight.items() if f.done()]:
+                        inflight.pop(tid)
+
+        for tid, fut in adopted.items():
+            adopt(tid, fut)
+        push(graph.start())
+        try:
+            while len(results) < len(graph.order):
+                dispatch()
+                if not any(running.values()):
+                    # 兜底：循环依赖通常已由 graph.start / done 放行，这里只在仍无事可做时强制解开
+                    push([graph.unblock()])
+                    continue
+                try:
+                    tid, result, error = done_q.get(timeout=_WAIT)
+                except queue.Empty:
+                    continue
+                finish(tid, result, error)
+                push(graph.done(tid))
+        except KeyboardInterrupt:
+            # 中断后不再有任务在后台继续写文件；它们的结果照常交给 on_done（例如写入运行日志）
+            pool.shutdown(wait=False, cancel_futures=True)
+            if on_cancel:
+                on_cancel()
+            drain()
+            raise
+        except BaseException:
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown(wait=True)
+        return results
@@ -0,0 +1,110 @@
+"""
+core/settings.py — .maren/config.json 的读取（默认值与各项配置的只读访问）
+core 与 pipeline 通过这里读取运行配置；shell/cmd/config.py 只负责命令行的查看与修改，
+修改写回文件后调用 config_store.invalidate()，这里的读取随之更新。
+"""
+import os
+from typing import Optional
+
+from core import config_store
+import utils.inited as inited
+
+CONFIG_FILE = "config.json"
+
+# 可单独配置（模型覆盖、缓存、对冲等）的角色
+ROLES = ("coder", "leader", "tester", "chatter", "icon_designer")
+# Designer 任务使用 Coder 的模型与端点，按角色查找的配置也归入 Coder
+_ROLE_ALIASES = {"designer": "coder"}
+
+
+def config_path() -> str:
+    return os.path.join(inited.maren_dir_path(), CONFIG_FILE)
+
+
+def default_config() -> dict:
+    return {
+        "mode": "quality",
+        "max_loops": 5,
+        "memory_tokens": 1000,
+        "concurrency": {"coder": 4, "designer": 2},
+        "extra_models": {},
+        "role_model_override": {},
+        "cache": {
+            "roles": {},
+            "max_mb": 64
+        },
+        "hedge": {
+            "roles": {},
+            "percentile": 90,
+            "min_samples": 5,
+            "default_delay": 4.0,
+            "alternates": {}
+        },
+        "dangerous_commands": [
+            "rm -rf /", "rm -rf ~", "del /f /s /q",
+            "format", "DROP TABLE", "DROP DATABASE",
+            "shutdown", "reboot", "mkfs",
+            "dd if=", "> /dev/sda", ":(){ :|:& };:",
+            "chmod -R 777 /", "chown -R", "kill -9 1",
+            "wget|sh", "curl|bash"
+        ]
+    }
+
+
+def config_role(role: Optional[str]) -> str:
+    """调用方角色 → config.json 中按角色配置的键（小写，designer 归入 coder）"""
+    role = (role or "").lower()
+    return _ROLE_ALIASES.get(role, role)
+
+
+def snapshot():
+    """config.json 的只读快照（按 mtime 缓存），文件缺失或损坏时为默认配置"""
+    return config_store.get(config_path(), default_config())
+
+
+def get_config():
+    """公共接口：供其他模块读取配置（只读快照，各线程可共享）"""
+    return snapshot()
+
+
+def get_mode():
+    """获取当前模式: quality 或 saving"""
+    return snapshot().get("mode", "quality")
+
+
+def get_max_loops():
+    """获取最大循环次数"""
+    cfg = snapshot()
+    mode = cfg.get("mode", "quality")
+    return cfg.get("max_loops", 5 if mode == "quality" else 3)
+
+
+def get_memory_tokens():
+    """获取注入提示词的记忆 token 上限"""
+    return snapshot().get("memory_tokens", 1000)
+
+
+def get_concurrency():
+    """获取各角色同时执行的任务数上限: {角色: 数量}"""
+    cfg = snapshot().get("concurrency")
+    if not isinstance(cfg, dict):
+        cfg = config_store.freeze(default_config()["concurrency"])
+    return cfg
+
+
+def get_dangerous_commands():
+    """获取危险命令列表"""
+    return snapshot().get("dangerous_commands", [])
+
+
+def get_cache_config():
+    """获取响应缓存配置: {"roles": {角色: bool}, "max_mb": 上限}"""
+    cfg = snapshot().get("cache")
+    if not isinstance(cfg, dict):
+        cfg = config_store.freeze(default_config()["cache"])
+    return cfg
+
+
+def get_role_model_override(role: str):
+    """获取角色模型覆盖，返回 model_name 或 None"""
+    return snapshot().get("role_model_override", {}).get(role.lower())
@@ -2,11 +2,32 @@
 core/skill/memory.py — 记忆技能
 将用户的长期规定/偏好写入 .maren/AGENTS.md
 AI 在后续请求时会自动读取这些记忆
+
+注入提示词时（memory_prompt）：
+  - 解析结果按文件 mtime / 大小缓存，add_memory 写入后立即失效
+  - 内容相同（忽略大小写与空白）的条目只保留最新一条，add_memory 也不会重复写入
+  - 总量超过 token 上限时，用本地词项索引（英文单词 + 中文二元组，BM25 打分）
+    挑选与当前任务最相关的条目，同分时优先较新的，按原顺序输出
 """
+import math
 import os
+import re
+import threading
+from collections import Counter
 from datetime import datetime
+from typing import List, Optional, Tuple
 from core.runtime_dir import get_runtime_dir
 
+# 记忆条目格式：- [YYYY-MM-DD HH:MM] 内容
+_ENTRY_RE = re.compile(r"^- \[(\d{4}-\d{2}-\d{2} \d{2}:\d{2})\] (.+)$")
+_WORD_RE = re.compile(r"[a-z0-9_]{2,}")
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]+")
+# 约 2.5 字符 / token，与 ContextTracker 一致
+_CHARS_PER_TOKEN = 2.5
+# BM25 参数
+_K1 = 1.2
+_B = 0.75
+
 
 def _agents_md_path() -> str:
     return os.path.join(get_runtime_dir(), ".maren", "AGENTS.md")
@@ -30,6 +51,11 @@ def add_memory(content: str) -> str:
     if not os.path.exists(path):
         _create_default(path)
 
+    # 已有相同内容的记忆则不重复写入
+    mem = _load()
+    if mem is not None and _normalize(content) in mem.seen:
+        return f"[OK] 已记住: {content.strip()}（已存在，未重复写入）"
+
     # 追加记忆条目
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M")
     entry = f"\n- [{timestamp}] {content.strip()}\n"
@@ -40,6 +66,8 @@ def add_memory(content: str) -> str:
         return f"[OK] 已记住: {content.strip()}"
     except Exception as e:
         return f"[ERROR] 写入记忆失败: {type(e).__name__}: {e}"
+    finally:
+        _invalidate()
 
 
 def read_memory() -> str:
@@ -68,3 +96,134 @@ def _create_default(path: str):
             f.write(content)
     except Exception:
         pass
+
+
+# ---- 解析缓存与相关性选择 ----
+
+def _normalize(content: str) -> str:
+    return " ".join(content.split()).casefold()
+
+
+def _terms(text: str) -> List[str]:
+    """词项：英文单词 / 数字（小写）与中文二元组（单字词保留单字）"""
+    text = text.casefold()
+    terms = _WORD_RE.findall(text)
+    for run in _CJK_RE.findall(text):
+        if len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+
+def _tokens(text: str) -> int:
+    return int(len(text) / _CHARS_PER_TOKEN) + 1
+
+
+class _Memory:
+    """解析后的 AGENTS.md：非条目部分原样保留，条目去重并建立词项索引"""
+
+    def __init__(self, text: str):
+        preamble = []
+        latest = {}   # 规范化内容 → 条目下标（后出现的覆盖先出现的）
+        raw = []
+        for line in text.splitlines():
+            m = _ENTRY_RE.match(line.strip())
+            if m:
+                key = _normalize(m.group(2))
+                latest[key] = len(raw)
+                raw.append((m.group(1), m.group(2).strip(), key))
+            else:
+                preamble.append(line)
+        self.preamble = "\n".join(preamble).strip()
+        self.entries: List[Tuple[str, str]] = [
+            (ts, content) for i, (ts, content, key) in enumerate(raw) if latest[key] == i]
+        self.seen = set(latest)
+        self.lines = [f"- [{ts}] {content}" for ts, content in self.entries]
+        self.tf = [Counter(_terms(content)) for _, content in self.entries]
+        self.lengths = [sum(c.values()) for c in self.tf]
+        self.avg_len = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+        self.df = Counter(t for c in self.tf for t in c)
+
+    def scores(self, query: str) -> List[float]:
+        """各条目对 query 的 BM25 分数"""
+        n = len(self.entries)
+        q = set(_terms(query))
+        out = []
+        for tf, length in zip(self.tf, self.lengths):
+            score = 0.0
+            for t in q:
+                f = tf.get(t)
+                if not f:
+                    continue
+                idf = math.log(1 + (n - self.df[t] + 0.5) / (self.df[t] + 0.5))
+                norm = _K1 * (1 - _B + _B * length / (self.avg_len or 1))
+                score += idf * f * (_K1 + 1) / (f + norm)
+            out.append(score)
+        return out
+
+    def render(self, query: str, budget: Optional[int]) -> str:
+        """在 token 预算内渲染记忆；超出时按相关性挑选条目"""
+        preamble = self.preamble
+        if budget is not None:
+            limit = int(budget * _CHARS_PER_TOKEN)
+            if len(preamble) > limit:
+                preamble = preamble[:limit]
+            budget -= _tokens(preamble)
+        lines = self.lines
+        if budget is not None and sum(_tokens(l) for l in lines) > budget:
+            scores = self.scores(query)
+            # 分数高者优先，同分时较新的优先
+            order = sorted(range(len(lines)), key=lambda i: (scores[i], i), reverse=True)
+            chosen, used = [], 0
+            for i in order:
+                cost = _tokens(lines[i])
+                if used + cost <= budget:
+                    chosen.append(i)
+                    used += cost
+            omitted = len(lines) - len(chosen)
+            lines = [lines[i] for i in sorted(chosen)]
+            if omitted:
+                lines.append(f"（另有 {omitted} 条与当前任务关系较小的记忆未列出）")
+        return "\n".join(p for p in (preamble, "\n".join(lines)) if p)
+
+
+_lock = threading.Lock()
+_cache: Optional[Tuple[Tuple[str, int, int], _Memory]] = None
+
+
+def _invalidate():
+    global _cache
+    with _lock:
+        _cache = None
+
+
+def _load() -> Optional[_Memory]:
+    """解析后的记忆（按路径 + mtime + 大小缓存），文件不存在返回 None"""
+    global _cache
+    path = _agents_md_path()
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    sig = (path, st.st_mtime_ns, st.st_size)
+    with _lock:
+        if _cache is not None and _cache[0] == sig:
+            return _cache[1]
+    text = read_memory()
+    mem = _Memory(text)
+    with _lock:
+        _cache = (sig, mem)
+    return mem
+
+
+def memory_prompt(query: str = "", budget: Optional[int] = None) -> str:
+    """
+    供系统提示词注入的记忆文本
+    :param query: 当前任务文本，用于超出预算时挑选相关条目
+    :param budget: token 上限，None 表示不限
+    """
+    mem = _load()
+    if mem is None:
+        return ""
+    return mem.render(query, budget)
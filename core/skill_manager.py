@@ -4,29 +4,33 @@ import json
 import importlib
 import inspect
 import logging
-from core.runtime_dir import get_runtime_dir
+import threading
+from typing import Callable, Dict, FrozenSet, Optional, Set, Tuple
+from core import config_store
+from core.runtime_dir import get_runtime_dir, resolve_path
 
-def load_skills():
-    """动态加载技能配置"""
+# 配置文件缺失时的默认快照（固定对象，技能表据此判断是否需要重建）
+_NO_SKILLS = config_store.freeze([])
+_NO_ROLE_SKILLS = config_store.freeze({})
+
+def _load_json(name: str, default):
+    """读取 .maren 下的配置快照（按 mtime 缓存，只读）"""
+    path = os.path.join(get_runtime_dir(), ".maren", name)
     try:
-        skill_path = os.path.join(get_runtime_dir(), ".maren", "skill.json")
-        if os.path.exists(skill_path):
-            with open(skill_path, "r", encoding="utf-8") as f:
-                return json.load(f)
+        return config_store.load(path)
+    except FileNotFoundError:
+        pass
     except Exception as e:
-        logging.error(f"读取 skill.json 失败: {e}")
-    return []
+        logging.error(f"读取 {name} 失败: {e}")
+    return default
+
+def load_skills():
+    """动态加载技能配置"""
+    return _load_json("skill.json", _NO_SKILLS)
 
 def load_role_skills():
     """加载角色技能映射"""
-    try:
-        role_skills_path = os.path.join(get_runtime_dir(), ".maren", "role_skills.json")
-        if os.path.exists(role_skills_path):
-            with open(role_skills_path, "r", encoding="utf-8") as f:
-                return json.load(f)
-    except Exception as e:
-        logging.error(f"读取 role_skills.json 失败: {e}")
-    return {}
+    return _load_json("role_skills.json", _NO_ROLE_SKILLS)
 
 
 # AI 常见的技能名称变体 → 正确名称映射
@@ -76,21 +80,53 @@ _SKILL_FALLBACK = {
 }
 
 
-def _resolve_skill(skill_name: str):
+# 技能的读写范围，用于同一轮多个工具调用的并行调度：(读取的路径参数, 写入的路径参数)
+# 不在表中的技能（run_command、add_memory 与自定义技能）副作用未知，按屏障独占执行
+_SKILL_EFFECTS = {
+    "read_file":        (("path",), ()),
+    "list_dir":         (("path",), ()),
+    "write_file":       ((), ("path",)),
+    "edit_file":        ((), ("path",)),
+    "edit_file_lines":  ((), ("path",)),
+    "create_file":      ((), ("path",)),
+    "create_directory": ((), ("path",)),
+    "rename_file":      ((), ("old_path", "new_path")),
+    "read_url":         ((), ()),
+    "search_web":       ((), ()),
+    "search_github":    ((), ()),
+    "get_time":         ((), ()),
+    "get_timestamp":    ((), ()),
+}
+
+
+def skill_effects(skill_name: str, params: dict) -> Optional[Tuple[Set[str], Set[str]]]:
+    """
+    技能调用涉及的 (读路径集合, 写路径集合)，路径已解析为绝对路径
+    返回 None 表示副作用未知，调度时需要与前后所有调用串行
+    """
+    name = _SKILL_ALIASES.get(skill_name, skill_name)
+    effects = _SKILL_EFFECTS.get(name)
+    if effects is None:
+        return None
+
+    def _paths(keys):
+        return {os.path.normcase(resolve_path(str(params.get(k) or "."))) for k in keys}
+
+    return _paths(effects[0]), _paths(effects[1])
+
+def _resolve_skill(skill_name: str, by_name: Dict[str, dict]):
     """
     解析技能名称 → (resolved_name, module_name, function_name)
     优先 skill.json，再别名，最后硬编码回退表
     """
-    skills = load_skills()
-
     # 第一步：直接匹配 skill.json
-    cfg = next((s for s in skills if s['name'] == skill_name), None)
+    cfg = by_name.get(skill_name)
 
     # 第二步：别名 → 再查 skill.json
     resolved = skill_name
     if not cfg and skill_name in _SKILL_ALIASES:
         resolved = _SKILL_ALIASES[skill_name]
-        cfg = next((s for s in skills if s['name'] == resolved), None)
+        cfg = by_name.get(resolved)
 
     if cfg:
         mod = cfg.get("module")
@@ -105,13 +141,85 @@ def _resolve_skill(skill_name: str):
         logging.info(f"技能回退: '{skill_name}' -> {mod}.{func}")
         return fallback_key, mod, func
 
-    available = [s['name'] for s in skills]
+    available = list(by_name)
     raise ValueError(
         f"技能 '{skill_name}' 未找到。"
         f"可用: {', '.join(available) if available else '(空)'}"
     )
 
 
+class SkillRegistry:
+    """
+    由 skill.json / role_skills.json 快照预编译的技能表
+    名称与别名解析、模块导入、函数签名在首次调用时完成并缓存，
+    角色技能提示词按角色缓存；配置文件变化时 get_registry() 会换用新表
+    """
+
+    def __init__(self, skills, role_skills):
+        self.skills = skills
+        self.role_skills = role_skills
+        self._by_name: Dict[str, dict] = {}
+        for skill in skills:
+            if isinstance(skill, dict) and skill.get("name"):
+                self._by_name.setdefault(skill["name"], skill)
+        self._lock = threading.Lock()
+        # skill_name → (resolved_name, 函数, 接受的参数名)
+        self._dispatch: Dict[str, Tuple[str, Callable, FrozenSet[str]]] = {}
+        self._prompts: Dict[str, str] = {}
+
+    def resolve(self, skill_name: str) -> Tuple[str, Callable, FrozenSet[str]]:
+        """技能名称（含别名）→ (resolved_name, 函数, 接受的参数名)"""
+        entry = self._dispatch.get(skill_name)
+        if entry is not None:
+            return entry
+        resolved_name, module_name, function_name = _resolve_skill(skill_name, self._by_name)
+        try:
+            module = importlib.import_module(module_name)
+        except ImportError as e:
+            raise RuntimeError(
+                f"技能 '{resolved_name}' 模块加载失败: {module_name}\n"
+                f"详情: {e}"
+            )
+        try:
+            func = getattr(module, function_name)
+        except AttributeError as e:
+            raise RuntimeError(
+                f"技能 '{resolved_name}' 函数不存在: "
+                f"{module_name}.{function_name}\n详情: {e}"
+            )
+        entry = (resolved_name, func, frozenset(inspect.signature(func).parameters))
+        with self._lock:
+            self._dispatch[skill_name] = entry
+        return entry
+
+    def prompt(self, role: str) -> str:
+        """角色的技能提示词（缓存）"""
+        text = self._prompts.get(role)
+        if text is None:
+            text = _render_skill_prompt(self.skills, self.role_skills, role)
+            with self._lock:
+                self._prompts[role] = text
+        return text
+
+
+_registry: Optional[SkillRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> SkillRegistry:
+    """当前技能表；skill.json / role_skills.json 变化（快照对象更换）时重建"""
+    global _registry
+    skills = load_skills()
+    role_skills = load_role_skills()
+    reg = _registry
+    if reg is None or reg.skills is not skills or reg.role_skills is not role_skills:
+        with _registry_lock:
+            reg = _registry
+            if reg is None or reg.skills is not skills or reg.role_skills is not role_skills:
+                reg = _registry = SkillRegistry(skills, role_skills)
+    return reg
+
+
 def execute_skill(skill_name: str, **kwargs):
     """
     动态执行技能
@@ -119,28 +227,10 @@ def execute_skill(skill_name: str, **kwargs):
     :param kwargs: 传递给技能函数的参数
     :return: 技能执行结果
     """
-    resolved_name, module_name, function_name = _resolve_skill(skill_name)
-
+    resolved_name, func, accepted = get_registry().resolve(skill_name)
+    valid_kwargs = {k: v for k, v in kwargs.items() if k in accepted}
     try:
-        module = importlib.import_module(module_name)
-        func = getattr(module, function_name)
-
-        sig = inspect.signature(func)
-        valid_kwargs = {
-            k: v for k, v in kwargs.items()
-            if k in sig.parameters
-        }
         return func(**valid_kwargs)
-    except ImportError as e:
-        raise RuntimeError(
-            f"技能 '{resolved_name}' 模块加载失败: {module_name}\n"
-            f"详情: {e}"
-        )
-    except AttributeError as e:
-        raise RuntimeError(
-            f"技能 '{resolved_name}' 函数不存在: "
-            f"{module_name}.{function_name}\n详情: {e}"
-        )
     except Exception as e:
         import traceback
         error_msg = (
@@ -153,9 +243,10 @@ def execute_skill(skill_name: str, **kwargs):
 
 def build_skill_prompt(role="Chatter"):
     """根据角色构建技能提示词"""
-    skills = load_skills()
-    role_skills_map = load_role_skills()
-    
+    return get_registry().prompt(role)
+
+def _render_skill_prompt(skills, role_skills_map, role):
+    """渲染角色技能提示词（结果由 SkillRegistry 缓存）"""
     if not skills:
         return ""
     
@@ -5,7 +5,8 @@ pipeline/chatter.py — Chatter 需求收集模块
 import sys
 import json
 from colorama import Fore, Style
-from core.agent import request
+from core import config_store
+from core.agent import hedge, stops
 from pipeline import dashboard
 import constants
 import utils.inited as inited
@@ -26,8 +27,7 @@ def _flush_input():
 def _load_chatter_cfg():
     """加载 Chatter 角色配置"""
     try:
-        with open(inited.maren_json_path(), "r", encoding="utf-8") as f:
-            config = json.load(f)
+        config = config_store.load(inited.maren_json_path())
     except Exception:
         return None
     mc = config.get("model", {})
@@ -82,8 +82,9 @@ def _call_chatter(base_url, api_key, model_name, system, history, msg):
     """调用 Chatter AI 并收集完整回复"""
     parts = []
     try:
-        for chunk in request.chat_complete(
-            base_url, api_key, model_name, system, history, msg
+        for chunk in hedge.chat_complete(
+            base_url, api_key, model_name, system, history, msg,
+            role="chatter", stop=stops.REQUIREMENTS_DONE
         ):
             parts.append(chunk)
             print(chunk, end="", flush=True)
@@ -108,7 +109,7 @@ def gather_requirements(initial_msg: str):
         return None
     base_url, api_key, model_name, lang = cfg
     lang_hint = f"\n使用 {lang} 与用户交流。"
-    system = constants.BASE_SYSTEM + constants.load_memory_prompt() + CHATTER_GATHER_PROMPT + lang_hint
+    system = constants.BASE_SYSTEM + constants.load_memory_prompt(initial_msg) + CHATTER_GATHER_PROMPT + lang_hint
     dashboard.phase_start("chatter", "正在与您交流需求细节...")
     history = []
     prompt = f"  {Fore.LIGHTMAGENTA_EX}you>{Style.RESET_ALL} "
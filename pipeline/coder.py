@@ -4,10 +4,12 @@ pipeline/coder.py — Coder/Designer 代码执行模块
 """
 import os
 import json
+from typing import Optional
 from colorama import Fore, Style
-from core.agent import request
+from core import settings
+from core.agent import hedge, http_pool, request, tool_stream
 from core.runtime_dir import resolve_path, get_runtime_dir
-from core.skill_manager import execute_skill, build_skill_prompt
+from core.skill_manager import build_skill_prompt
 from pipeline import dashboard
 from pipeline.leader import _load_role_cfg
 import constants
@@ -59,7 +61,7 @@ def write_files(blocks: list):
 
 
 def _extract_tool_call(text: str):
-    """从 AI 输出中提取 tool_call JSON"""
+    """从 AI 输出中提取第一个 tool_call JSON"""
     if "```tool_call" in text:
         start = text.find("```tool_call") + 12
         end = text.find("```", start)
@@ -82,20 +84,64 @@ def _extract_tool_call(text: str):
     return None
 
 
-def _call_ai(rc, full_sys, history, user_msg, **kwargs):
-    """调用 AI 并收集完整回复"""
+def _extract_tool_calls(text: str) -> list:
+    """提取 AI 输出中的所有工具调用；没有 tool_call 代码块时回退到单个 ```json 形式"""
+    calls = tool_stream.extract_tool_calls(text)
+    if calls or "```tool_call" in text:
+        return calls
+    call = _extract_tool_call(text)
+    return [call] if isinstance(call, dict) and call.get("action") else []
+
+
+def _call_ai(rc, full_sys, history, user_msg, dispatcher=None, **kwargs):
+    """
+    调用 AI 并收集完整回复；一轮回复中的所有工具调用都会执行
+    传入 dispatcher 时，每个工具调用在代码块闭合的那一刻就开始执行
+    """
     parts = []
-    for chunk in request.chat_complete(
+    stream = hedge.chat_complete(
         rc["base_url"], rc["api_key"], rc["model_name"],
-        full_sys, history, user_msg, **kwargs
-    ):
+        full_sys, history, user_msg,
+        continue_on_length=True, **kwargs
+    )
+    if dispatcher is not None:
+        stream = dispatcher.watch(stream)
+    for chunk in stream:
         parts.append(chunk)
     return "".join(parts)
 
 
-def _execute_role_task(task: dict, context: str, role: str, mode="quality"):
-    """执行单个角色任务，支持多轮工具调用（搜索结果直接注入AI）"""
-    cfg_role = "coder" if role == "designer" else role
+def _record_written(files: Optional[list], paths):
+    if files is None:
+        return
+    for p in paths:
+        if p not in files:
+            files.append(p)
+
+
+def _aborted(phase: str, tid, dispatcher, files: Optional[list]) -> str:
+    """任务被中止（调度器收到 Ctrl-C）：等已开始的工具调用结束，不再继续后续轮次"""
+    dispatcher.drain()
+    _record_written(files, dispatcher.written())
+    dashboard.phase_error(phase, f"#{tid} 被用户中断")
+    return f"[ERROR] 任务 #{tid} 被用户中断"
+
+
+def _truncated(phase: str, tid, dispatcher, files: Optional[list], error) -> str:
+    """回复续写后仍不完整：等已开始的工具调用结束并记录写入的文件，任务按失败处理"""
+    dispatcher.drain()
+    _record_written(files, dispatcher.written())
+    dashboard.phase_error(phase, f"#{tid} 输出不完整: {error}")
+    return f"[ERROR] 任务 #{tid} 输出不完整: {error}"
+
+
+def _execute_role_task(task: dict, context: str, role: str, mode="quality",
+                       files: Optional[list] = None):
+    """
+    执行单个角色任务，支持多轮工具调用（搜索结果直接注入AI）
+    :param files: 传入列表时，追加本任务写入的文件（绝对路径，来自 write_file / edit_file 等工具调用）
+    """
+    cfg_role = settings.config_role(role)
     rc = _load_role_cfg(cfg_role)
     if not rc:
         return f"[ERROR] {role.capitalize()} 配置缺失"
@@ -119,7 +165,7 @@ def _execute_role_task(task: dict, context: str, role: str, mode="quality"):
     skill_prompt = build_skill_prompt("Coder")
     lang_hint = f"\n使用 {rc['lang']} 输出。"
     full_sys = (
-        constants.BASE_SYSTEM + constants.load_memory_prompt()
+        constants.BASE_SYSTEM + constants.load_memory_prompt(desc)
         + "\n" + sys_prompt
         + "\n" + skill_prompt + lang_hint
     )
@@ -131,11 +177,19 @@ def _execute_role_task(task: dict, context: str, role: str, mode="quality"):
     if mode == "saving":
         mt = min(mt, 2048)
     kwargs["max_tokens"] = mt
+    # 遥测按实际角色统计；后端池、限流、缓存与对冲按 settings.config_role 归入 coder
+    kwargs["role"] = role
+
+    # 多轮工具调用循环（最多 5 轮）
+    max_tool_rounds = 5
 
     # 第一轮调用
     history = []
+    dispatcher = tool_stream.EarlyDispatcher()
     try:
-        output = _call_ai(rc, full_sys, history, user_msg, **kwargs)
+        output = _call_ai(rc, full_sys, history, user_msg, dispatcher, **kwargs)
+    except request.TruncatedError as e:
+        return _truncated(phase, tid, dispatcher, files, e)
     except RuntimeError as e:
         dashboard.phase_error(phase, f"#{tid} API 错误: {e}")
         return f"[ERROR] {e}"
@@ -146,51 +200,54 @@ def _execute_role_task(task: dict, context: str, role: str, mode="quality"):
         dashboard.phase_error(phase, f"#{tid} 未知异常: {type(e).__name__}: {e}")
         return f"[ERROR] {type(e).__name__}: {e}"
 
-    # 多轮工具调用循环（最多 5 轮）
     # 搜索结果等工具输出直接注入 AI，不输出给用户
-    max_tool_rounds = 5
-    for _ in range(max_tool_rounds):
-        tool_call = _extract_tool_call(output)
-        if not tool_call:
-            break
-
-        action = tool_call.get("action")
-        if not action:
+    # 一轮中的所有工具调用并行执行（同一路径的写入串行），结果合并为一条消息注入
+    for round_no in range(max_tool_rounds):
+        if http_pool.aborted():
+            return _aborted(phase, tid, dispatcher, files)
+        tool_calls = _extract_tool_calls(output)
+        if not tool_calls:
             break
 
         # 静默执行工具
-        msg = tool_call.get("msg", "")
-        if msg:
-            dashboard.phase_start(phase, f"#{tid} ⚡ {msg}")
+        for tool_call in tool_calls:
+            msg = tool_call.get("msg", "")
+            if msg:
+                dashboard.phase_start(phase, f"#{tid} ⚡ {msg}")
 
-        try:
-            params = {k: v for k, v in tool_call.items()
-                      if k not in ("action", "msg")}
-            result = execute_skill(action, **params)
-            result_str = str(result)
-            if len(result_str) > 8000:
-                result_str = result_str[:8000] + "...(truncated)"
-        except Exception as e:
-            dashboard.phase_error(phase, f"#{tid} 工具 '{action}' 失败: {e}")
-            break
+        results = dispatcher.results(tool_calls)
+        _record_written(files, dispatcher.written())
+        for action, _, error in results:
+            if error is not None:
+                dashboard.phase_error(phase, f"#{tid} 工具 '{action}' 失败: {error}")
 
         # 将工具结果注入历史，让 AI 继续
         history.append({"role": "user", "content": user_msg})
         history.append({"role": "assistant", "content": output})
         history.append({"role": "system", "content": (
-            f"工具 ({action}) 执行结果：\n\n{result_str}\n\n"
+            f"{tool_stream.format_results(results)}\n\n"
             f"请根据以上结果继续完成任务。"
             f"如果还需要调用其他工具请继续，否则直接输出最终结果。"
         )})
 
+        # 最后一轮的工具调用不会被执行，也就不提前执行
+        dispatcher = tool_stream.EarlyDispatcher(enabled=round_no < max_tool_rounds - 1)
         try:
             output = _call_ai(
-                rc, full_sys, history, "请继续", **kwargs
+                rc, full_sys, history, "请继续", dispatcher, **kwargs
             )
+        except request.TruncatedError as e:
+            return _truncated(phase, tid, dispatcher, files, e)
         except Exception as e:
             dashboard.phase_error(phase, f"#{tid} 工具后续调用失败: {e}")
             break
 
+    if http_pool.aborted():
+        return _aborted(phase, tid, dispatcher, files)
+    # 最后一轮回复中提前执行、但未经 results 取回的工具调用
+    dispatcher.drain()
+    _record_written(files, dispatcher.written())
+
     # 危险命令检查
     dangers = check_dangerous(output)
     if dangers:
@@ -200,16 +257,18 @@ def _execute_role_task(task: dict, context: str, role: str, mode="quality"):
     blocks = parse_file_blocks(output)
     if blocks:
         write_files(blocks)
+        _record_written(files, [p for p in (os.path.normcase(resolve_path(b["path"])) for b in blocks)
+                                if os.path.isfile(p)])
 
     dashboard.phase_done(phase, f"#{tid} 完成")
     return output
 
 
-def execute_task(task: dict, context: str, mode="quality"):
-    """执行单个 Coder 任务，返回输出文本"""
-    return _execute_role_task(task, context, "coder", mode)
+def execute_task(task: dict, context: str, mode="quality", files: Optional[list] = None):
+    """执行单个 Coder 任务，返回输出文本；files 同 _execute_role_task"""
+    return _execute_role_task(task, context, "coder", mode, files)
 
 
-def execute_designer_task(task: dict, context: str, mode="quality"):
-    """执行单个 Designer 任务，返回输出文本"""
-    return _execute_role_task(task, context, "designer", mode)
+def execute_designer_task(task: dict, context: str, mode="quality", files: Optional[list] = None):
+    """执行单个 Designer 任务，返回输出文本；files 同 _execute_role_task"""
+    return _execute_role_task(task, context, "designer", mode, files)
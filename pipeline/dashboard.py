@@ -102,6 +102,26 @@ def loop_info(current: int, max_loops: int, mode: str):
     print(f"  {Fore.LIGHTBLACK_EX}{'─' * 56}{Style.RESET_ALL}")
 
 
+def call_stats(stats: dict):
+    """本次运行的 LLM 调用统计（metrics.summary 的输出）"""
+    if not stats:
+        return
+    print(f"  {Fore.LIGHTBLACK_EX}{'─' * 56}{Style.RESET_ALL}")
+    for key, st in sorted(stats.items()):
+        role = key.split("/", 1)[0]
+        c = _phase_color(role)
+        ttft = st.get("ttft_p50")
+        tps = st.get("tokens_per_sec")
+        ttft_s = f"{ttft:.1f}s" if ttft is not None else "-"
+        tps_s = f"{tps:.0f} tok/s" if tps else "-"
+        print(f"  {Style.BRIGHT}{c}[{role.upper()}]{Style.RESET_ALL} "
+              f"{Fore.LIGHTBLACK_EX}{key.split('/', 1)[-1]}{Style.RESET_ALL} "
+              f"调用 {st['calls']} 次 | TTFT {ttft_s} | {tps_s} | "
+              f"tokens {st['prompt_tokens']}/{st['completion_tokens']}")
+    print(f"  {Fore.LIGHTBLACK_EX}{'─' * 56}{Style.RESET_ALL}")
+    print()
+
+
 def danger_warning(cmd: str):
     """危险命令警告"""
     print(f"\n  {Fore.RED}{Style.BRIGHT}⚠ 危险命令检测{Style.RESET_ALL}")
@@ -0,0 +1,224 @@
+"""
+pipeline/flow.py — 全自动流水线（new 与 run enter 共用，resume 从日志继续）
+Chatter 收集需求 → Leader 拆分任务 → Coder/Designer 按依赖并发执行 → Tester 审查 → 修复循环 → 总结
+每个阶段的结果都写入运行日志（pipeline.journal）；传入 state 时已完成的阶段与任务直接沿用。
+Leader 流式输出计划时，无依赖的任务一解析出来就开始执行，不必等计划生成完。
+"""
+import time
+from colorama import Fore, Style
+from shell.cmd import prefix
+from shell.cmd.config import get_mode, get_max_loops
+from core.agent import metrics
+from pipeline import dashboard, journal as run_journal
+from pipeline.chatter import gather_requirements
+from pipeline.leader import plan_tasks, plan_bugfixes, summarize_project
+from pipeline.runner import EarlyStarter, run_tasks, run_fix_tasks
+from pipeline.tester import review_code, ReviewState
+
+
+def _interrupted(journal):
+    journal.finish("interrupted")
+    print(f"\n{prefix()}{Fore.YELLOW}已中断{Style.RESET_ALL}"
+          f"  {Fore.LIGHTBLACK_EX}(resume {journal.run_id} 可从断点继续){Style.RESET_ALL}")
+
+
+def run_flow(message: str, command: str, summarize: bool, state=None):
+    """
+    执行完整流水线
+    :param command: 发起命令（new / run），记录在日志中供 resume 使用
+    :param summarize: 是否在最后由 Leader 总结项目
+    :param state: resume 时重放日志得到的运行状态
+    """
+    if state is None:
+        mode = get_mode()
+        max_loops = get_max_loops()
+        journal = run_journal.RunJournal.create(command, message, mode, max_loops)
+        state = run_journal.RunState(journal.run_id)
+    else:
+        mode = state.mode or get_mode()
+        max_loops = state.max_loops or get_max_loops()
+        journal = run_journal.RunJournal(state.run_id)
+        journal.append("resume", durable=True)
+    run_started = time.time()
+    early = EarlyStarter(mode)
+
+    try:
+        _run(message, summarize, state, journal, mode, max_loops, run_started, early)
+    finally:
+        early.close()
+        journal.close()
+
+
+def _run(message, summarize, state, journal, mode, max_loops, run_started, early):
+    dashboard.banner("Maren Code 全自动编程引擎")
+    print(f"  {dashboard.CAT} 模式: {Fore.CYAN}{mode}{Style.RESET_ALL}"
+          f" | 最大循环: {Fore.CYAN}{max_loops}{Style.RESET_ALL}"
+          f" | 运行: {Fore.LIGHTBLACK_EX}{journal.run_id}{Style.RESET_ALL}")
+    print()
+
+    # ══════════════════════════════════════════════
+    # Phase 1: Chatter 收集需求
+    # ══════════════════════════════════════════════
+    requirements = state.requirements
+    if requirements:
+        dashboard.phase_done("chatter", "沿用已收集的需求")
+    else:
+        try:
+            requirements = gather_requirements(message)
+        except KeyboardInterrupt:
+            _interrupted(journal)
+            return
+        if not requirements:
+            journal.finish("failed")
+            print(f"{prefix()}{Fore.RED}需求收集失败{Style.RESET_ALL}")
+            return
+        journal.requirements(requirements)
+
+    # ══════════════════════════════════════════════
+    # Phase 2: Leader 总结优化提示词，拆分细小任务
+    # ══════════════════════════════════════════════
+    plan = state.plan
+    if plan:
+        dashboard.phase_done("leader", f"沿用已有计划，共 {len(plan.get('tasks', []))} 个任务")
+    else:
+        try:
+            # 计划流式输出期间，无依赖的任务一闭合就交给 Coder / Designer
+            plan = plan_tasks(requirements, mode, on_task=early.offer)
+        except KeyboardInterrupt:
+            _interrupted(journal)
+            return
+        except Exception as e:
+            journal.finish("failed")
+            print(f"{prefix()}{Fore.RED}Leader 规划失败: {e}{Style.RESET_ALL}")
+            return
+        journal.plan(plan)
+
+    tasks = plan.get("tasks", [])
+    if not tasks:
+        journal.finish("failed")
+        print(f"{prefix()}{Fore.RED}Leader 未生成任何任务{Style.RESET_ALL}")
+        return
+
+    # 展示任务面板
+    dashboard.task_list([
+        {"id": t["id"], "title": t["title"], "role": t.get("role", "Coder"),
+         "status": "done" if t["id"] in state.outputs else "pending"}
+        for t in tasks
+    ])
+
+    # ══════════════════════════════════════════════
+    # Phase 3: Leader 按依赖关系把任务并发交给 Coder / Designer
+    # ══════════════════════════════════════════════
+    context = plan.get("summary", "")
+    try:
+        all_outputs = run_tasks(tasks, context, mode, completed=state.outputs,
+                                on_result=lambda t, out, files: journal.task("plan", 0, t, out, files),
+                                early=early)
+    except KeyboardInterrupt:
+        _interrupted(journal)
+        return
+    # 累积上下文供修复任务使用
+    context += "".join(f"\n[#{tid} {o['title']} 已完成]" for tid, o in all_outputs.items())
+
+    if not all_outputs:
+        journal.finish("failed")
+        print(f"{prefix()}{Fore.RED}没有任务产出{Style.RESET_ALL}")
+        return
+
+    # ══════════════════════════════════════════════
+    # Phase 4: Tester 测试 → Leader 总结 → 拆分修复 → Coder 修复 → 循环
+    # ══════════════════════════════════════════════
+    # 跨循环的审查状态：每轮只审查有变化的任务
+    review_state = ReviewState()
+    for loop_i in range(1, max_loops + 1):
+        done = state.loops.get(loop_i) or run_journal.LoopState()
+        if done.ended:
+            # 日志中已完成的一轮：只恢复修复产出
+            all_outputs.update(done.outputs)
+            continue
+        dashboard.loop_info(loop_i, max_loops, mode)
+
+        # 4a: Tester 审查代码，写测试报告
+        report = done.report
+        if report is None:
+            try:
+                report = review_code(all_outputs, mode, review_state)
+            except KeyboardInterrupt:
+                _interrupted(journal)
+                return
+            # 审查未能进行（配置缺失、API 错误）时不记录，resume 时重新审查
+            if not report.get("skipped"):
+                journal.review(loop_i, report)
+
+        if report.get("skipped"):
+            # 审查没有完成（配置缺失、API 错误、输出不完整），不能当作通过
+            dashboard.phase_error("tester", "审查未完成，代码未经确认")
+            break
+
+        errors = [i for i in report.get("issues", [])
+                  if i.get("severity") == "error"]
+        if not errors:
+            dashboard.phase_done("tester", "所有测试通过 ✓")
+            break
+
+        dashboard.phase_done("tester",
+            f"发现 {len(errors)} 个错误，报告已提交给 Leader")
+
+        # 4b: Leader 接收测试报告，总结并拆分修复任务
+        fix_tasks = done.fixes
+        if fix_tasks is None:
+            dashboard.phase_start("leader", "正在分析测试报告并拆分修复任务...")
+            try:
+                fix_plan = plan_bugfixes(report, mode)
+            except KeyboardInterrupt:
+                _interrupted(journal)
+                return
+            fix_tasks = fix_plan.get("tasks", [])
+            journal.fixes(loop_i, fix_tasks)
+
+        if not fix_tasks:
+            dashboard.phase_done("leader", "无法生成修复任务，结束循环")
+            break
+
+        dashboard.task_list([
+            {"id": ft["id"], "title": ft["title"], "role": ft.get("role", "Coder"),
+             "status": "done" if ft["id"] in done.outputs else "pending"}
+            for ft in fix_tasks
+        ])
+
+        # 4c: Leader 将修复任务并发交给 Coder（修改同一文件的修复串行）
+        try:
+            all_outputs.update(run_fix_tasks(
+                fix_tasks, report, context, mode, completed=done.outputs,
+                on_result=lambda t, out, files, i=loop_i: journal.task("fix", i, t, out, files)))
+        except KeyboardInterrupt:
+            _interrupted(journal)
+            return
+        journal.loop_end(loop_i)
+
+        # 循环回到 Tester 再次测试
+
+    # ══════════════════════════════════════════════
+    # Phase 5: Leader 总结项目
+    # ══════════════════════════════════════════════
+    summary = ""
+    if summarize:
+        summary = state.summary
+        if summary is None:
+            try:
+                summary = summarize_project(all_outputs, mode)
+            except KeyboardInterrupt:
+                _interrupted(journal)
+                return
+            except Exception:
+                summary = ""
+            journal.summary(summary)
+    journal.finish("done")
+
+    dashboard.banner("项目完成", Fore.LIGHTGREEN_EX)
+    dashboard.call_stats(metrics.summary(since=run_started))
+    print(f"  {prefix()}{Fore.GREEN}全部完成。{Style.RESET_ALL}")
+    if summary:
+        print(f"\n{summary}")
+    elif not summarize:
+        print()
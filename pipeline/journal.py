@@ -0,0 +1,190 @@
+"""
+pipeline/journal.py — 流水线运行日志与断点恢复
+每次 new / run enter 的运行记录在 .maren/runs/<run_id>/journal.jsonl：
+需求、计划、每个任务的状态与输出、每轮修复循环的审查报告与修复任务、项目总结。
+只追加写入，每行一个事件；任务结果按时间批量 fsync，阶段性事件立即 fsync。
+进程被中断或崩溃后，resume <run_id> 重放日志，跳过已完成的任务，从第一个未完成的阶段继续。
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, List, Optional
+import utils.inited as inited
+
+JOURNAL_FILE = "journal.jsonl"
+# 非阶段性事件（任务结果）的 fsync 间隔（秒）
+FSYNC_INTERVAL = 1.0
+
+
+def runs_dir() -> str:
+    return os.path.join(inited.maren_dir_path(), "runs")
+
+
+def _journal_path(run_id: str) -> str:
+    return os.path.join(runs_dir(), run_id, JOURNAL_FILE)
+
+
+def _new_run_id() -> str:
+    return f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:4]}"
+
+
+class RunJournal:
+    """一次运行的只追加日志（线程安全）"""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.path = _journal_path(run_id)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self._f = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self._last_sync = time.monotonic()
+
+    @classmethod
+    def create(cls, command: str, message: str, mode: str, max_loops: int) -> "RunJournal":
+        """新建一次运行的日志"""
+        journal = cls(_new_run_id())
+        journal.append("start", durable=True, command=command, message=message,
+                       mode=mode, max_loops=max_loops)
+        return journal
+
+    def append(self, event: str, durable: bool = False, **data):
+        """追加一个事件；durable 为 True 或距上次 fsync 超过 FSYNC_INTERVAL 时落盘"""
+        line = json.dumps(dict(data, event=event, ts=time.time()), ensure_ascii=False)
+        with self._lock:
+            if self._f.closed:
+                return
+            self._f.write(line + "\n")
+            self._f.flush()
+            now = time.monotonic()
+            if durable or now - self._last_sync >= FSYNC_INTERVAL:
+                os.fsync(self._f.fileno())
+                self._last_sync = now
+
+    def close(self):
+        with self._lock:
+            if not self._f.closed:
+                self._f.flush()
+                os.fsync(self._f.fileno())
+                self._f.close()
+
+    # ---- 事件 ----
+
+    def requirements(self, requirements):
+        self.append("requirements", durable=True, data=requirements)
+
+    def plan(self, plan: dict):
+        self.append("plan", durable=True, data=plan)
+
+    def task(self, kind: str, loop: int, task: dict, output, files: Optional[list] = None):
+        """任务结束：kind 为 plan（计划任务）或 fix（第 loop 轮修复任务）；files 为任务写入的文件"""
+        output = "" if output is None else str(output)
+        self.append("task", kind=kind, loop=loop, id=task["id"],
+                    title=task.get("title", ""), role=task.get("role", "Coder"),
+                    ok=not output.startswith("[ERROR]"), output=output, files=files or [])
+
+    def review(self, loop: int, report: dict):
+        self.append("review", durable=True, loop=loop, report=report)
+
+    def fixes(self, loop: int, tasks: list):
+        self.append("fixes", durable=True, loop=loop, tasks=tasks)
+
+    def loop_end(self, loop: int):
+        self.append("loop_end", durable=True, loop=loop)
+
+    def summary(self, text: str):
+        self.append("summary", durable=True, text=text)
+
+    def finish(self, status: str):
+        self.append("finish", durable=True, status=status)
+
+
+class LoopState:
+    """重放得到的一轮修复循环"""
+
+    def __init__(self):
+        self.report: Optional[dict] = None
+        self.fixes: Optional[list] = None
+        self.outputs: Dict[object, dict] = {}
+        self.ended = False
+
+
+class RunState:
+    """重放日志得到的运行状态"""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.command = "new"
+        self.message = ""
+        self.mode = None
+        self.max_loops = None
+        self.started: Optional[float] = None
+        self.requirements = None
+        self.plan: Optional[dict] = None
+        self.outputs: Dict[object, dict] = {}     # 已成功完成的计划任务
+        self.loops: Dict[int, LoopState] = {}
+        self.summary: Optional[str] = None
+        self.status = "running"                   # running / interrupted / done / failed
+
+    def loop(self, index: int) -> LoopState:
+        return self.loops.setdefault(index, LoopState())
+
+    def apply(self, ev: dict):
+        kind = ev.get("event")
+        if kind == "start":
+            self.command = ev.get("command", "new")
+            self.message = ev.get("message", "")
+            self.mode = ev.get("mode")
+            self.max_loops = ev.get("max_loops")
+            self.started = ev.get("ts")
+        elif kind == "requirements":
+            self.requirements = ev.get("data")
+        elif kind == "plan":
+            self.plan = ev.get("data")
+        elif kind == "task" and ev.get("ok"):
+            out = {"title": ev.get("title", ""), "output": ev.get("output", ""),
+                   "role": ev.get("role", "Coder"), "files": ev.get("files") or []}
+            if ev.get("kind") == "fix":
+                self.loop(ev.get("loop", 0)).outputs[ev["id"]] = out
+            else:
+                self.outputs[ev["id"]] = out
+        elif kind == "review":
+            self.loop(ev["loop"]).report = ev.get("report")
+        elif kind == "fixes":
+            self.loop(ev["loop"]).fixes = ev.get("tasks")
+        elif kind == "loop_end":
+            self.loop(ev["loop"]).ended = True
+        elif kind == "summary":
+            self.summary = ev.get("text")
+        elif kind == "finish":
+            self.status = ev.get("status", "done")
+        elif kind == "resume":
+            self.status = "running"
+
+
+def load(run_id: str) -> Optional[RunState]:
+    """重放运行日志；不存在返回 None。末尾被截断的行（写入中途崩溃）忽略"""
+    path = _journal_path(run_id)
+    if not os.path.isfile(path):
+        return None
+    state = RunState(run_id)
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                ev = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if isinstance(ev, dict):
+                state.apply(ev)
+    return state
+
+
+def list_runs(limit: int = 10) -> List[RunState]:
+    """最近的运行（按开始时间倒序）"""
+    try:
+        names = os.listdir(runs_dir())
+    except OSError:
+        return []
+    return [s for s in (load(n) for n in sorted(names, reverse=True)[:limit]) if s is not None]
@@ -3,8 +3,10 @@ pipeline/leader.py — Leader 任务规划与 Bug 修复拆分
 """
 import json
 from colorama import Fore, Style
-from core.agent import request
+from core import config_store
+from core.agent import hedge
 from pipeline import dashboard
+from pipeline.plan_stream import PlanStreamParser
 import constants
 import utils.inited as inited
 from shell.cmd.config import get_config, get_role_model_override
@@ -13,8 +15,7 @@ from shell.cmd.config import get_config, get_role_model_override
 def _load_role_cfg(role: str):
     """加载指定角色的 API 配置，支持角色独立 base_url"""
     try:
-        with open(inited.maren_json_path(), "r", encoding="utf-8") as f:
-            config = json.load(f)
+        config = config_store.load(inited.maren_json_path())
     except Exception:
         return None
     mc = config.get("model", {})
@@ -39,13 +40,13 @@ def _load_role_cfg(role: str):
     }
 
 
-def _call_role(role, system, msg, mode="quality"):
-    """调用指定角色 AI，返回完整回复"""
+def _call_role(role, system, msg, mode="quality", on_chunk=None):
+    """调用指定角色 AI，返回完整回复；on_chunk 在每段流式输出到达时调用"""
     rc = _load_role_cfg(role)
     if not rc:
         return f"[ERROR] {role} 配置缺失"
     lang_hint = f"\n使用 {rc['lang']} 输出。"
-    full_sys = constants.BASE_SYSTEM + constants.load_memory_prompt() + "\n" + system + lang_hint
+    full_sys = constants.BASE_SYSTEM + constants.load_memory_prompt(msg) + "\n" + system + lang_hint
     kwargs = {}
     if rc.get("temperature") is not None:
         kwargs["temperature"] = rc["temperature"]
@@ -56,11 +57,13 @@ def _call_role(role, system, msg, mode="quality"):
         kwargs["max_tokens"] = mt
     parts = []
     try:
-        for chunk in request.chat_complete(
+        for chunk in hedge.chat_complete(
             rc["base_url"], rc["api_key"], rc["model_name"],
-            full_sys, [], msg, **kwargs
+            full_sys, [], msg, role=role, **kwargs
         ):
             parts.append(chunk)
+            if on_chunk:
+                on_chunk(chunk)
     except RuntimeError as e:
         # API 层面的明确错误（连接失败、超时、HTTP 错误等）
         return f"[ERROR] {role} 调用失败: {e}"
@@ -91,8 +94,12 @@ def _parse_plan(text: str):
     return None
 
 
-def plan_tasks(requirements, mode="quality"):
-    """Leader 分析需求并输出任务计划，支持 str 或 dict 输入"""
+def plan_tasks(requirements, mode="quality", on_task=None):
+    """
+    Leader 分析需求并输出任务计划，支持 str 或 dict 输入
+    :param on_task: 流式输出中每个任务对象闭合时调用 on_task(task, header)，
+                    header 为 tasks 之前的计划字段；返回的完整计划仍以整段回复为准
+    """
     dashboard.phase_start("leader", "正在分析需求并规划任务...")
     if isinstance(requirements, str):
         req_str = requirements
@@ -104,7 +111,14 @@ def plan_tasks(requirements, mode="quality"):
         "涉及逻辑/后端的任务 role 设为 Coder。\n\n"
         f"用户需求：\n{req_str}"
     )
-    reply = _call_role("leader", constants.LEADER_SYSTEM, prompt, mode)
+    on_chunk = None
+    if on_task:
+        parser = PlanStreamParser()
+
+        def on_chunk(chunk):
+            for task in parser.feed(chunk):
+                on_task(task, parser.header or {})
+    reply = _call_role("leader", constants.LEADER_SYSTEM, prompt, mode, on_chunk)
     plan = _parse_plan(reply)
     if not plan or "tasks" not in plan:
         dashboard.phase_error("leader", "规划失败，回退单任务")
@@ -147,7 +161,8 @@ def plan_bugfixes(test_report: dict, mode="quality"):
     report_str = json.dumps(issues, ensure_ascii=False, indent=2)
     prompt = f"""测试发现以下问题，请拆分为修复任务：
 {report_str}
-每个任务只修复一个问题，输出 JSON 格式。"""
+每个任务只修复一个问题，输出 JSON 格式。
+每个任务额外给出 "files": [该修复需要修改的文件路径]，修改不同文件的修复会并行执行。"""
     reply = _call_role("leader", constants.LEADER_SYSTEM, prompt, mode)
     plan = _parse_plan(reply)
     if not plan or "tasks" not in plan:
@@ -0,0 +1,118 @@
+"""
+pipeline/plan_stream.py — Leader 计划的增量 JSON 解析
+Leader 的计划是一个 JSON 对象，tasks 数组在最后且往往很长。PlanStreamParser 随流式输出逐块喂入，
+每当 tasks 数组中的一个任务对象闭合就立即把它解析出来，不必等整个计划生成完：
+
+  parser = PlanStreamParser()
+  for chunk in stream:
+      for task in parser.feed(chunk):
+          ...                     # 刚闭合的任务对象
+  parser.header                   # tasks 之前的字段（project_name、summary 等），tasks 开始后可用
+
+只跟踪字符串 / 转义状态与括号层级，每个字符只扫描一次；最终结果仍以完整回复的解析为准。
+"""
+import json
+from typing import List, Optional
+
+_FENCE = "```json"
+
+
+class PlanStreamParser:
+    """逐块解析 Leader 计划，任务对象闭合即产出"""
+
+    def __init__(self):
+        self._buf = ""
+        self._pos = 0                  # 下一个待扫描的字符
+        self._started = False          # 是否已进入顶层对象
+        self._stack: List[str] = []    # 尚未闭合的 { / [
+        self._in_str = False
+        self._esc = False
+        self._str_start = 0
+        self._key = None               # 顶层对象中最近闭合的字符串（及其起点）
+        self._key_start = 0
+        self._root = 0                 # 顶层对象的起点
+        self._in_tasks = False         # 是否在顶层 tasks 数组中
+        self._obj_start: Optional[int] = None
+        self.header: Optional[dict] = None
+        self.done = False              # 顶层对象已闭合
+
+    def _find_root(self) -> bool:
+        """与 leader._parse_plan 一致：```json 围栏之后，或回复本身以 { 开头"""
+        fence = self._buf.find(_FENCE)
+        if fence != -1:
+            i = self._buf.find("{", fence + len(_FENCE))
+        elif self._buf.lstrip().startswith("{"):
+            i = self._buf.find("{")
+        else:
+            return False
+        if i == -1:
+            return False
+        self._root = self._pos = i
+        self._started = True
+        return True
+
+    def _parse_header(self):
+        """tasks 数组开始时，解析它之前的顶层字段"""
+        try:
+            header = json.loads(self._buf[self._root:self._key_start] + '"tasks": []}')
+        except json.JSONDecodeError:
+            header = {}
+        self.header = header if isinstance(header, dict) else {}
+
+    def feed(self, chunk: str) -> List[dict]:
+        """喂入一段输出，返回其中闭合的任务对象（带 id 的 dict）"""
+        self._buf += chunk
+        out: List[dict] = []
+        if self.done or (not self._started and not self._find_root()):
+            return out
+        buf, stack = self._buf, self._stack
+        i, n = self._pos, len(buf)
+        while i < n:
+            c = buf[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif c == "\\":
+                    self._esc = True
+                elif c == '"':
+                    self._in_str = False
+                    if len(stack) == 1:
+                        self._key = buf[self._str_start + 1:i]
+                        self._key_start = self._str_start
+            elif c == '"':
+                self._in_str = True
+                self._str_start = i
+            elif c == "{" or c == "[":
+                if c == "[" and stack == ["{"] and self._key == "tasks" and self.header is None:
+                    self._in_tasks = True
+                    self._parse_header()
+                elif c == "{" and self._in_tasks and len(stack) == 2:
+                    self._obj_start = i
+                stack.append(c)
+            elif c == "}" or c == "]":
+                if stack:
+                    stack.pop()
+                if c == "}" and self._obj_start is not None and len(stack) == 2:
+                    task = self._parse_task(buf[self._obj_start:i + 1])
+                    if task is not None:
+                        out.append(task)
+                    self._obj_start = None
+                elif c == "]" and self._in_tasks and len(stack) == 1:
+                    self._in_tasks = False
+                if not stack:
+                    self.done = True
+                    i += 1
+                    break
+            i += 1
+        self._pos = i
+        return out
+
+    @staticmethod
+    def _parse_task(text: str) -> Optional[dict]:
+        try:
+            task = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        if isinstance(task, dict) and "id" in task:
+            return task
+        return None
@@ -0,0 +1,353 @@
+"""
+pipeline/runner.py — 计划任务的并发执行（new 与 run enter 共用）
+Leader 拆出的任务按 depends_on 交给 core.scheduler.DagScheduler：
+依赖完成即开始，每个角色的并发数受 config concurrency 限制；
+槽位不够时按关键路径优先，任务成本由描述长度与该角色 / 模型的历史任务耗时估计。
+Tester 驱动的修复任务同样并发执行，修改同一文件的修复按顺序串行。
+Leader 流式输出计划时，EarlyStarter 让没有依赖的任务在其 JSON 对象闭合时就开始，计划完整后由调度器接管。
+"""
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from core.agent import http_pool, metrics
+from core.runtime_dir import resolve_path
+from core.scheduler import DagScheduler
+from pipeline import dashboard
+from pipeline.coder import execute_task, execute_designer_task
+from pipeline.leader import _load_role_cfg
+from shell.cmd.config import get_concurrency
+
+# 任务规模 = 描述字符数 + 固定开销（系统提示词、工具往返等与描述长度无关的部分）
+_BASE_CHARS = 400
+# 任务描述中形如文件路径的片段
+_PATH_RE = re.compile(r"[\w./\\-]*\w\.[A-Za-z][A-Za-z0-9]{0,7}\b")
+# 不带目录时，按扩展名判断是否为文件名（避免把 e.g. / v1.2 之类当成文件）
+_FILE_EXTS = {
+    "py", "js", "ts", "jsx", "tsx", "mjs", "cjs", "vue", "svelte", "html", "htm", "css",
+    "scss", "less", "json", "yaml", "yml", "toml", "ini", "cfg", "md", "txt", "sql",
+    "sh", "bat", "ps1", "go", "rs", "java", "kt", "c", "h", "cc", "cpp", "hpp", "cs",
+    "rb", "php", "swift", "dart", "lua", "xml", "svg", "env", "lock",
+}
+
+
+def dispatch_task(task: dict, context: str, mode: str, files: Optional[list] = None):
+    """根据任务角色分发给对应执行者；files 传入列表时追加任务写入的文件"""
+    role = task.get("role", "Coder").lower()
+    if role == "designer":
+        return execute_designer_task(task, context, mode, files)
+    else:
+        return execute_task(task, context, mode, files)
+
+
+def task_slot(task: dict) -> str:
+    """任务占用的并发槽位：Designer 单独计数，其余都由 Coder 执行"""
+    return "designer" if task.get("role", "Coder").lower() == "designer" else "coder"
+
+
+def _task_model() -> str:
+    """执行计划任务的模型名（Coder 与 Designer 都使用 Coder 的配置）"""
+    rc = _load_role_cfg("coder") or {}
+    return rc.get("model_name", "")
+
+
+def _task_size(task: dict) -> int:
+    return len(task.get("description") or task.get("title", "")) + _BASE_CHARS
+
+
+def estimate_cost(task: dict, model: str = "") -> float:
+    """
+    任务的估计耗时（秒）：任务规模 × 每字符耗时
+    每字符耗时依次取 同角色同模型 / 同角色 / 全部 的历史任务中位数，都没有时只比较规模
+    """
+    role = task_slot(task)
+    rate = (metrics.task_seconds_per_char(role, model)
+            or metrics.task_seconds_per_char(role)
+            or metrics.task_seconds_per_char()
+            or 1.0)
+    return _task_size(task) * rate
+
+
+def _size_http_pool(limits: Dict[str, int], extra: int = 0):
+    """连接池大小跟随各角色并发上限之和（extra 为同时进行的其他调用，如 Leader 的规划流）"""
+    http_pool.ensure_pool_size(sum(max(1, int(n)) for n in limits.values()) + extra)
+
+
+def _is_tester(task: dict) -> bool:
+    return task.get("role", "Coder").lower() == "tester"
+
+
+class _Aborts:
+    """
+    工作线程中任务的中止句柄：每个任务的模型调用登记在自己的 http_pool.AbortHandle 上，
+    abort 关闭这些任务进行中的连接，Coder 在当前轮次结束后返回
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handles: Dict[object, http_pool.AbortHandle] = {}
+        self._pending: Set[object] = set()   # 句柄登记前就被中止的任务
+        self._all = False
+
+    def run(self, key, fn, *args):
+        """在当前（工作）线程中执行 fn，期间的请求可被 abort 中止"""
+        handle = http_pool.AbortHandle()
+        with self._lock:
+            self._handles[key] = handle
+            if self._all or key in self._pending:
+                handle.abort()
+        http_pool.bind(handle)
+        try:
+            return fn(*args)
+        finally:
+            http_pool.bind(None)
+            with self._lock:
+                self._handles.pop(key, None)
+
+    def abort(self, keys: Optional[Iterable] = None):
+        """中止 keys 对应的任务，缺省中止全部"""
+        with self._lock:
+            if keys is None:
+                self._all = True
+                handles = list(self._handles.values())
+            else:
+                self._pending.update(keys)
+                handles = [self._handles[k] for k in keys if k in self._handles]
+        for handle in handles:
+            handle.abort()
+
+
+def _execute(task: dict, context: str, mode: str, model: str) -> Tuple[str, List[str]]:
+    """执行单个任务，返回 (输出文本, 写入的文件)；成功时记录耗时供成本估计"""
+    t0 = time.perf_counter()
+    files: List[str] = []
+    output = dispatch_task(task, context, mode, files)
+    if not str(output).startswith("[ERROR]"):
+        metrics.record_task(task_slot(task), model, time.perf_counter() - t0, _task_size(task))
+    return output, files
+
+
+class EarlyStarter:
+    """
+    Leader 计划流式输出期间提前启动任务
+    offer 作为 plan_tasks 的 on_task 回调：没有依赖的任务一闭合就开始（受 config concurrency 限制），
+    上下文为计划的 summary。计划完整后传给 run_tasks(early=...)，调度器把它们当作运行中的任务接管；
+    与最终计划不一致的（包括规划失败回退为单任务时）先中止并等其结束，再按最终计划执行
+    """
+
+    def __init__(self, mode: str):
+        self._mode = mode
+        self._limits = get_concurrency()
+        self._model = ""
+        self._running: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._aborts = _Aborts()
+        self.started: Dict[object, Tuple[dict, Future]] = {}
+
+    def _limit(self, slot: str) -> int:
+        return max(1, int(self._limits.get(slot, 1)))
+
+    def _release(self, slot: str):
+        with self._lock:
+            self._running[slot] -= 1
+
+    def offer(self, task: dict, header: dict):
+        """流式解析出一个任务：无依赖且对应角色还有空位时立即开始"""
+        if _is_tester(task) or task.get("depends_on") or task["id"] in self.started:
+            return
+        slot = task_slot(task)
+        with self._lock:
+            if self._running.get(slot, 0) >= self._limit(slot):
+                return
+            self._running[slot] = self._running.get(slot, 0) + 1
+        if self._pool is None:
+            self._model = _task_model()
+            _size_http_pool(self._limits, extra=1)
+            self._pool = ThreadPoolExecutor(
+                max_workers=sum(self._limit(s) for s in ("coder", "designer")),
+                thread_name_prefix="early")
+        dashboard.phase_start("leader",
+            f"计划生成中，提前分配任务 #{task['id']} 给 {task.get('role', 'Coder')}")
+        fut = self._pool.submit(self._aborts.run, task["id"], _execute,
+                                task, header.get("summary", ""), self._mode, self._model)
+        fut.add_done_callback(lambda f: self._release(slot))
+        self.started[task["id"]] = (task, fut)
+
+    def abort(self, tids: Optional[Iterable] = None, wait: bool = False):
+        """中止提前开始的任务（缺省全部）；wait 时等它们结束"""
+        tids = list(self.started if tids is None else tids)
+        for tid in tids:
+            entry = self.started.get(tid)
+            if entry is not None:
+                entry[1].cancel()
+        self._aborts.abort(tids)
+        if wait:
+            for tid in tids:
+                entry = self.started.get(tid)
+                if entry is None:
+                    continue
+                try:
+                    entry[1].result()
+                except BaseException:
+                    pass
+
+    def close(self):
+        """
+        中止仍在运行的任务并等待线程结束，运行结束后不会有提前任务留在后台写文件
+        正常流程中它们已由 run_tasks 接管并完成；规划失败或中断时在这里收尾
+        """
+        if self._pool is not None:
+            self._aborts.abort()
+            self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+def run_tasks(tasks: list, context: str, mode: str, label: str = "任务",
+              completed: Optional[dict] = None,
+              on_result: Optional[Callable[[dict, str, List[str]], None]] = None,
+              early: Optional[EarlyStarter] = None) -> dict:
+    """
+    按依赖关系并发执行计划任务（Tester 任务跳过，由系统自动调用 Tester）
+    每个任务开始时带上已完成任务的标记作为上下文
+    :param completed: 已完成任务的输出 {id: {"title", "output", "role", "files"}}（断点恢复），这些任务不再执行
+    :param on_result: 每个任务结束时调用 on_result(task, 输出文本, 写入的文件)，在调用线程中触发
+    :param early: 计划流式输出时已提前启动的任务，与最终计划一致的由调度器接管
+    :return: {任务 id: {"title", "output", "role", "files"}}，按计划顺序
+    """
+    completed = completed or {}
+    work = [t for t in tasks if not _is_tester(t)]
+    todo = [dict(t, depends_on=[d for d in (t.get("depends_on") or []) if d not in completed])
+            for t in work if t["id"] not in completed]
+    adopted: Dict[object, Future] = {}
+    if early is not None:
+        final = {t["id"]: t for t in todo}
+        stale = []
+        for tid, (t, fut) in early.started.items():
+            f = final.get(tid)
+            if f is not None and not f["depends_on"] and f.get("title") == t.get("title"):
+                adopted[tid] = fut
+            else:
+                stale.append(tid)
+        if stale:
+            # 不一致的任务可能与最终计划中同 id 的任务写同一批文件：先中止并等其结束
+            dashboard.phase_error("leader",
+                f"提前开始的任务 {', '.join(f'#{tid}' for tid in stale)} 与最终计划不一致，"
+                f"已中止，按最终计划执行")
+            early.abort(stale, wait=True)
+    lock = threading.Lock()
+    finished = [f"\n[#{t['id']} {t['title']} 已完成]" for t in work if t["id"] in completed]
+    started = [len(work) - len(todo) + len(adopted)]
+    model = _task_model()
+    aborts = _Aborts()
+
+    def run(t):
+        with lock:
+            ctx = context + "".join(finished)
+        return aborts.run(t["id"], _execute, t, ctx, mode, model)
+
+    def on_cancel():
+        dashboard.phase_error("leader", "收到中断，正在停止进行中的任务...")
+        aborts.abort()
+        if adopted:
+            early.abort(adopted)
+
+    def on_start(t):
+        started[0] += 1
+        dashboard.phase_start("leader",
+            f"分配{label} #{t['id']} 给 {t.get('role', 'Coder')} ({started[0]}/{len(work)})")
+
+    def on_done(t, result, error):
+        output, files = result if error is None else (None, [])
+        if error is not None:
+            dashboard.phase_error("leader", f"{label} #{t['id']} 执行异常: {type(error).__name__}: {error}")
+            output = f"[ERROR] {type(error).__name__}: {error}"
+        else:
+            with lock:
+                finished.append(f"\n[#{t['id']} {t['title']} 已完成]")
+        if on_result:
+            on_result(t, output, files)
+
+    if len(todo) < len(work):
+        dashboard.phase_done("leader", f"跳过 {len(work) - len(todo)} 个已完成的{label}")
+    limits = get_concurrency()
+    _size_http_pool(limits)
+    sched = DagScheduler(todo, run, limits=limits, slot=task_slot,
+                         cost=lambda t: estimate_cost(t, model))
+    for issue in sched.issues:
+        dashboard.phase_error("leader", issue)
+    results = sched.run(on_start=on_start, on_done=on_done, started=adopted,
+                        on_cancel=on_cancel)
+
+    all_outputs = {}
+    for t in work:
+        if t["id"] in completed:
+            all_outputs[t["id"]] = completed[t["id"]]
+            continue
+        result, error = results.get(t["id"], (None, None))
+        output, files = result if result is not None else (None, [])
+        if error is not None:
+            output = f"[ERROR] {type(error).__name__}: {error}"
+        all_outputs[t["id"]] = {
+            "title": t["title"],
+            "output": output,
+            "role": t.get("role", "Coder"),
+            "files": files
+        }
+    return all_outputs
+
+
+# ---- 修复任务 ----
+
+def _normalize_file(path: str) -> str:
+    return os.path.normcase(os.path.normpath(resolve_path(path.strip())))
+
+
+def task_files(task: dict, known: Iterable[str] = ()) -> Optional[Set[str]]:
+    """
+    任务会修改的文件（规范化的绝对路径）：优先取任务的 files 字段，
+    否则从标题与描述中找出测试报告提到的文件和形如路径的片段；无法判断时返回 None
+    """
+    files = task.get("files")
+    paths = [p for p in files if isinstance(p, str)] if isinstance(files, (list, tuple)) else []
+    if not paths:
+        text = f"{task.get('title', '')}\n{task.get('description', '')}"
+        paths = [p for p in known if p in text]
+        for m in _PATH_RE.findall(text):
+            if "://" in m:
+                continue
+            if "/" in m or "\\" in m or m.rsplit(".", 1)[-1].lower() in _FILE_EXTS:
+                paths.append(m)
+    out = {_normalize_file(p) for p in paths if p.strip()}
+    return out or None
+
+
+def serialize_conflicts(tasks: List[dict],
+                        files_of: Callable[[dict], Optional[Set[str]]]) -> List[dict]:
+    """
+    为修改相同文件的任务补充依赖，使它们按计划顺序串行；
+    文件未知的任务与其他所有任务串行。返回补充依赖后的任务副本
+    """
+    files = [files_of(t) for t in tasks]
+    out = []
+    for i, t in enumerate(tasks):
+        deps = list(t.get("depends_on") or [])
+        for j in range(i):
+            if files[i] is None or files[j] is None or files[i] & files[j]:
+                if tasks[j]["id"] not in deps:
+                    deps.append(tasks[j]["id"])
+        out.append(dict(t, depends_on=deps))
+    return out
+
+
+def run_fix_tasks(fix_tasks: list, report: dict, context: str, mode: str,
+                  completed: Optional[dict] = None,
+                  on_result: Optional[Callable[[dict, str, List[str]], None]] = None) -> dict:
+    """并发执行 Leader 拆出的修复任务，修改同一文件的修复串行；参数与返回值同 run_tasks"""
+    work = [t for t in fix_tasks if not _is_tester(t)]
+    known = [i["file"] for i in report.get("issues", [])
+             if isinstance(i, dict) and isinstance(i.get("file"), str) and i["file"].strip()]
+    work = serialize_conflicts(work, lambda t: task_files(t, known))
+    return run_tasks(work, context, mode, label="修复任务",
+                     completed=completed, on_result=on_result)
@@ -1,13 +1,28 @@
 """
 pipeline/tester.py — Tester 测试审查模块
+修复循环中每轮只审查有变化的任务：ReviewState 按任务记录输出与所写文件的哈希，
+未变化的任务只附一行已审查摘要，沿用上次的审查结论；
+有变化的任务发送其文件的当前完整内容（而不是截断的输出）。
+任务写入的文件由执行时的 write_file / edit_file 等工具调用记录（all_outputs 中的 files），
+修复任务改动了某个文件时，之前写过该文件的任务也会重新审查。
 """
+import hashlib
 import json
+import os
+from typing import Dict, List, Optional, Tuple
 from colorama import Fore, Style
 from core.agent import request
+from core.runtime_dir import resolve_path, get_runtime_dir
 from pipeline import dashboard
+from pipeline.coder import parse_file_blocks
 from pipeline.leader import _load_role_cfg
 import constants
 
+# 单个文件发送给 Tester 的最大字符数
+FILE_LIMIT = 12000
+# 没有文件块的任务输出（例如通过工具写文件）发送的最大字符数
+OUTPUT_LIMIT = 6000
+
 
 def _parse_test_report(text: str):
     """从 Tester 回复中提取 JSON 报告"""
@@ -27,20 +42,195 @@ def _parse_test_report(text: str):
     return {"status": "pass", "issues": [], "tests": []}
 
 
-def review_code(all_outputs: dict, mode="quality"):
-    """Tester 审查所有 Coder 输出"""
+def _sha(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def _file_hash(path: str) -> str:
+    try:
+        with open(resolve_path(path), "rb") as f:
+            return _sha(f.read())
+    except OSError:
+        return "missing"
+
+
+def _read_file(path: str) -> Optional[str]:
+    try:
+        with open(resolve_path(path), "r", encoding="utf-8", errors="replace") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _norm(path: str) -> str:
+    return os.path.normcase(os.path.normpath(resolve_path(path.strip())))
+
+
+def _same_file(a: str, b: str) -> bool:
+    return _norm(a) == _norm(b)
+
+
+def _display(path: str) -> str:
+    """发送给 Tester 的路径：项目目录内的用相对路径"""
+    try:
+        rel = os.path.relpath(path, get_runtime_dir())
+    except ValueError:
+        return path
+    return path if rel.startswith("..") else rel
+
+
+class ReviewState:
+    """
+    跨修复循环的审查状态
+    任务指纹 = 输出文本哈希 + 其写入文件的当前内容哈希；指纹不变的任务沿用缓存的审查结论
+    """
+
+    def __init__(self):
+        # 任务 id → (指纹, 该任务相关的问题列表)
+        self.verdicts: Dict[object, Tuple[str, List[dict]]] = {}
+
+    @staticmethod
+    def files_of(out: dict) -> List[str]:
+        """
+        任务写入的文件（去重，保持顺序）：执行时记录的 files，
+        没有记录时（旧的运行日志）回退到输出中的 ```file: 代码块
+        """
+        seen = []
+        files = out.get("files")
+        paths = files if files else [b["path"] for b in parse_file_blocks(out.get("output") or "")]
+        for p in paths:
+            if p not in seen:
+                seen.append(p)
+        return seen
+
+    def fingerprint(self, out: dict) -> str:
+        text = out.get("output") or ""
+        parts = [_sha(text.encode("utf-8"))]
+        parts += [f"{p}:{_file_hash(p)}" for p in self.files_of(out)]
+        return _sha("\n".join(parts).encode("utf-8"))
+
+    def split(self, all_outputs: dict):
+        """
+        分出 (有变化的任务 {id: 指纹}, 未变化的任务 id 列表)
+        与有变化的任务写过同一文件的任务也算有变化（例如修复任务改了它的文件）
+        """
+        changed, unchanged = {}, []
+        fps = {}
+        for tid, out in all_outputs.items():
+            fps[tid] = fp = self.fingerprint(out)
+            cached = self.verdicts.get(tid)
+            if cached is not None and cached[0] == fp:
+                unchanged.append(tid)
+            else:
+                changed[tid] = fp
+        touched = {_norm(p) for tid in changed for p in self.files_of(all_outputs[tid])}
+        if touched:
+            for tid in list(unchanged):
+                if any(_norm(p) in touched for p in self.files_of(all_outputs[tid])):
+                    unchanged.remove(tid)
+                    changed[tid] = fps[tid]
+        return changed, unchanged
+
+    def record(self, all_outputs: dict, changed: Dict[object, str], issues: List[dict]):
+        """
+        把本轮问题归属到有变化的任务：按 file 字段匹配写过该文件的任务；
+        匹配不到的归属本轮没有已知文件的任务，仍无归属的只出现在本轮报告中，不缓存
+        """
+        owned = {tid: [] for tid in changed}
+        fileless = [tid for tid in changed if not self.files_of(all_outputs[tid])]
+        for issue in issues:
+            f = issue.get("file") if isinstance(issue, dict) else None
+            owners = []
+            if isinstance(f, str) and f.strip():
+                owners = [tid for tid in changed
+                          if any(_same_file(f, p) for p in self.files_of(all_outputs[tid]))]
+            for tid in owners or fileless:
+                owned[tid].append(issue)
+        for tid, fp in changed.items():
+            self.verdicts[tid] = (fp, owned[tid])
+
+    def cached_issues(self, unchanged: List[object]) -> List[dict]:
+        """未变化任务上次审查留下的问题（去重）"""
+        out, seen = [], set()
+        for tid in unchanged:
+            for issue in self.verdicts[tid][1]:
+                key = json.dumps(issue, ensure_ascii=False, sort_keys=True)
+                if key not in seen:
+                    seen.add(key)
+                    out.append(issue)
+        return out
+
+
+def _build_review_prompt(all_outputs: dict, changed: Dict[object, str],
+                         unchanged: List[object], state: ReviewState) -> str:
+    """只包含有变化任务的代码（每个文件发送一次当前内容）与已审查任务的摘要"""
+    parts, sent = [], []
+    for tid in changed:
+        out = all_outputs[tid]
+        files = state.files_of(out)
+        head = f"任务#{tid} {out.get('title', '')}"
+        if not files:
+            parts.append(f"{head}:\n{(out.get('output') or '')[:OUTPUT_LIMIT]}")
+            continue
+        blocks = []
+        for p in files:
+            name = _display(p)
+            if any(_same_file(p, q) for q in sent):
+                blocks.append(f"文件 {name}：见上文")
+                continue
+            sent.append(p)
+            content = _read_file(p)
+            if content is None:
+                blocks.append(f"文件 {name}：已不存在")
+                continue
+            content = content.rstrip("\n")
+            if len(content) > FILE_LIMIT:
+                content = content[:FILE_LIMIT] + "\n...(truncated)"
+            blocks.append(f"```file:{name}\n{content}\n```")
+        parts.append(f"{head}:\n" + "\n".join(blocks))
+    prompt = "请审查以下代码：\n" + "\n\n".join(parts)
+    if unchanged:
+        summary = []
+        for tid in unchanged:
+            out = all_outputs[tid]
+            files = ", ".join(_display(p) for p in state.files_of(out)) or "无文件"
+            n = len(state.verdicts[tid][1])
+            verdict = f"遗留 {n} 个问题" if n else "已通过"
+            summary.append(f"- 任务#{tid} {out.get('title', '')}（{files}）：{verdict}，本轮未修改")
+        prompt += ("\n\n以下任务上一轮已审查且之后未修改，无需重复审查，仅供理解上下文：\n"
+                   + "\n".join(summary))
+    return prompt
+
+
+def _merge_report(report: dict, cached: List[dict]) -> dict:
+    """本轮报告 + 未变化任务的遗留问题"""
+    issues = list(report.get("issues", [])) + cached
+    errors = [i for i in issues if isinstance(i, dict) and i.get("severity") == "error"]
+    return dict(report, issues=issues, status="fail" if errors else "pass")
+
+
+def review_code(all_outputs: dict, mode="quality", state: Optional[ReviewState] = None):
+    """
+    Tester 审查 Coder 输出；传入同一个 state 时只审查自上次以来有变化的任务
+    全部未变化时不调用 Tester，直接返回缓存的结论
+    """
     rc = _load_role_cfg("tester")
     if not rc:
-        return {"status": "pass", "issues": []}
-    dashboard.phase_start("tester", "正在审查代码...")
-
-    # 构建审查内容
-    code_parts = []
-    for tid, out in all_outputs.items():
-        code_parts.append(f"任务#{tid}:\n{out.get('output','')[:2000]}")
-    code_str = "\n\n".join(code_parts)
+        return {"status": "pass", "issues": [], "skipped": True}
+    if state is None:
+        state = ReviewState()
+    changed, unchanged = state.split(all_outputs)
+    cached = state.cached_issues(unchanged)
+    if not changed:
+        dashboard.phase_done("tester", "代码自上次审查后未变化，沿用审查结论")
+        return _merge_report({"status": "pass", "issues": [], "tests": []}, cached)
+    if unchanged:
+        dashboard.phase_start("tester",
+            f"正在审查 {len(changed)} 个有变化的任务（{len(unchanged)} 个未变化，沿用结论）...")
+    else:
+        dashboard.phase_start("tester", "正在审查代码...")
 
-    prompt = f"请审查以下代码：\n{code_str}"
+    prompt = _build_review_prompt(all_outputs, changed, unchanged, state)
     lang_hint = f"\n使用 {rc['lang']} 输出。"
     full_sys = constants.BASE_SYSTEM + "\n" + constants.TESTER_SYSTEM + lang_hint
 
@@ -56,21 +246,28 @@ def review_code(all_outputs: dict, mode="quality"):
     try:
         for chunk in request.chat_complete(
             rc["base_url"], rc["api_key"], rc["model_name"],
-            full_sys, [], prompt, **kwargs
+            full_sys, [], prompt, role="tester", **kwargs
         ):
             parts.append(chunk)
+    except request.TruncatedError as e:
+        # 报告不完整，不能据此判定通过；不记录审查状态，下次重新审查这些任务
+        dashboard.phase_error("tester", f"审查输出不完整: {e}")
+        return {"status": "fail", "issues": [], "skipped": True}
     except RuntimeError as e:
         dashboard.phase_error("tester", f"审查 API 错误: {e}")
-        return {"status": "pass", "issues": []}
+        return {"status": "pass", "issues": [], "skipped": True}
     except KeyboardInterrupt:
+        # 交给流水线处理：记录中断，之后可从本轮审查处 resume
         dashboard.phase_error("tester", "审查被用户中断")
-        return {"status": "pass", "issues": []}
+        raise
     except Exception as e:
         dashboard.phase_error("tester", f"审查未知异常: {type(e).__name__}: {e}")
-        return {"status": "pass", "issues": []}
+        return {"status": "pass", "issues": [], "skipped": True}
 
     reply = "".join(parts)
     report = _parse_test_report(reply)
+    state.record(all_outputs, changed, report.get("issues", []))
+    report = _merge_report(report, cached)
     issues = report.get("issues", [])
     errors = [i for i in issues if i.get("severity") == "error"]
 
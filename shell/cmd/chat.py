@@ -1,15 +1,14 @@
-import json
 import sys
 try:
     import msvcrt
 except ImportError:
     msvcrt = None
 from colorama import Fore, Style, init
-from core.agent import request
+from core import config_store
+from core.agent import request, hedge, tool_stream
 import constants
 from shell.cmd import prefix
 from display import StreamRenderer
-from core.skill_manager import execute_skill
 from core.context_tracker import ContextTracker
 import utils.inited as inited
 
@@ -33,18 +32,47 @@ def _print_tool_result(action: str, result_str: str):
     print(f"  {icon} {DIM}[{action}]{R} {first_line}")
 
 
+def _extract_tool_calls(reply: str) -> list:
+    # 提取回复中的所有 tool_call 代码块；没有时回退到单个 ```json 或整段 JSON
+    if "```tool_call" in reply:
+        return tool_stream.extract_tool_calls(reply)
+    real_json_content = None
+    if "```json" in reply:
+        start = reply.find("```json") + 7
+        end = reply.find("```", start)
+        if end != -1:
+            real_json_content = reply[start:end].strip()
+    elif reply.strip().startswith("{") and reply.strip().endswith("}"):
+        real_json_content = reply.strip()
+    if not real_json_content:
+        return []
+    call = tool_stream.parse_tool_call(real_json_content)
+    return [call] if call else []
+
+
+def _run_tools(dispatcher, tool_calls) -> str:
+    # 并行执行一轮中的所有工具调用，逐个打印结果，返回合并后的结果文本
+    results = dispatcher.results(tool_calls)
+    for action, result, error in results:
+        if error is not None:
+            print(f"{prefix()}{Style.BRIGHT}{Fore.RED}[ERROR] Tool '{action}' failed: {type(error).__name__}: {error}{Style.RESET_ALL}")
+        else:
+            _print_tool_result(action, tool_stream.result_text(result, None))
+    return tool_stream.format_results(results)
+
+
 def _load_chatter_config():
     # 读取本地配置并校验必填字段，支持角色独立 base_url
     if not inited.is_inited():
         print(f"{prefix()}{Style.BRIGHT}{Fore.RED}[ERROR]{Style.RESET_ALL} Maren code uninitialized. Use \"code init boot\".")
         return None
     try:
-        with open(inited.maren_json_path(), "r", encoding="utf-8") as f:
-            config = json.load(f)
+        config = config_store.load(inited.maren_json_path())
     except FileNotFoundError:
         print(f"{prefix()}{Style.BRIGHT}{Fore.RED}[ERROR]{Style.RESET_ALL} maren.json not found: {inited.maren_json_path()}")
         return None
-    except json.JSONDecodeError as e:
+    except ValueError as e:
+        # config_store.load 的 JSON 格式错误（json.JSONDecodeError 是 ValueError 的子类）
         print(f"{prefix()}{Style.BRIGHT}{Fore.RED}[ERROR]{Style.RESET_ALL} maren.json format error: {e}")
         return None
     except Exception as e:
@@ -117,7 +145,7 @@ def _summarize_history(history, base_url: str, api_key: str, model_name: str, la
     try:
         for chunk in request.chat_complete(
             base_url, api_key, model_name, summary_prompt, [],
-            content_text, max_tokens=512
+            content_text, max_tokens=512, role="chatter"
         ):
             parts.append(chunk)
     except Exception as e:
@@ -152,8 +180,9 @@ def _compress_history(history, base_url: str, api_key: str, model_name: str, lan
         return recent
     return [{"role": "system", "content": f"对话摘要：{summary}"}] + recent
 
-def _stream_reply(message: str, base_url: str, api_key: str, model_name: str, lang: str, history, char_mode: bool, show_cat: bool = True):
+def _stream_reply(message: str, base_url: str, api_key: str, model_name: str, lang: str, history, char_mode: bool, show_cat: bool = True, dispatcher=None):
     # 逐块渲染：加粗、列表符号与代码高亮都在渲染器里完成
+    # 传入 dispatcher 时，tool_call 代码块一闭合就开始执行工具，不等流结束
     lang_prompt = f"对话默认使用 {lang}，除非用户明确指定其他语言。"
     system_prompt = f"{constants.BASE_SYSTEM}\n{constants.CHATTER_SYSTEM}\n{lang_prompt}"
     cat = f"{Style.BRIGHT}{Fore.LIGHTYELLOW_EX}ᓚᘏᗢ{Style.RESET_ALL}"
@@ -174,7 +203,11 @@ def _stream_reply(message: str, base_url: str, api_key: str, model_name: str, la
         actual_message = "请根据上述系统信息回答我的问题。"
     
     try:
-        for chunk in request.chat_complete(base_url, api_key, model_name, system_prompt, history, actual_message):
+        stream = hedge.chat_complete(base_url, api_key, model_name, system_prompt, history, actual_message,
+                                     role="chatter")
+        if dispatcher is not None:
+            stream = dispatcher.watch(stream)
+        for chunk in stream:
             parts.append(chunk)
             rendered = renderer.feed(chunk)
             if rendered:
@@ -206,13 +239,15 @@ def run(message: str):
     base_url, api_key, model_name, lang = config
     
     # 单句模式也需要支持工具调用循环
-    # 初始请求
-    reply = _stream_reply(message, base_url, api_key, model_name, lang, [], True)
-    
-    # 循环检测工具调用
     # 限制最大轮次以防死循环
     max_turns = 5
     current_turn = 0
+
+    # 初始请求
+    dispatcher = tool_stream.EarlyDispatcher()
+    reply = _stream_reply(message, base_url, api_key, model_name, lang, [], True, dispatcher=dispatcher)
+    
+    # 循环检测工具调用
     
     # 临时历史，用于多轮对话
     # 第一轮：User -> Assistant (Reply)
@@ -224,54 +259,24 @@ def run(message: str):
     while current_turn < max_turns:
         current_turn += 1
         
-        # 尝试从回复中提取工具调用 JSON
-        real_json_content = None
-        if "```tool_call" in reply:
-            start = reply.find("```tool_call") + 12
-            end = reply.find("```", start)
-            if end != -1:
-                real_json_content = reply[start:end].strip()
-        elif "```json" in reply:
-            start = reply.find("```json") + 7
-            end = reply.find("```", start)
-            if end != -1:
-                real_json_content = reply[start:end].strip()
-        elif reply.strip().startswith("{") and reply.strip().endswith("}"):
-            real_json_content = reply.strip()
-            
-        if not real_json_content:
+        # 提取回复中的所有工具调用，一轮内并行执行
+        tool_calls = _extract_tool_calls(reply)
+        if not tool_calls:
             break
-            
+
+        # 通用技能调度，不再硬编码 read_url
         try:
-            tool_call = json.loads(real_json_content)
-            action = tool_call.get("action")
-            if not action:
-                break
+            results_text = _run_tools(dispatcher, tool_calls)
+            sys_msg = f"{results_text}\n\n请根据以上结果回答用户刚才的问题。"
+            temp_history.append({"role": "system", "content": sys_msg})
 
-            # 通用技能调度，不再硬编码 read_url
-            try:
-                params = {k: v for k, v in tool_call.items() if k not in ("action", "msg")}
-                result = execute_skill(action, **params)
-                
-                result_str = str(result)
-                if len(result_str) > 8000:
-                    result_str = result_str[:8000] + "...(truncated)"
-                
-                _print_tool_result(action, result_str)
-                
-                sys_msg = f"工具 ({action}) 执行结果：\n\n{result_str}\n\n请根据以上结果回答用户刚才的问题。"
-                temp_history.append({"role": "system", "content": sys_msg})
-                
-                reply = _stream_reply("请继续", base_url, api_key, model_name, lang, temp_history, True, show_cat=False)
-                temp_history.append({"role": "assistant", "content": reply})
-                
-            except Exception as e:
-                print(f"{prefix()}{Style.BRIGHT}{Fore.RED}[ERROR] Tool '{action}' failed: {type(e).__name__}: {e}{Style.RESET_ALL}")
-                break
-        except json.JSONDecodeError:
-            break
+            # 最后一轮的回复不再执行工具，也就不提前执行
+            dispatcher = tool_stream.EarlyDispatcher(enabled=current_turn < max_turns)
+            reply = _stream_reply("请继续", base_url, api_key, model_name, lang, temp_history, True, show_cat=False,
+                                  dispatcher=dispatcher)
+            temp_history.append({"role": "assistant", "content": reply})
         except Exception as e:
-            print(f"{prefix()}{Fore.LIGHTBLACK_EX}[WARN] Tool parsing error: {type(e).__name__}: {e}{Style.RESET_ALL}")
+            print(f"{prefix()}{Fore.LIGHTBLACK_EX}[WARN] Tool execution error: {type(e).__name__}: {e}{Style.RESET_ALL}")
             break
 
 def enter():
@@ -306,7 +311,8 @@ def enter():
             
         history = _compress_history(history, base_url, api_key, model_name, lang)
         # 使用过滤后的 clean_text 发送请求
-        reply = _stream_reply(clean_text, base_url, api_key, model_name, lang, history, True)
+        dispatcher = tool_stream.EarlyDispatcher()
+        reply = _stream_reply(clean_text, base_url, api_key, model_name, lang, history, True, dispatcher=dispatcher)
         
         # AI 响应期间忽略用户误触
         _flush_input()
@@ -315,59 +321,28 @@ def enter():
             history.append({"role": "user", "content": clean_text})
             tracker.update(history + [{"role": "assistant", "content": reply}])
             
-            # 检测是否包含工具调用指令
-            real_json_content = None
-            if "```tool_call" in reply:
-                start = reply.find("```tool_call") + 12
-                end = reply.find("```", start)
-                if end != -1:
-                    real_json_content = reply[start:end].strip()
-            elif "```json" in reply:
-                start = reply.find("```json") + 7
-                end = reply.find("```", start)
-                if end != -1:
-                    real_json_content = reply[start:end].strip()
-            elif reply.strip().startswith("{") and reply.strip().endswith("}"):
-                real_json_content = reply.strip()
-            
+            # 检测是否包含工具调用指令，一轮内的所有调用并行执行
+            tool_calls = _extract_tool_calls(reply)
             tool_executed = False
-            if real_json_content:
+            if tool_calls:
                 try:
-                    tool_call = json.loads(real_json_content)
-                    action = tool_call.get("action")
-                    
-                    if action:
-                        try:
-                            params = {k: v for k, v in tool_call.items() if k not in ("action", "msg")}
-                            result = execute_skill(action, **params)
-                            
-                            result_str = str(result)
-                            if len(result_str) > 8000:
-                                result_str = result_str[:8000] + "...(truncated)"
-                            
-                            _print_tool_result(action, result_str)
-                                
-                            sys_msg = f"工具 ({action}) 执行结果：\n\n{result_str}\n\n请根据以上结果回答用户的问题。"
-                            
-                            # 记录原始回复（AI 的工具调用指令）
-                            history.append({"role": "assistant", "content": reply})
-                            
-                            temp_history = history.copy()
-                            temp_history.append({"role": "system", "content": sys_msg})
-                            
-                            final_reply = _stream_reply("请继续", base_url, api_key, model_name, lang, temp_history, True, show_cat=False)
-                            _flush_input()
-                            
-                            if final_reply:
-                                history.append({"role": "assistant", "content": final_reply})
-                                tool_executed = True
-                                
-                        except Exception as e:
-                            print(f"{prefix()}{Style.BRIGHT}{Fore.RED}[ERROR] Tool '{action}' failed: {type(e).__name__}: {e}{Style.RESET_ALL}")
-                except json.JSONDecodeError:
-                    pass
+                    results_text = _run_tools(dispatcher, tool_calls)
+                    sys_msg = f"{results_text}\n\n请根据以上结果回答用户的问题。"
+
+                    # 记录原始回复（AI 的工具调用指令）
+                    history.append({"role": "assistant", "content": reply})
+
+                    temp_history = history.copy()
+                    temp_history.append({"role": "system", "content": sys_msg})
+
+                    final_reply = _stream_reply("请继续", base_url, api_key, model_name, lang, temp_history, True, show_cat=False)
+                    _flush_input()
+
+                    if final_reply:
+                        history.append({"role": "assistant", "content": final_reply})
+                    tool_executed = True
                 except Exception as e:
-                    print(f"{prefix()}{Style.BRIGHT}{Fore.RED}[ERROR] Tool parsing failed: {type(e).__name__}: {e}{Style.RESET_ALL}")
+                    print(f"{prefix()}{Style.BRIGHT}{Fore.RED}[ERROR] Tool execution failed: {type(e).__name__}: {e}{Style.RESET_ALL}")
 
             if not tool_executed:
                 history.append({"role": "assistant", "content": reply})
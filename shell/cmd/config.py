@@ -3,86 +3,48 @@ shell/cmd/config.py — 配置管理命令
 code config show
 code config mode quality|saving
 code config loops <number>
+code config memory <tokens>
+code config concurrency <role> <number>
 code config model add <name> <base_url> <api_key>
 code config model set <role> <model_name>
 code config model list
 code config danger add <command>
 code config danger list
 code config danger remove <command>
+code config cache on|off <role>
+code config cache size <MB>
+code config cache clear
+code config hedge on|off <role>
+code config hedge pct <1-99>
+code config hedge alt <role> <model>
 """
 import json
 import os
 from colorama import Fore, Style
 from shell.cmd import prefix
+from core import config_store, settings
+# 读取接口在 core.settings 中，这里重新导出，供命令与流水线使用
+from core.settings import (  # noqa: F401
+    CONFIG_FILE, get_config, get_mode, get_max_loops, get_memory_tokens, get_concurrency,
+    get_dangerous_commands, get_cache_config, get_role_model_override,
+)
 import utils.inited as inited
 
-
-CONFIG_FILE = "config.json"
-
-
-def _config_path():
-    return os.path.join(inited.maren_dir_path(), CONFIG_FILE)
+_config_path = settings.config_path
+_snapshot = settings.snapshot
+_default_config = settings.default_config
 
 
 def _load_config():
-    path = _config_path()
-    if os.path.exists(path):
-        try:
-            with open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        except Exception:
-            pass
-    return _default_config()
-
-
-def _default_config():
-    return {
-        "mode": "quality",
-        "max_loops": 5,
-        "extra_models": {},
-        "role_model_override": {},
-        "dangerous_commands": [
-            "rm -rf /", "rm -rf ~", "del /f /s /q",
-            "format", "DROP TABLE", "DROP DATABASE",
-            "shutdown", "reboot", "mkfs",
-            "dd if=", "> /dev/sda", ":(){ :|:& };:",
-            "chmod -R 777 /", "chown -R", "kill -9 1",
-            "wget|sh", "curl|bash"
-        ]
-    }
+    """可修改的配置副本，供命令修改后 _save_config 写回"""
+    return config_store.thaw(_snapshot())
 
 
 def _save_config(cfg):
     os.makedirs(inited.maren_dir_path(), exist_ok=True)
     with open(_config_path(), "w", encoding="utf-8") as f:
         json.dump(cfg, f, ensure_ascii=False, indent=4)
-
-
-def get_config():
-    """公共接口：供其他模块读取配置"""
-    return _load_config()
-
-
-def get_mode():
-    """获取当前模式: quality 或 saving"""
-    return _load_config().get("mode", "quality")
-
-
-def get_max_loops():
-    """获取最大循环次数"""
-    cfg = _load_config()
-    mode = cfg.get("mode", "quality")
-    return cfg.get("max_loops", 5 if mode == "quality" else 3)
-
-
-def get_dangerous_commands():
-    """获取危险命令列表"""
-    return _load_config().get("dangerous_commands", [])
-
-
-def get_role_model_override(role: str):
-    """获取角色模型覆盖，返回 model_name 或 None"""
-    return _load_config().get("role_model_override", {}).get(role.lower())
+    config_store.invalidate(_config_path())
 
 
 def _show(cfg):
@@ -94,6 +56,11 @@ def _show(cfg):
     print(f"\n{prefix()}{Style.BRIGHT}━━━ 当前配置 ━━━{Style.RESET_ALL}\n")
     print(f"  {Fore.LIGHTBLACK_EX}模式:{Style.RESET_ALL}     {mode_color}{Style.BRIGHT}{mode_label}{Style.RESET_ALL}")
     print(f"  {Fore.LIGHTBLACK_EX}最大循环:{Style.RESET_ALL} {Fore.GREEN}{loops}{Style.RESET_ALL}")
+    print(f"  {Fore.LIGHTBLACK_EX}记忆上限:{Style.RESET_ALL} {Fore.GREEN}{cfg.get('memory_tokens', 1000)}{Style.RESET_ALL} tokens")
+    conc = cfg.get("concurrency") or _default_config()["concurrency"]
+    print(f"  {Fore.LIGHTBLACK_EX}任务并发:{Style.RESET_ALL} "
+          + ", ".join(f"{Fore.LIGHTYELLOW_EX}{r}{Style.RESET_ALL} {Fore.GREEN}{n}{Style.RESET_ALL}"
+                      for r, n in conc.items()))
 
     overrides = cfg.get("role_model_override", {})
     if overrides:
@@ -114,6 +81,19 @@ def _show(cfg):
                 masked = info[:4] + "****" + info[-4:] if len(str(info)) > 8 else "****"
                 print(f"    {Fore.CYAN}{name}{Style.RESET_ALL}: {masked}")
 
+    cache = cfg.get("cache") or _default_config()["cache"]
+    on_roles = [r for r, on in (cache.get("roles") or {}).items() if on]
+    print(f"\n  {Fore.LIGHTBLACK_EX}响应缓存:{Style.RESET_ALL} "
+          f"{Fore.CYAN}{', '.join(on_roles) or '关闭'}{Style.RESET_ALL}"
+          f" {Fore.LIGHTBLACK_EX}(上限 {cache.get('max_mb', 64)} MB){Style.RESET_ALL}")
+
+    hedge = cfg.get("hedge") or {}
+    hedge_roles = [r for r, on in (hedge.get("roles") or {}).items() if on]
+    if hedge_roles:
+        print(f"  {Fore.LIGHTBLACK_EX}对冲请求:{Style.RESET_ALL} "
+              f"{Fore.CYAN}{', '.join(hedge_roles)}{Style.RESET_ALL}"
+              f" {Fore.LIGHTBLACK_EX}(TTFT p{hedge.get('percentile', 90)}){Style.RESET_ALL}")
+
     dangers = cfg.get("dangerous_commands", [])
     if dangers:
         print(f"\n  {Fore.LIGHTBLACK_EX}危险命令 ({len(dangers)}):{Style.RESET_ALL}")
@@ -171,7 +151,7 @@ def _list_all_configs():
 def run(args):
     """config 命令入口"""
     if not args:
-        _show(_load_config())
+        _show(_snapshot())
         return
 
     sub = args[0].lower()
@@ -210,6 +190,40 @@ def run(args):
         _save_config(cfg)
         print(f"{prefix()}最大循环次数已设为 {Fore.GREEN}{n}{Style.RESET_ALL}")
 
+    elif sub == "memory":
+        if len(args) < 2:
+            print(f"{prefix()}用法: config memory <tokens>")
+            return
+        try:
+            n = int(args[1])
+            if n < 0:
+                raise ValueError
+        except ValueError:
+            print(f"{prefix()}{Fore.RED}记忆上限必须是非负整数 (tokens){Style.RESET_ALL}")
+            return
+        cfg["memory_tokens"] = n
+        _save_config(cfg)
+        print(f"{prefix()}记忆注入上限已设为 {Fore.GREEN}{n}{Style.RESET_ALL} tokens")
+
+    elif sub == "concurrency":
+        if len(args) < 3:
+            print(f"{prefix()}用法: config concurrency coder|designer <1-32>")
+            return
+        role = args[1].lower()
+        if role not in ("coder", "designer"):
+            print(f"{prefix()}{Fore.RED}角色必须是 coder 或 designer{Style.RESET_ALL}")
+            return
+        try:
+            n = int(args[2])
+            if n < 1 or n > 32:
+                raise ValueError
+        except ValueError:
+            print(f"{prefix()}{Fore.RED}并发数必须是 1-32 的整数{Style.RESET_ALL}")
+            return
+        cfg.setdefault("concurrency", dict(_default_config()["concurrency"]))[role] = n
+        _save_config(cfg)
+        print(f"{prefix()}{Fore.LIGHTYELLOW_EX}{role}{Style.RESET_ALL} 最多同时执行 {Fore.GREEN}{n}{Style.RESET_ALL} 个任务")
+
     elif sub == "model":
         _handle_model(args[1:], cfg)
 
@@ -222,6 +236,12 @@ def run(args):
     elif sub == "url":
         _handle_url(args[1:], cfg)
 
+    elif sub == "cache":
+        _handle_cache(args[1:], cfg)
+
+    elif sub == "hedge":
+        _handle_hedge(args[1:], cfg)
+
     else:
         print(f"{prefix()}{Fore.RED}未知子命令: {sub}{Style.RESET_ALL}")
         _print_usage()
@@ -247,7 +267,7 @@ def _handle_model(args, cfg):
     elif action == "set" and len(args) >= 3:
         role = args[1].lower()
         model_name = args[2]
-        valid_roles = ["coder", "leader", "tester", "chatter", "icon_designer"]
+        valid_roles = settings.ROLES
         if role not in valid_roles:
             print(f"{prefix()}{Fore.RED}角色必须是: {', '.join(valid_roles)}{Style.RESET_ALL}")
             return
@@ -324,9 +344,13 @@ def _print_usage():
     print(f"  {Fore.GREEN}config list{Style.RESET_ALL}                    列出 .maren/ 下所有配置文件")
     print(f"  {Fore.GREEN}config mode quality|saving{Style.RESET_ALL}     设置模式")
     print(f"  {Fore.GREEN}config loops <1-10>{Style.RESET_ALL}            设置循环次数")
+    print(f"  {Fore.GREEN}config memory <tokens>{Style.RESET_ALL}         记忆注入上限")
+    print(f"  {Fore.GREEN}config concurrency <角色> <n>{Style.RESET_ALL}  角色任务并发数")
     print(f"  {Fore.GREEN}config model add|set|list|remove{Style.RESET_ALL}")
     print(f"  {Fore.GREEN}config danger add|list|remove{Style.RESET_ALL}")
     print(f"  {Fore.GREEN}config url set|list|remove{Style.RESET_ALL}     角色独立 base_url")
+    print(f"  {Fore.GREEN}config cache on|off|size|clear{Style.RESET_ALL} 响应缓存")
+    print(f"  {Fore.GREEN}config hedge on|off|pct|alt{Style.RESET_ALL}    对冲请求")
 
 
 def _print_model_usage():
@@ -350,7 +374,7 @@ def _handle_url(args, cfg):
         _print_url_usage()
         return
     action = args[0].lower()
-    valid_roles = ["coder", "leader", "tester", "chatter", "icon_designer"]
+    valid_roles = settings.ROLES
 
     if action == "set" and len(args) >= 3:
         role = args[1].lower()
@@ -391,3 +415,117 @@ def _print_url_usage():
     print(f"  {Fore.GREEN}config url set <角色> <base_url>{Style.RESET_ALL}  设置角色独立 URL")
     print(f"  {Fore.GREEN}config url list{Style.RESET_ALL}                   查看所有角色 URL")
     print(f"  {Fore.GREEN}config url remove <角色>{Style.RESET_ALL}          移除角色独立 URL")
+
+
+def _handle_cache(args, cfg):
+    """处理响应缓存配置"""
+    from core.agent import response_cache
+    valid_roles = settings.ROLES
+    cache = cfg.get("cache")
+    if not isinstance(cache, dict):
+        cache = cfg["cache"] = _default_config()["cache"]
+
+    if not args:
+        st = response_cache.get_cache().stats()
+        on_roles = [r for r, on in (cache.get("roles") or {}).items() if on]
+        print(f"{prefix()}{Style.BRIGHT}响应缓存:{Style.RESET_ALL}")
+        print(f"  {Fore.LIGHTBLACK_EX}启用角色:{Style.RESET_ALL} {Fore.CYAN}{', '.join(on_roles) or '无'}{Style.RESET_ALL}")
+        print(f"  {Fore.LIGHTBLACK_EX}容量:{Style.RESET_ALL} {st['entries']} 条 / "
+              f"{st['bytes'] / 1024 / 1024:.1f} MB (上限 {cache.get('max_mb', 64)} MB)")
+        return
+    action = args[0].lower()
+
+    if action in ("on", "off") and len(args) >= 2:
+        role = settings.config_role(args[1])
+        if role not in valid_roles:
+            print(f"{prefix()}{Fore.RED}角色必须是: {', '.join(valid_roles)}{Style.RESET_ALL}")
+            return
+        cache.setdefault("roles", {})[role] = action == "on"
+        _save_config(cfg)
+        state = f"{Fore.GREEN}开启" if action == "on" else f"{Fore.YELLOW}关闭"
+        print(f"{prefix()}{Fore.LIGHTYELLOW_EX}{role}{Style.RESET_ALL} 响应缓存已{state}{Style.RESET_ALL}")
+
+    elif action == "size" and len(args) >= 2:
+        try:
+            mb = int(args[1])
+            if mb < 1:
+                raise ValueError
+        except ValueError:
+            print(f"{prefix()}{Fore.RED}缓存上限必须是正整数 (MB){Style.RESET_ALL}")
+            return
+        cache["max_mb"] = mb
+        _save_config(cfg)
+        print(f"{prefix()}响应缓存上限已设为 {Fore.GREEN}{mb} MB{Style.RESET_ALL}")
+
+    elif action == "clear":
+        n = response_cache.get_cache().clear()
+        print(f"{prefix()}已清空响应缓存 ({n} 条)")
+    else:
+        _print_cache_usage()
+
+
+def _print_cache_usage():
+    print(f"{prefix()}用法:")
+    print(f"  {Fore.GREEN}config cache{Style.RESET_ALL}                      查看缓存状态")
+    print(f"  {Fore.GREEN}config cache on|off <角色>{Style.RESET_ALL}        按角色开关响应缓存（designer 与 coder 共用）")
+    print(f"  {Fore.GREEN}config cache size <MB>{Style.RESET_ALL}            设置缓存上限")
+    print(f"  {Fore.GREEN}config cache clear{Style.RESET_ALL}                清空缓存")
+
+
+def _handle_hedge(args, cfg):
+    """处理对冲请求配置"""
+    valid_roles = settings.ROLES
+    hedge = cfg.get("hedge")
+    if not isinstance(hedge, dict):
+        hedge = cfg["hedge"] = _default_config()["hedge"]
+    if not args:
+        _print_hedge_usage()
+        return
+    action = args[0].lower()
+
+    if action in ("on", "off") and len(args) >= 2:
+        role = settings.config_role(args[1])
+        if role not in valid_roles:
+            print(f"{prefix()}{Fore.RED}角色必须是: {', '.join(valid_roles)}{Style.RESET_ALL}")
+            return
+        hedge.setdefault("roles", {})[role] = action == "on"
+        _save_config(cfg)
+        state = f"{Fore.GREEN}开启" if action == "on" else f"{Fore.YELLOW}关闭"
+        print(f"{prefix()}{Fore.LIGHTYELLOW_EX}{role}{Style.RESET_ALL} 对冲请求已{state}{Style.RESET_ALL}")
+
+    elif action == "pct" and len(args) >= 2:
+        try:
+            pct = int(args[1])
+            if pct < 1 or pct > 99:
+                raise ValueError
+        except ValueError:
+            print(f"{prefix()}{Fore.RED}百分位必须是 1-99 的整数{Style.RESET_ALL}")
+            return
+        hedge["percentile"] = pct
+        _save_config(cfg)
+        print(f"{prefix()}对冲阈值已设为历史 TTFT {Fore.GREEN}p{pct}{Style.RESET_ALL}")
+
+    elif action == "alt" and len(args) >= 3:
+        role = settings.config_role(args[1])
+        name = args[2]
+        if role not in valid_roles:
+            print(f"{prefix()}{Fore.RED}角色必须是: {', '.join(valid_roles)}{Style.RESET_ALL}")
+            return
+        if name not in cfg.get("extra_models", {}):
+            print(f"{prefix()}{Fore.RED}{name} 不在额外模型中，请先 config model add{Style.RESET_ALL}")
+            return
+        alts = hedge.setdefault("alternates", {}).setdefault(role, [])
+        if name not in alts:
+            alts.append(name)
+        _save_config(cfg)
+        print(f"{prefix()}{Fore.LIGHTYELLOW_EX}{role}{Style.RESET_ALL} 的对冲备用模型: "
+              f"{Fore.CYAN}{', '.join(alts)}{Style.RESET_ALL}")
+    else:
+        _print_hedge_usage()
+
+
+def _print_hedge_usage():
+    print(f"{prefix()}用法:")
+    print(f"  {Fore.GREEN}config hedge on|off <角色>{Style.RESET_ALL}        按角色开关对冲请求（designer 与 coder 共用）")
+    print(f"  {Fore.GREEN}config hedge pct <1-99>{Style.RESET_ALL}           阈值取历史首 token 延迟的百分位")
+    print(f"  {Fore.GREEN}config hedge alt <角色> <模型>{Style.RESET_ALL}    添加备用模型（来自 extra_models）")
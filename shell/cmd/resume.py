@@ -0,0 +1,55 @@
+"""
+shell/cmd/resume.py — resume 命令
+resume            列出最近的运行记录
+resume <run_id>   从运行日志恢复：跳过已完成的任务，从第一个未完成的阶段继续
+"""
+from datetime import datetime
+from colorama import Fore, Style, init
+from shell.cmd import prefix
+from pipeline import journal
+from pipeline.flow import run_flow
+
+_STATUS_COLORS = {
+    "done": Fore.GREEN,
+    "interrupted": Fore.YELLOW,
+    "failed": Fore.RED,
+    "running": Fore.CYAN,
+}
+
+
+def _list():
+    runs = journal.list_runs()
+    if not runs:
+        print(f"{prefix()}暂无运行记录")
+        return
+    print(f"\n{prefix()}{Style.BRIGHT}最近的运行:{Style.RESET_ALL}")
+    for s in runs:
+        started = datetime.fromtimestamp(s.started).strftime("%Y-%m-%d %H:%M") if s.started else "?"
+        done = len(s.outputs)
+        total = len((s.plan or {}).get("tasks", []))
+        c = _STATUS_COLORS.get(s.status, Fore.WHITE)
+        msg = s.message if len(s.message) <= 30 else s.message[:30] + "…"
+        print(f"  {Fore.YELLOW}{s.run_id}{Style.RESET_ALL} {c}{s.status:<11}{Style.RESET_ALL}"
+              f" {Fore.LIGHTBLACK_EX}{s.command} {started} 任务 {done}/{total}{Style.RESET_ALL} {msg}")
+    print()
+
+
+def run(args):
+    """执行 resume 命令"""
+    init(autoreset=True)
+    if not args:
+        _list()
+        return
+
+    run_id = args[0]
+    state = journal.load(run_id)
+    if state is None:
+        print(f"{prefix()}{Fore.RED}运行记录 {run_id} 不存在{Style.RESET_ALL}")
+        return
+    if state.status == "done":
+        print(f"{prefix()}运行 {Fore.YELLOW}{run_id}{Style.RESET_ALL} 已完成，无需恢复")
+        return
+
+    print(f"{prefix()}从运行 {Fore.YELLOW}{run_id}{Style.RESET_ALL} 恢复"
+          f"（已完成 {len(state.outputs)} 个任务）")
+    run_flow(state.message, state.command, summarize=state.command == "new", state=state)
@@ -1,10 +1,9 @@
 """
 shell/cmd/run.py — code run enter 命令
-交互式项目对话模式：Chatter 交流需求 → Leader 拆分任务 → Coder 逐个执行
+交互式项目对话模式：Chatter 交流需求 → Leader 拆分任务 → Coder 按依赖并发执行
 """
 import os
 import sys
-import json
 import uuid
 from datetime import datetime
 try:
@@ -13,14 +12,10 @@ except ImportError:
     msvcrt = None
 from colorama import Fore, Style, init
 from shell.cmd import prefix
-from shell.cmd.config import get_mode, get_max_loops
 from core.context_tracker import ContextTracker
+from core import config_store
 from core.runtime_dir import get_runtime_dir
-from pipeline.chatter import gather_requirements
-from pipeline.leader import plan_tasks, plan_bugfixes
-from pipeline.coder import execute_task, execute_designer_task
-from pipeline.tester import review_code
-from pipeline import dashboard
+from pipeline.flow import run_flow
 import utils.inited as inited
 
 
@@ -61,11 +56,10 @@ def _readline_prompt(prompt_str: str) -> str:
 def _load_project_name() -> str:
     """从 .maren/project.json 读取项目名称，回退为当前目录名"""
     try:
-        with open(inited.project_json_path(), "r", encoding="utf-8") as f:
-            proj = json.load(f)
-            name = proj.get("name", "").strip()
-            if name:
-                return name
+        proj = config_store.load(inited.project_json_path())
+        name = proj.get("name", "").strip()
+        if name:
+            return name
     except Exception:
         pass
     return os.path.basename(get_runtime_dir()) or "未命名项目"
@@ -141,155 +135,17 @@ def _handle_slash_command(text, session):
     return False
 
 
-def _dispatch_task(task: dict, context: str, mode: str):
-    """根据任务角色分发给对应执行者"""
-    role = task.get("role", "Coder").lower()
-    if role == "designer":
-        return execute_designer_task(task, context, mode)
-    else:
-        return execute_task(task, context, mode)
-
-
 def _run_pipeline(user_input: str):
     """
     完整多角色协作流程：
     1. Chatter 交流需求细节
     2. Leader 拆分子任务
-    3. Coder/Designer 逐个执行
+    3. Coder/Designer 按依赖关系并发执行
     4. Leader 整合 → Tester 测试
     5. Leader 审查报告 → 不过关则拆修复任务 → Coder 修复
     6. 循环直至 Tester 无 bug（质量模式最多5次，节约模式最多3次）
     """
-    mode = get_mode()
-    max_loops = get_max_loops()
-
-    dashboard.banner("Maren Code 全自动编程引擎")
-    print(f"  {dashboard.CAT} 模式: {Fore.CYAN}{mode}{Style.RESET_ALL}"
-          f" | 最大循环: {Fore.CYAN}{max_loops}{Style.RESET_ALL}")
-    print()
-
-    # ══════════════════════════════════════════════
-    # Phase 1: Chatter 收集需求
-    # ══════════════════════════════════════════════
-    try:
-        requirements = gather_requirements(user_input)
-    except KeyboardInterrupt:
-        print(f"\n{prefix()}{Fore.YELLOW}已中断{Style.RESET_ALL}")
-        return
-    if not requirements:
-        print(f"{prefix()}{Fore.RED}需求收集失败{Style.RESET_ALL}")
-        return
-
-    # ══════════════════════════════════════════════
-    # Phase 2: Leader 拆分任务
-    # ══════════════════════════════════════════════
-    try:
-        plan = plan_tasks(requirements, mode)
-    except KeyboardInterrupt:
-        print(f"\n{prefix()}{Fore.YELLOW}已中断{Style.RESET_ALL}")
-        return
-    except Exception as e:
-        print(f"{prefix()}{Fore.RED}Leader 规划失败: {e}{Style.RESET_ALL}")
-        return
-
-    tasks = plan.get("tasks", [])
-    if not tasks:
-        print(f"{prefix()}{Fore.RED}Leader 未生成任何任务{Style.RESET_ALL}")
-        return
-
-    # 展示任务面板
-    dashboard.task_list([
-        {"id": t["id"], "title": t["title"],
-         "role": t.get("role", "Coder"), "status": "pending"}
-        for t in tasks
-    ])
-
-    # ══════════════════════════════════════════════
-    # Phase 3: Coder/Designer 逐个执行子任务
-    # ══════════════════════════════════════════════
-    context = plan.get("summary", "")
-    all_outputs = {}
-
-    for idx, t in enumerate(tasks):
-        role = t.get("role", "Coder")
-        if role.lower() == "tester":
-            continue
-
-        dashboard.phase_start("leader",
-            f"分配任务 #{t['id']} 给 {role} ({idx+1}/{len(tasks)})")
-
-        try:
-            output = _dispatch_task(t, context, mode)
-            all_outputs[t["id"]] = {
-                "title": t["title"],
-                "output": output,
-                "role": role
-            }
-            context += f"\n[#{t['id']} {t['title']} 已完成]"
-        except KeyboardInterrupt:
-            print(f"\n{prefix()}{Fore.YELLOW}已中断{Style.RESET_ALL}")
-            return
-
-    if not all_outputs:
-        print(f"{prefix()}{Fore.RED}没有任务产出{Style.RESET_ALL}")
-        return
-
-    # ══════════════════════════════════════════════
-    # Phase 4: Tester 测试 → Leader 审查 → Coder 修复 → 循环
-    # ══════════════════════════════════════════════
-    for loop_i in range(1, max_loops + 1):
-        dashboard.loop_info(loop_i, max_loops, mode)
-
-        # Tester 审查代码
-        report = review_code(all_outputs, mode)
-
-        errors = [i for i in report.get("issues", [])
-                  if i.get("severity") == "error"]
-        if not errors:
-            dashboard.phase_done("tester", "所有测试通过 ✓")
-            break
-
-        dashboard.phase_done("tester",
-            f"发现 {len(errors)} 个错误，报告已提交给 Leader")
-
-        # Leader 分析测试报告，拆分修复任务
-        dashboard.phase_start("leader", "正在分析测试报告并拆分修复任务...")
-        fix_plan = plan_bugfixes(report, mode)
-        fix_tasks = fix_plan.get("tasks", [])
-
-        if not fix_tasks:
-            dashboard.phase_done("leader", "无法生成修复任务，结束循环")
-            break
-
-        dashboard.task_list([
-            {"id": ft["id"], "title": ft["title"],
-             "role": ft.get("role", "Coder"), "status": "pending"}
-            for ft in fix_tasks
-        ])
-
-        # Coder 逐个修复
-        for ft in fix_tasks:
-            role = ft.get("role", "Coder")
-            dashboard.phase_start("leader",
-                f"分配修复任务 #{ft['id']} 给 {role}")
-            try:
-                fix_out = _dispatch_task(ft, context, mode)
-                all_outputs[ft["id"]] = {
-                    "title": ft["title"],
-                    "output": fix_out,
-                    "role": role
-                }
-            except KeyboardInterrupt:
-                print(f"\n{prefix()}{Fore.YELLOW}已中断{Style.RESET_ALL}")
-                return
-
-        # 循环回到 Tester 再次测试
-
-    # ══════════════════════════════════════════════
-    # Phase 5: 完成
-    # ══════════════════════════════════════════════
-    dashboard.banner("项目完成", Fore.LIGHTGREEN_EX)
-    print(f"  {prefix()}{Fore.GREEN}全部完成。{Style.RESET_ALL}\n")
+    run_flow(user_input, "run", summarize=False)
 
 
 def enter():
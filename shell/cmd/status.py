@@ -2,13 +2,14 @@
 shell/cmd/status.py — code status 命令
 显示所有角色、模型、API密钥（脱敏）、配置等系统状态信息
 """
-import json
 import os
 from datetime import datetime
 from colorama import Fore, Style
 from shell.cmd import prefix
 import utils.inited as inited
 import constants
+from core import config_store
+from core.agent import metrics, router
 
 
 # ── 主题色常量 ──
@@ -32,50 +33,22 @@ def _mask_key(key: str) -> str:
 
 def _load_maren_config():
     """加载 maren.json 配置"""
-    path = inited.maren_json_path()
-    if not os.path.exists(path):
-        return None
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return None
+    return config_store.get(inited.maren_json_path())
 
 
 def _load_project_info():
     """加载 project.json 项目信息"""
-    path = os.path.join(inited.maren_dir_path(), "project.json")
-    if not os.path.exists(path):
-        return None
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return None
+    return config_store.get(os.path.join(inited.maren_dir_path(), "project.json"))
 
 
 def _load_user_config():
     """加载 config.json 用户配置"""
-    path = os.path.join(inited.maren_dir_path(), "config.json")
-    if not os.path.exists(path):
-        return {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return config_store.get(os.path.join(inited.maren_dir_path(), "config.json"), {})
 
 
 def _load_role_skills():
     """加载角色技能映射"""
-    path = inited.role_skills_json_path()
-    if not os.path.exists(path):
-        return {}
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    except Exception:
-        return {}
+    return config_store.get(inited.role_skills_json_path(), {})
 
 
 # ── 角色图标与颜色 ──
@@ -108,6 +81,52 @@ def _print_row(label: str, value: str, indent=2):
     print(f"  {DIM}│{R}{pad}{DIM}{label}:{R} {value}")
 
 
+def _fmt_seconds(v) -> str:
+    return f"{v:.2f}s" if v is not None else "N/A"
+
+
+def _print_metrics():
+    """打印本进程内的 LLM 调用统计（按角色/模型）"""
+    stats = metrics.summary()
+    if not stats:
+        return
+    _print_section("Session Metrics")
+    for key, st in sorted(stats.items()):
+        tps = st["tokens_per_sec"]
+        tps_str = f"{tps:.1f} tok/s" if tps else "N/A"
+        err_c = RED if st["errors"] else DIM
+        print(f"  {DIM}│{R}")
+        print(f"  {DIM}│{R}  {B}{CYAN}{key}{R}"
+              f"  {DIM}calls:{R} {GREEN}{st['calls']}{R}"
+              f"  {DIM}errors:{R} {err_c}{st['errors']}{R}"
+              f"  {DIM}retries:{R} {YELLOW}{st['retries']}{R}")
+        print(f"  {DIM}│{R}    {DIM}TTFT p50/p90:{R} {GREEN}{_fmt_seconds(st['ttft_p50'])}{R}"
+              f" / {GREEN}{_fmt_seconds(st['ttft_p90'])}{R}"
+              f"   {DIM}Avg:{R} {GREEN}{_fmt_seconds(st['latency_avg'])}{R}"
+              f"   {DIM}Speed:{R} {GREEN}{tps_str}{R}")
+        reasons = ", ".join(st["finish_reasons"]) or "N/A"
+        print(f"  {DIM}│{R}    {DIM}Tokens:{R} {YELLOW}{st['prompt_tokens']}{R} in"
+              f" / {YELLOW}{st['completion_tokens']}{R} out"
+              f"   {DIM}Finish:{R} {reasons}")
+    _print_backends()
+
+
+def _print_backends():
+    """打印各角色后端池的在途请求、延迟与摘除状态"""
+    pools = router.snapshot()
+    if not pools:
+        return
+    print(f"  {DIM}│{R}")
+    print(f"  {DIM}│{R}  {B}Backends{R}")
+    for role, backends in sorted(pools.items()):
+        for b in backends:
+            state = (f"{RED}ejected {b['ejected_for']:.0f}s{R}" if b["ejected_for"]
+                     else f"{GREEN}healthy{R}")
+            print(f"  {DIM}│{R}    {YELLOW}{role:<8}{R} {b['backend']}"
+                  f"  {DIM}in-flight:{R} {b['outstanding']}"
+                  f"  {DIM}TTFT:{R} {_fmt_seconds(b['ttft_ewma'])}  {state}")
+
+
 def _print_footer():
     w = 58
     print(f"\n  {ACCENT}{'═' * w}{R}")
@@ -221,4 +240,5 @@ def run():
         icon = f"{GREEN}✓{R}" if exists else f"{DIM}✗{R}"
         print(f"  {DIM}│{R}  {icon} {fname}")
 
+    _print_metrics()
     _print_footer()
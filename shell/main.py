@@ -1,18 +1,30 @@
+import importlib
 import sys
 from colorama import init, Fore, Style
-from shell.cmd import version as version_cmd
-from shell.cmd import exit as exit_cmd
-from shell.cmd import init as init_cmd
-from shell.cmd import chat as chat_cmd
-from shell.cmd import skill as skill_cmd
-from shell.cmd import hello as hello_cmd
-from shell.cmd import run as run_cmd
-from shell.cmd import config as config_cmd
-from shell.cmd import new as new_cmd
-from shell.cmd import status as status_cmd
 from shell.cmd import prefix
 import utils.inited as inited
 
+# 命令名 → 模块；首次执行该命令时才导入，启动时不加载 requests、流水线与技能模块
+_COMMANDS = {
+    "version": "shell.cmd.version",
+    "exit": "shell.cmd.exit",
+    "init": "shell.cmd.init",
+    "chat": "shell.cmd.chat",
+    "skill": "shell.cmd.skill",
+    "hello": "shell.cmd.hello",
+    "run": "shell.cmd.run",
+    "config": "shell.cmd.config",
+    "new": "shell.cmd.new",
+    "status": "shell.cmd.status",
+    "resume": "shell.cmd.resume",
+}
+
+
+def _cmd(name: str):
+    """按需导入命令模块（importlib 自带模块缓存，重复调用只是一次字典查找）"""
+    return importlib.import_module(_COMMANDS[name])
+
+
 def _readline():
     try:
         return input()
@@ -73,82 +85,85 @@ def main_maren():
 
         if head == "code" and args and args[0].lower() == "chat":
             if len(args) > 1 and args[1].lower() == "enter":
-                chat_cmd.enter()
+                _cmd("chat").enter()
             elif len(args) > 1:
                 chat_msg = " ".join(args[1:])
-                chat_cmd.run(chat_msg)
+                _cmd("chat").run(chat_msg)
             else:
                 print(f"{prefix()}Usage: code chat <message> | code chat enter")
         elif head == "chat":
             if not args:
                 print(f"{prefix()}Usage: chat <argument>")
             elif args and args[0].lower() == "enter":
-                chat_cmd.enter()
+                _cmd("chat").enter()
             else:
                 chat_msg = " ".join(args)
-                chat_cmd.run(chat_msg)
+                _cmd("chat").run(chat_msg)
         elif head == "version" or (head == "code" and args and args[0].lower() == "version"):
-            version_cmd.run()
+            _cmd("version").run()
         elif head == "exit" or (head == "code" and args and args[0].lower() == "exit"):
-            exit_cmd.run()
+            _cmd("exit").run()
         elif head == "code" and args and args[0].lower() == "init":
             if len(args) > 1:
-                 init_cmd.run(args[1:])
+                 _cmd("init").run(args[1:])
             else:
                  print(f"{prefix()}Usage: code init <argument>")
         elif head == "init":
             if args:
-                 init_cmd.run(args)
+                 _cmd("init").run(args)
             else:
                  print(f"{prefix()}Usage: init <argument>")
         elif head == "code" and args and args[0].lower() == "skill":
             # code skill list
             if len(args) > 1 and args[1].lower() == "list":
-                 skill_cmd.run()
+                 _cmd("skill").run()
             else:
                  print(f"{prefix()}Usage: code skill <argument>")
         elif head == "skill":
             if args and args[0].lower() == "list":
-                skill_cmd.run()
+                _cmd("skill").run()
             else:
                 print(f"{prefix()}Usage: skill <argument>")
         elif head == "code" and args and args[0].lower() == "run":
             if len(args) > 1:
                 run_msg = " ".join(args[1:])
-                run_cmd.run(run_msg)
+                _cmd("run").run(run_msg)
             else:
                 print(f"{prefix()}Usage: code run enter")
         elif head == "run":
             if args:
                 run_msg = " ".join(args)
-                run_cmd.run(run_msg)
+                _cmd("run").run(run_msg)
             else:
                 print(f"{prefix()}请使用 {Fore.GREEN}run enter{Style.RESET_ALL} 进入项目对话模式。")
         elif head == "hello" or (head == "code" and args and args[0].lower() == "hello"):
-            hello_cmd.run()
+            _cmd("hello").run()
         elif head == "config" or (head == "code" and args and args[0].lower() == "config"):
             if head == "config":
-                config_cmd.run(args)
+                _cmd("config").run(args)
             else:
-                config_cmd.run(args[1:])
+                _cmd("config").run(args[1:])
         elif head == "new" or (head == "code" and args and args[0].lower() == "new"):
             if head == "new":
                 if args:
-                    new_cmd.run(" ".join(args))
+                    _cmd("new").run(" ".join(args))
                 else:
                     print(f"{prefix()}Usage: new <需求描述>")
             else:
                 if len(args) > 1:
-                    new_cmd.run(" ".join(args[1:]))
+                    _cmd("new").run(" ".join(args[1:]))
                 else:
                     print(f"{prefix()}Usage: code new <需求描述>")
         elif head == "status" or (head == "code" and args and args[0].lower() == "status"):
-            status_cmd.run()
+            _cmd("status").run()
+        elif head == "resume" or (head == "code" and args and args[0].lower() == "resume"):
+            _cmd("resume").run(args if head == "resume" else args[1:])
         elif head == "help":
              print(f"{prefix()}Available commands:")
              print(f"  {Fore.GREEN}code init boot{Style.RESET_ALL}   Initialize Maren Code")
              print(f"  {Fore.GREEN}new <desc>{Style.RESET_ALL}       Full auto pipeline (Chatter→Leader→Coder→Tester)")
              print(f"  {Fore.GREEN}run enter{Style.RESET_ALL}        Enter project dialog mode")
+             print(f"  {Fore.GREEN}resume [run_id]{Style.RESET_ALL}  List runs / resume an interrupted run")
              print(f"  {Fore.GREEN}chat <msg>{Style.RESET_ALL}       Chat with Maren (one-shot)")
              print(f"  {Fore.GREEN}chat enter{Style.RESET_ALL}       Enter chat mode")
              print(f"  {Fore.GREEN}config{Style.RESET_ALL}           Show/set configuration")
@@ -0,0 +1,82 @@
+"""
+utils/import_budget.py — 启动导入耗时预算检查
+用 python -X importtime 导入启动入口（utils.start_system），检查两件事：
+  1. 启动阶段不得导入重量级依赖（requests、bs4、lxml、PyGithub、流水线与请求层）
+  2. 入口模块的累计导入耗时不超过预算（取多次运行的最小值，降低抖动）
+
+  python -m utils.import_budget [--budget-ms 80] [--runs 3]
+
+不满足时打印超出的模块并以非零状态码退出，供 CI 使用。
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+ENTRY = "utils.start_system"
+DEFAULT_BUDGET_MS = 80.0
+# 启动时禁止出现的模块（按顶层包或完整模块名前缀匹配）
+FORBIDDEN = (
+    "requests", "urllib3", "bs4", "lxml", "github",
+    "core.agent.request", "core.agent.async_request", "pipeline",
+    "core.skill_manager",
+)
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def measure(entry: str = ENTRY) -> Tuple[float, Dict[str, float]]:
+    """在子进程中导入 entry，返回 (entry 累计耗时 ms, {模块: 累计耗时 ms})"""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {entry}"],
+        cwd=_ROOT, capture_output=True, text=True, encoding="utf-8", errors="replace",
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"导入 {entry} 失败:\n{proc.stderr[-2000:]}")
+    modules: Dict[str, float] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue  # 表头
+        modules[parts[2].strip()] = int(parts[1]) / 1000.0
+    return modules.get(entry, 0.0), modules
+
+
+def forbidden_in(modules: Dict[str, float]) -> List[str]:
+    """启动阶段被导入的禁止项（FORBIDDEN 中的条目）"""
+    return [f for f in FORBIDDEN
+            if any(name == f or name.startswith(f + ".") for name in modules)]
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Maren Code 启动导入耗时预算检查")
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    best, modules = None, {}
+    for _ in range(max(1, args.runs)):
+        total, modules = measure()
+        best = total if best is None else min(best, total)
+
+    failed = False
+    bad = forbidden_in(modules)
+    if bad:
+        failed = True
+        print(f"[FAIL] 启动时导入了重量级模块: {', '.join(bad)}")
+    if best > args.budget_ms:
+        failed = True
+        top = sorted(modules.items(), key=lambda kv: kv[1], reverse=True)[:10]
+        print(f"[FAIL] {ENTRY} 导入耗时 {best:.1f}ms 超出预算 {args.budget_ms:.0f}ms，累计耗时最多的模块:")
+        for name, ms in top:
+            print(f"    {ms:8.1f}ms  {name}")
+    if not failed:
+        print(f"[OK] {ENTRY} 导入耗时 {best:.1f}ms（预算 {args.budget_ms:.0f}ms），共 {len(modules)} 个模块")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
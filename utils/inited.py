@@ -1,5 +1,6 @@
 import json
 import os
+from core import config_store
 from core.runtime_dir import get_runtime_dir
 
 def maren_dir_path():
@@ -381,3 +382,5 @@ def init_maren(base_url, language, models, keys, role_urls=None):
     # maren.json 写入 .maren 目录
     with open(maren_json_path(), "w", encoding="utf-8") as f:
         json.dump(maren, f, ensure_ascii=False, indent=4)
+    # 重新初始化会覆盖已缓存的配置文件
+    config_store.invalidate()